@@ -23,20 +23,37 @@ Sites testés :
 Auteurs: Équipe Master MOSEF - 2024
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Literal
 from selenium import webdriver
 from selenium.webdriver.common.by import By
-from selenium.webdriver.edge.service import Service
-from selenium.webdriver.edge.options import Options
+from selenium.webdriver.chrome.options import Options as ChromeOptions
+from selenium.webdriver.chrome.service import Service as ChromeService
+from selenium.webdriver.edge.options import Options as EdgeOptions
+from selenium.webdriver.edge.service import Service as EdgeService
+from selenium.webdriver.firefox.options import Options as FirefoxOptions
+from selenium.webdriver.firefox.service import Service as FirefoxService
 from selenium.webdriver.support.ui import Select, WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import NoSuchElementException, ElementNotInteractableException
+from selenium.common.exceptions import NoSuchElementException, ElementNotInteractableException, TimeoutException
+import asyncio
+import hashlib
+import json
 import time
 import os
+import threading
+import uuid
 import Levenshtein
+import math
 import re
+import shutil
+import sqlite3
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from html.parser import HTMLParser
 
 # ===============================================
 # 🔧 CONFIGURATION
@@ -50,9 +67,73 @@ app = FastAPI(
 
 active_sessions: Dict[str, Any] = {}
 
-# Path du driver Edge - À MODIFIER selon ton installation
+# Path du driver Edge - À MODIFIER selon ton installation (utilisé s'il existe)
 DRIVER_PATH = os.path.join(os.path.dirname(__file__), "msedgedriver.exe")
 
+# Navigateur : profil de base (voir BROWSER_PROFILES), chaque réglage peut être
+# surchargé ; non défini = valeur du profil
+BROWSER_PROFILE = os.environ.get("AUTOFILL_BROWSER_PROFILE", "full")
+BROWSER_OVERRIDES = {
+    'browser': os.environ.get("AUTOFILL_BROWSER"),              # edge, chrome, chromium, firefox
+    'headless': os.environ.get("AUTOFILL_HEADLESS"),            # 1 / 0
+    'block_assets': os.environ.get("AUTOFILL_BLOCK_ASSETS"),    # images, polices, médias
+    'block_trackers': os.environ.get("AUTOFILL_BLOCK_TRACKERS"),
+    'blocked_urls': os.environ.get("AUTOFILL_BLOCKED_URLS"),    # motifs en plus, séparés par des virgules
+    'window_size': os.environ.get("AUTOFILL_WINDOW_SIZE"),      # "1366,900" (vide = maximisée)
+    'binary': os.environ.get("AUTOFILL_BROWSER_BINARY"),
+    'driver_path': os.environ.get("AUTOFILL_DRIVER_PATH"),
+}
+
+# Pool de navigateurs pré-démarrés (AUTOFILL_POOL_MAX_SIZE=0 pour le désactiver)
+DRIVER_POOL_MIN_SIZE = int(os.environ.get("AUTOFILL_POOL_MIN_SIZE", "1"))
+DRIVER_POOL_MAX_SIZE = int(os.environ.get("AUTOFILL_POOL_MAX_SIZE", "8"))
+DRIVER_POOL_ACQUIRE_TIMEOUT = float(os.environ.get("AUTOFILL_POOL_ACQUIRE_TIMEOUT", "30"))
+DRIVER_POOL_HEALTH_INTERVAL = float(os.environ.get("AUTOFILL_POOL_HEALTH_INTERVAL", "30"))
+
+# Threads dédiés aux commandes Selenium (bloquantes) : la boucle uvicorn reste libre
+DRIVER_WORKERS = int(os.environ.get("AUTOFILL_DRIVER_WORKERS", "16"))
+
+# Attente de la page : délai max par défaut (s) et silence réseau (ms)
+WAIT_TIMEOUT = float(os.environ.get("AUTOFILL_WAIT_TIMEOUT", "10"))
+NETWORK_IDLE_MS = int(os.environ.get("AUTOFILL_NETWORK_IDLE_MS", "500"))
+
+# Nombre de jobs /jobs/batch exécutés en parallèle par défaut
+BATCH_CONCURRENCY = int(os.environ.get("AUTOFILL_BATCH_CONCURRENCY", "4"))
+
+# Cache des plans de remplissage par structure de page (taille, durée de vie en s)
+PLAN_CACHE_SIZE = int(os.environ.get("AUTOFILL_PLAN_CACHE_SIZE", "256"))
+PLAN_CACHE_TTL = float(os.environ.get("AUTOFILL_PLAN_CACHE_TTL", "3600"))
+
+# Assistant multi-étapes (/form/wizard) : nombre max d'étapes par défaut
+WIZARD_MAX_STEPS = int(os.environ.get("AUTOFILL_WIZARD_MAX_STEPS", "10"))
+
+# Correspondances apprises (champ → champ logique par domaine) : fichier SQLite
+# (vide = désactivé), intervalle d'écriture des lots (s), confiance minimale,
+# remplissages concordants avant qu'une correspondance apprise soit utilisée
+MAPPING_DB = os.environ.get("AUTOFILL_MAPPING_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "autofill_mappings.db"))
+MAPPING_FLUSH_INTERVAL = float(os.environ.get("AUTOFILL_MAPPING_FLUSH_INTERVAL", "2"))
+MAPPING_MIN_CONFIDENCE = float(os.environ.get("AUTOFILL_MAPPING_MIN_CONFIDENCE", "0.5"))
+MAPPING_MIN_HITS = int(os.environ.get("AUTOFILL_MAPPING_MIN_HITS", "3"))
+
+# Profondeur max d'iframes imbriquées parcourues par le snapshot
+FRAME_MAX_DEPTH = int(os.environ.get("AUTOFILL_FRAME_MAX_DEPTH", "3"))
+
+# Traces de commandes WebDriver : événements max par trace, traces gardées par session
+TRACE_MAX_EVENTS = int(os.environ.get("AUTOFILL_TRACE_MAX_EVENTS", "20000"))
+TRACE_HISTORY = int(os.environ.get("AUTOFILL_TRACE_HISTORY", "5"))
+
+# Sessions : fermeture après inactivité (s, 0 = jamais), nombre max (0 = illimité,
+# au-delà la moins récemment utilisée est fermée), fréquence du ménage (s)
+SESSION_IDLE_TTL = float(os.environ.get("AUTOFILL_SESSION_IDLE_TTL", "900"))
+SESSION_MAX = int(os.environ.get("AUTOFILL_SESSION_MAX", "8"))
+SESSION_REAP_INTERVAL = float(os.environ.get("AUTOFILL_SESSION_REAP_INTERVAL", "30"))
+
+# Attributs utiles pour identifier un champ
+FIELD_ATTRIBUTES = ['name', 'id', 'placeholder', 'class', 'type', 'value', 'aria-label', 'data-testid']
+
+# Taille du cache d'identification (noms de champs déjà analysés)
+IDENTIFICATION_CACHE_SIZE = int(os.environ.get("AUTOFILL_IDENTIFICATION_CACHE_SIZE", "4096"))
+
 # ===============================================
 # 📚 DICTIONNAIRE DE MAPPING ÉTENDU
 # ===============================================
@@ -166,16 +247,189 @@ DEFAULT_VALUES = {
     'hobbies': ['Sports', 'Reading'],
 }
 
+# Options essayées dans l'ordre pour un select de pays (texte visible ou valeur)
+COUNTRY_OPTION_VALUES = ['France', 'FR', 'FRA', 'French']
+
+# ===============================================
+# 🗂️ INDEX DES MOTS-CLÉS
+# ===============================================
+
+class KeywordIndex:
+    """
+    Index de COMMON_FIELD_KEYWORDS construit une seule fois, à l'import.
+    
+    Renvoie exactement le même champ logique que le parcours complet
+    (_detect_logical_key_bruteforce), en ne calculant Levenshtein que sur
+    quelques candidats :
+    - correspondance exacte → ratio 1.0, réponse immédiate
+    - index inversé de caractères → nombre de caractères communs (multiensemble)
+      avec chaque mot-clé
+    - le ratio vaut 2·LCS / (l1 + l2) et LCS ≤ caractères communs : un mot-clé
+      dont cette borne est sous le seuil (ou sous un bonus déjà acquis) est ignoré
+    - bonus de sous-chaîne (0.9 / 0.85) → seuls les mots-clés dont tous les
+      caractères sont communs peuvent être contenus dans le nom
+    
+    Les compteurs sont stockés dans de grands entiers, un octet par mot-clé :
+    une addition d'entiers met à jour les compteurs de tous les mots-clés à la
+    fois, et l'ajout d'un décalage (128 - minimum requis) fait passer le bit
+    de poids fort de chaque octet à 1 exactement pour les candidats.
+    
+    ⚠️ Si COMMON_FIELD_KEYWORDS est modifié à l'exécution, reconstruire l'index.
+    """
+    
+    LANE_BITS = 8
+    LANE_HIGH = 1 << (LANE_BITS - 1)
+    
+    def __init__(self, keywords: Dict[str, List[str]]):
+        # Les positions suivent l'ordre de parcours d'origine (départage des égalités)
+        self.keywords: List[str] = []
+        self.logicals: List[str] = []
+        self.exact: Dict[str, int] = {}
+        self.substrings: Dict[str, List[int]] = {}
+        # (caractère, k) → octets à 1 pour les mots-clés contenant au moins k fois ce caractère
+        self.postings: Dict[tuple, int] = {}
+        # longueur → octets à 1 pour les mots-clés de cette longueur
+        self.length_lanes: Dict[int, int] = {}
+        
+        for logical, kws in keywords.items():
+            for kw in kws:
+                pos = len(self.keywords)
+                if len(kw) >= self.LANE_HIGH:
+                    raise ValueError(f"Mot-clé trop long pour l'index: {kw!r}")
+                lane = 1 << (pos * self.LANE_BITS)
+                self.keywords.append(kw)
+                self.logicals.append(logical)
+                self.exact.setdefault(kw, pos)
+                self.length_lanes[len(kw)] = self.length_lanes.get(len(kw), 0) | lane
+                subs = {kw[i:j] for i in range(len(kw)) for j in range(i + 1, len(kw) + 1)}
+                for sub in subs:
+                    self.substrings.setdefault(sub, []).append(pos)
+                for char, count in Counter(kw).items():
+                    for k in range(1, count + 1):
+                        self.postings[(char, k)] = self.postings.get((char, k), 0) | lane
+        
+        all_lanes = sum(self.length_lanes.values())
+        self.high_bits = all_lanes * self.LANE_HIGH
+        # longueur → décalages pré-calculés pour chaque minimum requis (1..longueur)
+        self.offsets: Dict[int, List[int]] = {
+            length: [0] + [(self.LANE_HIGH - need) * lanes for need in range(1, length + 1)]
+            for length, lanes in self.length_lanes.items()
+        }
+        # Candidats "tous les caractères du mot-clé sont communs"
+        self.full_offset = sum(offsets[length] for length, offsets in self.offsets.items())
+    
+    def __len__(self) -> int:
+        return len(self.keywords)
+    
+    def _positions(self, bits: int):
+        """Positions des mots-clés dont le bit de poids fort est à 1"""
+        while bits:
+            low = bits & -bits
+            yield (low.bit_length() - 1) // self.LANE_BITS
+            bits ^= low
+    
+    def _common_chars(self, lname: str) -> int:
+        """Caractères communs avec chaque mot-clé, tous calculés en une somme"""
+        common = 0
+        seen: Dict[str, int] = {}
+        for char in lname:
+            k = seen.get(char, 0) + 1
+            seen[char] = k
+            common += self.postings.get((char, k), 0)
+        return common
+    
+    def _candidate_scores(self, lname: str, threshold: float, floor_on_bonus: bool) -> Dict[int, float]:
+        """Ratio (bonus compris) des mots-clés pouvant atteindre le seuil, par position"""
+        common = self._common_chars(lname)
+        size = len(lname)
+        scores: Dict[int, float] = {}
+        
+        # Mot-clé contenu dans le nom (bonus 0.9)
+        for pos in self._positions((common + self.full_offset) & self.high_bits):
+            if self.keywords[pos] in lname:
+                scores[pos] = max(Levenshtein.ratio(lname, self.keywords[pos]), 0.9)
+        
+        # Nom contenu dans un mot-clé (bonus 0.85)
+        for pos in self.substrings.get(lname, ()):
+            scores[pos] = max(Levenshtein.ratio(lname, self.keywords[pos]), 0.85)
+        
+        # Ratio seul, uniquement si la borne 2·communs / (l1 + l2) atteint le score à battre
+        floor = threshold
+        if floor_on_bonus:
+            floor = max(threshold, max(scores.values(), default=0.0))
+        offset = 0
+        for length, offsets in self.offsets.items():
+            # Au moins 1 caractère commun : un ratio nul ne gagne jamais
+            need = max(1, math.ceil(floor * (size + length) / 2 - 1e-9))
+            # Plus de caractères requis que le mot-clé n'en a : aucun candidat
+            if need <= length:
+                offset += offsets[need]
+        for pos in self._positions((common + offset) & self.high_bits):
+            if pos not in scores:
+                scores[pos] = Levenshtein.ratio(lname, self.keywords[pos])
+        
+        return scores
+    
+    def lookup(self, lname: str, threshold: float = 0.6) -> Optional[str]:
+        """Cherche le champ logique d'un nom déjà normalisé"""
+        if not lname:
+            return None
+        
+        # 1. Correspondance exacte : ratio 1.0, impossible à battre
+        exact = self.exact.get(lname)
+        if exact is not None:
+            return self.logicals[exact] if threshold <= 1.0 else None
+        
+        # 2. Candidats : bonus de sous-chaîne, puis ratio seul au-dessus du meilleur bonus
+        scores = self._candidate_scores(lname, threshold, floor_on_bonus=True)
+        
+        best = max(scores.values(), default=0.0)
+        if best <= 0.0 or best < threshold:
+            return None
+        
+        # Même départage que le parcours complet : premier mot-clé au meilleur score
+        winner = min(pos for pos, score in scores.items() if score == best)
+        return self.logicals[winner]
+    
+    def scores(self, lname: str, threshold: float = 0.6) -> Dict[str, float]:
+        """
+        Meilleur score de CHAQUE champ logique atteignant le seuil (pas seulement
+        du gagnant) : une ligne de la matrice champs × mots-clés.
+        """
+        if not lname:
+            return {}
+        
+        result: Dict[str, float] = {}
+        for pos, score in self._candidate_scores(lname, threshold, floor_on_bonus=False).items():
+            if score > 0.0 and score >= threshold and score > result.get(self.logicals[pos], 0.0):
+                result[self.logicals[pos]] = score
+        return result
+
+
+KEYWORD_INDEX = KeywordIndex(COMMON_FIELD_KEYWORDS)
+
+
 # ===============================================
 # 📋 MODÈLES PYDANTIC
 # ===============================================
 
+class WaitStrategy(BaseModel):
+    """Conditions à remplir avant de considérer la page prête (remplace les time.sleep fixes)"""
+    ready_state: bool = True                 # document.readyState == 'complete'
+    form_control: Optional[bool] = None      # au moins un input/textarea/select (défaut : oui pour /form/fill)
+    selector: Optional[str] = None           # sélecteur CSS fourni par le client
+    network_idle: bool = False               # aucune ressource terminée depuis network_idle_ms
+    network_idle_ms: int = NETWORK_IDLE_MS
+    timeout: float = WAIT_TIMEOUT            # délai max (s) ; au-delà on continue quand même
+
+
 class SessionCreateRequest(BaseModel):
     session_id: str
     url: Optional[str] = ''
     maximize: Optional[bool] = True
     width: Optional[int] = None
     height: Optional[int] = None
+    wait: Optional[WaitStrategy] = None
 
 
 class FillFormRequest(BaseModel):
@@ -183,30 +437,597 @@ class FillFormRequest(BaseModel):
     values: Optional[Dict[str, Any]] = {}
     use_levenshtein: Optional[bool] = True
     levenshtein_threshold: Optional[float] = 0.6  # Plus permissif
+    fill_mode: Literal['keys', 'js'] = 'keys'  # 'js' : tout le plan en un seul appel
+    identification: Literal['field', 'matrix'] = 'field'  # 'matrix' : affectation globale de la page
+    wait: Optional[WaitStrategy] = None
+    timings: bool = False  # renvoyer le détail des durées par phase
+    trace: bool = False    # enregistrer chaque commande WebDriver (voir /session/{id}/traces)
+    incremental: bool = False  # seulement les champs ajoutés / modifiés depuis le dernier remplissage
+
+
+class BatchJob(BaseModel):
+    url: str
+    values: Optional[Dict[str, Any]] = {}
+    job_id: Optional[str] = None
+
+
+class BatchJobRequest(BaseModel):
+    jobs: List[BatchJob]
+    concurrency: Optional[int] = None  # défaut : AUTOFILL_BATCH_CONCURRENCY
+    levenshtein_threshold: Optional[float] = 0.6
+    fill_mode: Literal['keys', 'js'] = 'keys'
+    identification: Literal['field', 'matrix'] = 'field'
+    wait: Optional[WaitStrategy] = None
+
+
+class WizardRequest(BaseModel):
+    session_id: str
+    values: Optional[Dict[str, Any]] = {}
+    use_levenshtein: Optional[bool] = True
+    levenshtein_threshold: Optional[float] = 0.6
+    fill_mode: Literal['keys', 'js'] = 'keys'
+    identification: Literal['field', 'matrix'] = 'field'
+    wait: Optional[WaitStrategy] = None      # avant la première étape
+    max_steps: Optional[int] = None          # défaut : AUTOFILL_WIZARD_MAX_STEPS
+    step_timeout: float = WAIT_TIMEOUT       # attente max (s) des champs de l'étape suivante
+    next_selector: Optional[str] = None      # bouton "suivant" (sinon détecté par son texte)
+    submit: bool = False                     # cliquer aussi un bouton final (valider, s'inscrire...)
+    trace: bool = False
+
+
+class MappingRequest(BaseModel):
+    domain: str                 # ex. "www.booking.com"
+    field: str                  # attribut name (sinon id) du champ
+    logical: str                # champ logique imposé (clé de DEFAULT_VALUES / values)
+    confidence: float = 1.0
+
+
+class PlanRequest(BaseModel):
+    html: Optional[str] = None        # page HTML à analyser (sans navigateur)...
+    session_id: Optional[str] = None  # ...ou page courante d'une session (lecture seule)
+    values: Optional[Dict[str, Any]] = {}
+    levenshtein_threshold: Optional[float] = 0.6
+    identification: Literal['field', 'matrix'] = 'field'
 
 
 class SessionResponse(BaseModel):
     success: bool
     message: str
     session_id: Optional[str] = None
+    waited_ms: Optional[float] = None  # temps réellement passé à attendre la page
+    profile: Optional[Dict[str, Any]] = None  # navigateur et profil utilisés
 
 
 class FormFillResponse(BaseModel):
     success: bool
     message: str
     filled_fields: Optional[list] = []
+    waited_ms: Optional[float] = None
+    page_ready: Optional[bool] = None
+    timings: Optional[Dict[str, Any]] = None  # si demandé : durées par phase (ms) et commandes WebDriver
+    trace_id: Optional[str] = None  # si demandé : trace téléchargeable sur /session/{id}/traces/{trace_id}
+
+
+class WizardResponse(BaseModel):
+    success: bool
+    message: str
+    steps: list = []            # [{step, url, new_fields, filled_fields, next, waited_ms, duration_ms}]
+    stopped: str                # no_next, no_new_fields, max_steps
+    trace_id: Optional[str] = None
+
+
+class PlanResponse(BaseModel):
+    success: bool
+    message: str
+    fingerprint: str            # empreinte de la structure (clé du cache des plans)
+    cached: bool                # plan déjà connu pour cette structure
+    fields: int                 # champs trouvés dans la page
+    plan: list = []             # [{index, tag, type, name, logical, action, value}]
+
+
+# ===============================================
+# 🧠 CACHE D'IDENTIFICATION
+# ===============================================
+
+class LRUCache:
+    """
+    Cache LRU borné et thread-safe, partagé par toutes les sessions.
+    
+    Les mêmes attributs ("email", "firstName", "form-control", "col-md-6")
+    reviennent sur chaque page : le résultat de l'identification est gardé
+    en mémoire, et l'entrée la moins récemment utilisée est évincée quand
+    le cache est plein. Avec `ttl` (secondes), une entrée trop ancienne est
+    ignorée et supprimée à la lecture.
+    """
+    
+    def __init__(self, maxsize: int = 4096, ttl: Optional[float] = None):
+        self.maxsize = max(0, maxsize)
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()  # clé → (valeur, date d'ajout)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+    
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                value, stored_at = self._data[key]
+                if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+                    del self._data[key]
+                    self.expirations += 1
+                    self.misses += 1
+                    return default
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            self.misses += 1
+            return default
+    
+    def put(self, key, value) -> None:
+        if self.maxsize == 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = self.expirations = 0
+    
+    def __len__(self) -> int:
+        return len(self._data)
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+# Clé : (nom normalisé, seuil) → champ logique (ou None)
+IDENTIFICATION_CACHE = LRUCache(IDENTIFICATION_CACHE_SIZE)
+
+# Distingue "pas en cache" d'un résultat None mis en cache
+_CACHE_MISS = object()
+
+# Clé : (empreinte de la structure du formulaire, seuil, identification) → plan résolu (voir form_fingerprint)
+FORM_PLAN_CACHE = LRUCache(PLAN_CACHE_SIZE, ttl=PLAN_CACHE_TTL)
+
+
+# ===============================================
+# 📈 MÉTRIQUES (FORMAT PROMETHEUS)
+# ===============================================
+
+# Bornes des histogrammes (secondes)
+METRIC_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def format_metric_labels(labels: tuple) -> str:
+    """{a="1",b="2"} à partir de ((a, 1), (b, 2)), avec l'échappement du format texte"""
+    if not labels:
+        return ''
+    parts = []
+    for key, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{key}="{value}"')
+    return '{' + ','.join(parts) + '}'
+
+
+class CounterMetric:
+    """Compteur Prometheus (une valeur par combinaison de labels), thread-safe"""
+    kind = 'counter'
+    
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+    
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+    
+    def samples(self) -> List[tuple]:
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+
+class HistogramMetric:
+    """Histogramme Prometheus (buckets cumulés, _sum et _count), thread-safe"""
+    kind = 'histogram'
+    
+    def __init__(self, name: str, help_text: str, buckets: tuple = METRIC_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = buckets
+        self._values: Dict[tuple, list] = {}  # labels → [compteurs par bucket..., somme, total]
+        self._lock = threading.Lock()
+    
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+    
+    def samples(self) -> List[tuple]:
+        samples = []
+        with self._lock:
+            for key, state in self._values.items():
+                for bound, count in zip(self.buckets, state):
+                    samples.append((f'{self.name}_bucket', key + (('le', repr(bound)),), count))
+                samples.append((f'{self.name}_bucket', key + (('le', '+Inf'),), state[-1]))
+                samples.append((f'{self.name}_sum', key, state[-2]))
+                samples.append((f'{self.name}_count', key, state[-1]))
+        return samples
+
+
+class CallbackMetric:
+    """Jauge (ou compteur) lue au moment du scrape : func() → [(labels dict, valeur)]"""
+    
+    def __init__(self, name: str, help_text: str, func, kind: str = 'gauge'):
+        self.name = name
+        self.help = help_text
+        self.func = func
+        self.kind = kind
+    
+    def samples(self) -> List[tuple]:
+        return [(self.name, tuple(sorted(labels.items())), value) for labels, value in self.func()]
+
+
+METRICS: List[Any] = []
+
+
+def register_metric(metric):
+    METRICS.append(metric)
+    return metric
+
+
+def render_metrics() -> str:
+    """Toutes les métriques au format texte Prometheus (version 0.0.4)"""
+    lines = []
+    for metric in METRICS:
+        try:
+            samples = metric.samples()
+        except Exception as e:
+            print(f"  ⚠️ Métrique {metric.name} indisponible: {e}")
+            continue
+        lines.append(f'# HELP {metric.name} {metric.help}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        for name, labels, value in samples:
+            lines.append(f'{name}{format_metric_labels(labels)} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+HTTP_REQUEST_SECONDS = register_metric(HistogramMetric(
+    'autofill_http_request_duration_seconds', "Durée des requêtes HTTP par route et statut"))
+FILL_REQUESTS = register_metric(CounterMetric(
+    'autofill_fill_requests_total', "Remplissages par mode et résultat"))
+FILL_PHASE_SECONDS = register_metric(HistogramMetric(
+    'autofill_fill_phase_duration_seconds', "Durée de chaque phase d'un remplissage (wait, snapshot, plan, apply)"))
+FIELDS_FILLED = register_metric(CounterMetric(
+    'autofill_fields_filled_total', "Champs remplis par type de champ"))
+FIELD_SECONDS = register_metric(HistogramMetric(
+    'autofill_field_duration_seconds', "Durée d'application d'un champ (mode clavier) par type de champ"))
+WEBDRIVER_COMMANDS = register_metric(CounterMetric(
+    'autofill_webdriver_commands_total', "Commandes WebDriver envoyées, par commande"))
+WEBDRIVER_COMMAND_SECONDS = register_metric(HistogramMetric(
+    'autofill_webdriver_command_duration_seconds', "Durée des commandes WebDriver, par commande"))
+
+
+@contextmanager
+def timed_phase(phase: str, timings: Optional[Dict] = None):
+    """
+    Chronomètre une phase : histogramme FILL_PHASE_SECONDS, durée en ms sous
+    la clé '<phase>_ms' si `timings` est fourni, span de la trace active et
+    événements début / fin du suivi actif (annulation vérifiée au début).
+    """
+    check_cancelled()
+    report_progress('phase', {'phase': phase, 'state': 'start'})
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        FILL_PHASE_SECONDS.observe(elapsed, phase=phase)
+        report_progress('phase', {'phase': phase, 'state': 'end', 'ms': round(elapsed * 1000, 1)})
+        if timings is not None:
+            timings[f'{phase}_ms'] = round(elapsed * 1000, 1)
+        trace = current_trace()
+        if trace is not None:
+            trace.add(phase, 'phase', start, elapsed)
+
+
+def session_gauges() -> List[tuple]:
+    return [
+        ({'state': 'active'}, len(active_sessions)),
+        ({'state': 'pending'}, len(pending_sessions)),
+        ({'state': 'busy'}, sum(1 for session in list(active_sessions.values()) if session['queue'].busy))
+    ]
+
+
+def session_event_counts() -> List[tuple]:
+    return [({'event': event}, session_events[event]) for event in ('created', 'deleted', 'idle', 'evicted')]
+
+
+def queue_depth_gauge() -> List[tuple]:
+    return [({}, sum(session['queue'].depth for session in list(active_sessions.values())))]
+
+
+def pool_gauges() -> List[tuple]:
+    stats = DRIVER_POOL.stats()
+    return [({'state': 'idle'}, stats['idle']), ({'state': 'in_use'}, stats['in_use'])]
+
+
+def pool_events() -> List[tuple]:
+    stats = DRIVER_POOL.stats()
+    return [({'event': event}, stats[event])
+            for event in ('created', 'leased', 'recycled', 'replaced', 'closed', 'failed_starts')]
+
+
+def cache_lookups() -> List[tuple]:
+    samples = []
+    for cache_name, cache in (('identification', IDENTIFICATION_CACHE), ('form_plan', FORM_PLAN_CACHE)):
+        stats = cache.stats()
+        samples.append(({'cache': cache_name, 'result': 'hit'}, stats['hits']))
+        samples.append(({'cache': cache_name, 'result': 'miss'}, stats['misses']))
+    return samples
+
+
+register_metric(CallbackMetric('autofill_sessions', "Sessions par état", session_gauges))
+register_metric(CallbackMetric('autofill_session_events_total', "Sessions créées et fermées (DELETE, inactivité, éviction)", session_event_counts, kind='counter'))
+register_metric(CallbackMetric('autofill_session_queue_depth', "Commandes en attente ou en cours, toutes sessions", queue_depth_gauge))
+register_metric(CallbackMetric('autofill_driver_pool_drivers', "Navigateurs du pool par état", pool_gauges))
+register_metric(CallbackMetric('autofill_driver_pool_events_total', "Événements du pool de navigateurs", pool_events, kind='counter'))
+register_metric(CallbackMetric('autofill_cache_lookups_total', "Recherches dans les caches", cache_lookups, kind='counter'))
+
+
+def instrument_driver(driver):
+    """
+    Compte et chronomètre chaque commande envoyée au navigateur. Toutes les
+    commandes Selenium (driver et WebElement) passent par driver.execute :
+    l'envelopper suffit. driver.command_count sert aux timings par requête,
+    et la trace active du thread (voir tracing) reçoit chaque commande.
+    """
+    if getattr(driver, 'command_count', None) is not None:
+        return driver
+    
+    execute = driver.execute
+    driver.command_count = 0
+    
+    def counted_execute(driver_command, params=None):
+        driver.command_count += 1
+        start = time.perf_counter()
+        ok = False
+        try:
+            result = execute(driver_command, params)
+            ok = True
+            return result
+        finally:
+            elapsed = time.perf_counter() - start
+            WEBDRIVER_COMMANDS.inc(command=driver_command)
+            WEBDRIVER_COMMAND_SECONDS.observe(elapsed, command=driver_command)
+            trace = current_trace()
+            if trace is not None:
+                args = summarize_command_params(params)
+                if not ok:
+                    args['error'] = True
+                trace.add(driver_command, 'webdriver', start, elapsed, args)
+    
+    driver.execute = counted_execute
+    return driver
+
+
+# ===============================================
+# 🔬 TRACE DES COMMANDES WEBDRIVER
+# ===============================================
+
+# Trace du thread courant (les commandes d'une session passent par un seul thread à la fois)
+_TRACE_LOCAL = threading.local()
+
+# Paramètres jamais recopiés dans une trace (texte saisi : mots de passe...)
+TRACE_MASKED_PARAMS = frozenset(['text', 'value'])
+
+
+def current_trace():
+    """Trace active sur ce thread (ou None)"""
+    return getattr(_TRACE_LOCAL, 'trace', None)
+
+
+@contextmanager
+def tracing(trace):
+    """Active `trace` sur ce thread le temps du bloc"""
+    previous = current_trace()
+    _TRACE_LOCAL.trace = trace
+    try:
+        yield trace
+    finally:
+        _TRACE_LOCAL.trace = previous
+
+
+def traced_call(trace, func, *args, **kwargs):
+    """Exécute func avec la trace active (à passer à SessionQueue.run)"""
+    with tracing(trace):
+        return func(*args, **kwargs)
+
+
+def summarize_command_params(params: Optional[Dict]) -> Dict[str, Any]:
+    """Arguments d'une commande pour la trace : élément ciblé, script tronqué, texte masqué"""
+    if not params:
+        return {}
+    args = {}
+    for key, value in params.items():
+        if key == 'id':
+            args['element'] = value
+        elif key in TRACE_MASKED_PARAMS:
+            args[key] = f'<{len(value)} caractère(s)>' if isinstance(value, (str, list)) else '<masqué>'
+        elif key == 'script':
+            args['script'] = ' '.join(str(value).split())[:120]
+        elif key == 'args':
+            args['args'] = len(value) if isinstance(value, list) else 1
+        elif isinstance(value, (str, int, float, bool)) or value is None:
+            args[key] = value
+    return args
+
+
+class CommandTrace:
+    """
+    Commandes WebDriver (et phases du remplissage) d'une requête, avec leur
+    horodatage et leur durée. Exportable au format Trace Event JSON, lisible
+    dans chrome://tracing ou Perfetto (ui.perfetto.dev).
+    """
+    
+    def __init__(self, name: str, max_events: int = TRACE_MAX_EVENTS):
+        self.trace_id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.created_at = time.time()
+        self.max_events = max_events
+        self.events: List[Dict] = []
+        self.dropped = 0
+        self.commands = 0
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+    
+    def add(self, name: str, category: str, start: float, duration: float, args: Optional[Dict] = None) -> None:
+        """Ajoute un événement complet ('X') ; start est une valeur de time.perf_counter()"""
+        event = {
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': round((start - self._origin) * 1e6, 1),
+            'dur': round(duration * 1e6, 1),
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+            'args': args or {}
+        }
+        with self._lock:
+            if category == 'webdriver':
+                self.commands += 1
+            if len(self.events) >= self.max_events:
+                self.dropped += 1
+                return
+            self.events.append(event)
+    
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'trace_id': self.trace_id,
+            'name': self.name,
+            'created_at': self.created_at,
+            'commands': self.commands,
+            'events': len(self.events),
+            'dropped': self.dropped
+        }
+    
+    def to_trace_events(self) -> Dict[str, Any]:
+        with self._lock:
+            events = sorted(self.events, key=lambda event: event['ts'])
+        return {
+            'traceEvents': events,
+            'displayTimeUnit': 'ms',
+            'otherData': self.summary()
+        }
+
+
+# ===============================================
+# 📡 PROGRESSION EN DIRECT (SSE)
+# ===============================================
+
+# Suivi actif du thread courant : les phases (timed_phase) et les champs
+# appliqués y sont publiés sans paramètre supplémentaire (comme les traces)
+_PROGRESS_LOCAL = threading.local()
+
+
+class FillCancelled(Exception):
+    """Remplissage interrompu : le client a fermé le flux"""
+
+
+class FillProgress:
+    """
+    Événements d'un remplissage, publiés depuis le thread Selenium et lus par
+    la boucle asyncio (file asyncio alimentée par call_soon_threadsafe).
+    `cancelled` est levé quand le client s'en va : le remplissage s'arrête au
+    prochain champ ou à la prochaine phase.
+    """
+    
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.cancelled = threading.Event()
+    
+    def emit(self, event: str, data: Dict) -> None:
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, (event, data))
+    
+    def check(self) -> None:
+        if self.cancelled.is_set():
+            raise FillCancelled("Remplissage annulé par le client")
+
+
+def current_progress() -> Optional[FillProgress]:
+    """Suivi actif sur ce thread (ou None)"""
+    return getattr(_PROGRESS_LOCAL, 'progress', None)
+
+
+def progress_call(progress: FillProgress, func, *args, **kwargs):
+    """Exécute func avec le suivi actif (à passer à SessionQueue.run)"""
+    previous = current_progress()
+    _PROGRESS_LOCAL.progress = progress
+    try:
+        return func(*args, **kwargs)
+    finally:
+        _PROGRESS_LOCAL.progress = previous
+
+
+def report_progress(event: str, data: Dict) -> None:
+    progress = current_progress()
+    if progress is not None:
+        progress.emit(event, data)
+
+
+def check_cancelled() -> None:
+    """Lève FillCancelled si le client du suivi actif est parti"""
+    progress = current_progress()
+    if progress is not None:
+        progress.check()
+
+
+def format_sse(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
 
 
 # ===============================================
 # 🔍 FONCTIONS DE DÉTECTION
 # ===============================================
 
-def detect_logical_key_levenshtein(field_name: str, threshold: float = 0.6) -> Optional[str]:
-    """Détecte le champ logique avec Levenshtein"""
+def normalize_field_name(field_name: str) -> str:
+    """Normalise un nom de champ avant comparaison avec les mots-clés"""
+    return field_name.lower().replace('-', '_').replace(' ', '_')
+
+
+def _detect_logical_key_bruteforce(field_name: str, threshold: float = 0.6) -> Optional[str]:
+    """Version de référence : compare le nom à TOUS les mots-clés (utilisée par les benchmarks)"""
     if not field_name:
         return None
     
-    lname = field_name.lower().replace('-', '_').replace(' ', '_')
+    lname = normalize_field_name(field_name)
     best_ratio = 0.0
     best_logical = None
     
@@ -229,10 +1050,27 @@ def detect_logical_key_levenshtein(field_name: str, threshold: float = 0.6) -> O
     return best_logical if best_ratio >= threshold else None
 
 
+def detect_logical_key_levenshtein(field_name: str, threshold: float = 0.6) -> Optional[str]:
+    """Détecte le champ logique avec Levenshtein (via le cache puis l'index des mots-clés)"""
+    if not field_name:
+        return None
+    
+    lname = normalize_field_name(field_name)
+    key = (lname, threshold)
+    logical = IDENTIFICATION_CACHE.get(key, _CACHE_MISS)
+    if logical is _CACHE_MISS:
+        logical = KEYWORD_INDEX.lookup(lname, threshold)
+        IDENTIFICATION_CACHE.put(key, logical)
+    return logical
+
+
 def get_all_field_attributes(element) -> Dict[str, str]:
-    """Récupère tous les attributs utiles d'un élément"""
+    """Récupère tous les attributs utiles d'un élément (ou d'un champ du snapshot)"""
+    if isinstance(element, dict):
+        return element['attrs']
+    
     attrs = {}
-    for attr in ['name', 'id', 'placeholder', 'class', 'type', 'value', 'aria-label', 'data-testid']:
+    for attr in FIELD_ATTRIBUTES:
         try:
             val = element.get_attribute(attr)
             if val:
@@ -242,14 +1080,14 @@ def get_all_field_attributes(element) -> Dict[str, str]:
     return attrs
 
 
-def identify_field(element) -> tuple:
-    """Identifie un champ en utilisant tous ses attributs"""
+def identify_field(element, threshold: float = 0.6) -> tuple:
+    """Identifie un champ (WebElement ou champ du snapshot) en utilisant tous ses attributs"""
     attrs = get_all_field_attributes(element)
     
     # Essayer chaque attribut pour identifier le champ
     for attr in ['name', 'id', 'placeholder', 'aria-label', 'data-testid']:
         if attr in attrs:
-            logical = detect_logical_key_levenshtein(attrs[attr])
+            logical = detect_logical_key_levenshtein(attrs[attr], threshold)
             if logical:
                 return (attrs.get('name') or attrs.get('id') or 'unknown', logical)
     
@@ -257,7 +1095,7 @@ def identify_field(element) -> tuple:
     if 'class' in attrs:
         classes = attrs['class'].split()
         for cls in classes:
-            logical = detect_logical_key_levenshtein(cls)
+            logical = detect_logical_key_levenshtein(cls, threshold)
             if logical:
                 return (attrs.get('name') or attrs.get('id') or 'unknown', logical)
     
@@ -265,148 +1103,493 @@ def identify_field(element) -> tuple:
 
 
 # ===============================================
-# 📅 FONCTIONS DE DATE
+# 🧮 IDENTIFICATION GLOBALE (MATRICE CHAMPS × CLÉS)
 # ===============================================
 
-def parse_date_components(date_str: str) -> Optional[Dict[str, str]]:
-    """Parse une date en composants"""
-    if not date_str:
-        return None
-    
-    # Format YYYY-MM-DD
-    if re.match(r'\d{4}-\d{2}-\d{2}', date_str):
-        parts = date_str.split('-')
-        return {'day': parts[2], 'month': parts[1], 'year': parts[0]}
-    
-    # Format DD/MM/YYYY
-    if re.match(r'\d{2}/\d{2}/\d{4}', date_str):
-        parts = date_str.split('/')
-        return {'day': parts[0], 'month': parts[1], 'year': parts[2]}
-    
-    return None
+# Champs logiques pouvant aller à plusieurs champs d'une même page
+MULTI_ASSIGN_KEYS = frozenset(['password', 'confirm_password', 'date_of_birth'])
 
+# Types d'inputs identifiés individuellement (plusieurs boutons par clé) ou jamais remplis
+MATRIX_EXEMPT_TYPES = frozenset(['checkbox', 'radio', 'submit', 'button', 'hidden', 'image', 'reset', 'file'])
 
-def is_day_field(field_name: str) -> bool:
-    if not field_name:
+
+def matrix_eligible(field: Dict) -> bool:
+    """Champ concerné par l'affectation globale (visible, ni checkbox ni radio)"""
+    if not field['visible']:
         return False
-    return any(kw in field_name.lower() for kw in ['jour', 'day', '_dd', 'birth_day'])
+    return field['tag'] != 'input' or field['type'] not in MATRIX_EXEMPT_TYPES
 
 
-def is_month_field(field_name: str) -> bool:
-    if not field_name:
-        return False
-    return any(kw in field_name.lower() for kw in ['mois', 'month', '_mm', 'birth_month'])
+def field_tokens(field: Dict) -> List[str]:
+    """Noms normalisés d'un champ, dans l'ordre de priorité de identify_field (classes CSS en dernier)"""
+    attrs = field['attrs']
+    tokens = [normalize_field_name(attrs[attr]) for attr in ['name', 'id', 'placeholder', 'aria-label', 'data-testid']
+              if attrs.get(attr)]
+    tokens += [normalize_field_name(cls) for cls in attrs.get('class', '').split()]
+    return tokens
 
 
-def is_year_field(field_name: str) -> bool:
-    if not field_name:
-        return False
-    return any(kw in field_name.lower() for kw in ['annee', 'year', '_yyyy', 'birth_year', 'année'])
+def token_scores(lname: str, threshold: float) -> Dict[str, float]:
+    """Scores d'un nom normalisé pour chaque champ logique (mis en cache)"""
+    key = (lname, threshold, 'scores')
+    scores = IDENTIFICATION_CACHE.get(key, _CACHE_MISS)
+    if scores is _CACHE_MISS:
+        scores = KEYWORD_INDEX.scores(lname, threshold)
+        IDENTIFICATION_CACHE.put(key, scores)
+    return scores
 
 
-# ===============================================
-# 🔘 GESTION DES CHECKBOXES (AMÉLIORÉE)
-# ===============================================
+def score_matrix(fields: List[Dict], threshold: float = 0.6) -> List[Dict[str, float]]:
+    """
+    Matrice champs × champs logiques pour toute la page, une ligne par champ
+    (scores ≥ seuil uniquement). Comme identify_field, la ligne vient du premier
+    nom du champ qui donne un score ; chaque nom distinct de la page n'est évalué
+    qu'une fois, même s'il revient sur plusieurs champs.
+    """
+    seen: Dict[str, Dict[str, float]] = {}
+    matrix = []
+    for field in fields:
+        row: Dict[str, float] = {}
+        for token in field_tokens(field):
+            if token not in seen:
+                seen[token] = token_scores(token, threshold)
+            if seen[token]:
+                row = seen[token]
+                break
+        matrix.append(row)
+    return matrix
+
 
-def handle_checkbox(inp, field_name: str, provided_values: Dict, logical: str, all_attrs: Dict) -> Optional[Dict]:
+def assign_fields(fields: List[Dict], threshold: float = 0.6, taken: frozenset = frozenset()) -> Dict[int, tuple]:
     """
-    Gère TOUS les types de checkboxes :
-    - Simples : "Se souvenir de moi", "Accepter les CGU"
-    - Multiples : Garnitures pizza, options de voyage
-    - Avec valeurs : value="bacon", value="cheese"
+    Affecte les champs logiques à l'échelle de la page : les couples
+    (champ, meilleure clé du champ) sont pris du meilleur score au moins bon
+    (égalités : premier champ du document, puis ordre de COMMON_FIELD_KEYWORDS),
+    et une clé déjà prise ne l'est plus ailleurs (sauf MULTI_ASSIGN_KEYS).
+    Un champ dont la meilleure clé est prise n'en reçoit aucune :
+    se rabattre sur une clé moins bonne donnerait "email_address" → address.
+    
+    `taken` : clés déjà attribuées ailleurs sur la page (correspondances apprises).
+    
+    Renvoie {index du champ: (field_name, logical)}, comme identify_field.
     """
-    try:
-        input_value = inp.get_attribute('value') or ''
-        input_value_lower = input_value.lower()
-        input_id = inp.get_attribute('id') or ''
-        input_name = field_name or ''
+    matrix = score_matrix(fields, threshold)
+    
+    key_order = {logical: i for i, logical in enumerate(COMMON_FIELD_KEYWORDS)}
+    pairs = []
+    for row_pos, row in enumerate(matrix):
+        if row:
+            score, _, logical = min((-score, key_order.get(logical, len(key_order)), logical)
+                                        for logical, score in row.items())
+            pairs.append((score, row_pos, logical))
+    pairs.sort()
+    
+    assigned: Dict[int, str] = {}
+    taken = set(taken)
+    for _, row_pos, logical in pairs:
+        if logical in taken and logical not in MULTI_ASSIGN_KEYS:
+            continue
+        assigned[row_pos] = logical
+        taken.add(logical)
+    
+    identities = {}
+    for row_pos, field in enumerate(fields):
+        attrs = field['attrs']
+        identities[field['index']] = (attrs.get('name') or attrs.get('id') or 'unknown', assigned.get(row_pos))
+    return identities
+
+
+# ===============================================
+# 🧾 CORRESPONDANCES APPRISES (SQLITE)
+# ===============================================
+
+class MappingStore:
+    """
+    Correspondances champ → champ logique par domaine, gardées dans SQLite et
+    consultées avant toute identification floue.
+    
+    - tout est chargé en mémoire au démarrage : lookup() ne lit jamais le disque
+    - learn() enregistre les champs d'un remplissage que le client a validé
+      (POST /session/{id}/mappings/confirm) : l'identification floue est
+      déterministe, la refaire sur la même page ne prouve rien. La mémoire est
+      à jour tout de suite, l'écriture est mise en file et un thread écrit les
+      lots (une transaction toutes les flush_interval secondes)
+    - une correspondance apprise n'est qu'une candidate : confiance
+      hits / (hits + 1), utilisée seulement après min_hits remplissages validés
+      concordants et au-dessus de min_confidence ; un résultat différent la
+      remet à zéro
+    - une surcharge du client (source 'override') est confirmée d'emblée et
+      n'est jamais remplacée par l'apprentissage
+    - une correspondance confirmée remplace l'identification du champ quels que
+      soient le seuil et le mode d'identification de la requête
+    """
+    
+    def __init__(self, path: str, flush_interval: float = 2.0, min_confidence: float = 0.5, min_hits: int = 3):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.min_confidence = min_confidence
+        self.min_hits = min_hits
         
-        # Construire une liste de clés à chercher
-        search_keys = [k for k in [field_name, logical, input_value, input_id] if k]
+        self._index: Dict[str, Dict[str, Dict]] = {}   # domaine → champ → entrée
+        self._versions: Counter = Counter()            # domaine → changements de décision
+        self._pending: Dict[tuple, Optional[Dict]] = {}  # (domaine, champ) → entrée (None = suppression)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        
+        self.written = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+    
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+    
+    # ---------- Cycle de vie ----------
+    
+    def start(self) -> None:
+        """Charge la base en mémoire et démarre l'écriture en arrière-plan"""
+        if not self.enabled or (self._thread and self._thread.is_alive()):
+            return
         
-        should_check = False
-        matched_key = None
+        connection = self._connect()
+        try:
+            rows = connection.execute(
+                "SELECT domain, field, logical, source, confidence, hits, updated_at FROM mappings"
+            ).fetchall()
+        finally:
+            connection.close()
         
-        # 1. Chercher par valeur exacte de l'input
-        for key, val in provided_values.items():
-            key_lower = key.lower()
-            
-            # Si la clé correspond à la valeur de l'input (ex: "bacon": True)
-            if key_lower == input_value_lower:
-                if isinstance(val, bool):
-                    should_check = val
-                elif isinstance(val, str):
-                    should_check = val.lower() in ['yes', 'true', 'on', '1', 'y']
-                else:
-                    should_check = bool(val)
-                matched_key = key
-                break
+        with self._lock:
+            for domain, field, logical, source, confidence, hits, updated_at in rows:
+                self._index.setdefault(domain, {})[field] = {
+                    'logical': logical, 'source': source, 'confidence': confidence,
+                    'hits': hits, 'updated_at': updated_at
+                }
+        print(f"  🧾 {len(rows)} correspondance(s) apprise(s) chargée(s) depuis {self.path}")
         
-        # 2. Chercher par nom de champ ou champ logique
-        if not matched_key:
-            for key in search_keys:
-                if not key:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._write_loop, name="mapping-store", daemon=True)
+        self._thread.start()
+    
+    def shutdown(self) -> None:
+        """Écrit les derniers changements et arrête le thread"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+    
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS mappings ("
+            " domain TEXT NOT NULL, field TEXT NOT NULL, logical TEXT NOT NULL,"
+            " source TEXT NOT NULL, confidence REAL NOT NULL, hits INTEGER NOT NULL,"
+            " updated_at REAL NOT NULL, PRIMARY KEY (domain, field))"
+        )
+        return connection
+    
+    def _write_loop(self) -> None:
+        connection = self._connect()
+        try:
+            while not self._stop.wait(self.flush_interval):
+                self._flush(connection)
+            self._flush(connection)
+        finally:
+            connection.close()
+    
+    def _flush(self, connection: sqlite3.Connection) -> None:
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return
+        
+        upserts = [(domain, field, e['logical'], e['source'], e['confidence'], e['hits'], e['updated_at'])
+                   for (domain, field), e in batch.items() if e is not None]
+        deletes = [key for key, e in batch.items() if e is None]
+        try:
+            with connection:
+                connection.executemany("INSERT OR REPLACE INTO mappings VALUES (?, ?, ?, ?, ?, ?, ?)", upserts)
+                connection.executemany("DELETE FROM mappings WHERE domain = ? AND field = ?", deletes)
+            self.written += len(batch)
+            self.flushes += 1
+        except sqlite3.Error as e:
+            print(f"  ⚠️ Écriture des correspondances impossible: {e}")
+            self.failed_flushes += 1
+            # Réessayer au prochain lot, sans écraser un changement plus récent
+            with self._lock:
+                for key, entry in batch.items():
+                    self._pending.setdefault(key, entry)
+    
+    # ---------- Lecture ----------
+    
+    def confirmed(self, entry: Dict) -> bool:
+        """Correspondance utilisable : imposée par le client, ou apprise de plusieurs remplissages validés concordants"""
+        if entry['source'] == 'override':
+            return entry['confidence'] >= self.min_confidence
+        return entry['hits'] >= self.min_hits and entry['confidence'] > self.min_confidence
+    
+    def lookup(self, domain: Optional[str]) -> Dict[str, str]:
+        """Correspondances utilisables pour ce domaine : {champ: champ logique}"""
+        if not domain:
+            return {}
+        with self._lock:
+            entries = self._index.get(domain, {})
+            return {field: e['logical'] for field, e in entries.items() if self.confirmed(e)}
+    
+    def version(self, domain: Optional[str]) -> int:
+        """Change quand une décision du domaine change (invalide les plans en cache)"""
+        return self._versions[domain] if domain else 0
+    
+    def entries(self, domain: Optional[str] = None) -> List[Dict]:
+        with self._lock:
+            domains = [domain] if domain else sorted(self._index)
+            return [{'domain': d, 'field': field, **entry, 'confirmed': self.confirmed(entry)}
+                    for d in domains for field, entry in sorted(self._index.get(d, {}).items())]
+    
+    # ---------- Écriture ----------
+    
+    def learn(self, domain: Optional[str], decisions: List[tuple]) -> None:
+        """
+        Enregistre les couples (champ, champ logique) d'un remplissage validé
+        par le client : un succès par champ et par appel. Un champ déjà
+        confirmé n'est plus compté (sa décision vient de la correspondance
+        elle-même), un champ associé à deux champs logiques dans le même
+        remplissage est ignoré.
+        """
+        if not self.enabled or not domain or not decisions:
+            return
+        choices: Dict[str, set] = {}
+        for field, logical in decisions:
+            choices.setdefault(field, set()).add(logical)
+        
+        now = time.time()
+        with self._lock:
+            entries = self._index.setdefault(domain, {})
+            for field, logicals in choices.items():
+                if len(logicals) > 1:
                     continue
-                key_lower = key.lower()
-                
-                if key_lower in provided_values or key in provided_values:
-                    val = provided_values.get(key_lower) or provided_values.get(key)
-                    
-                    if isinstance(val, bool):
-                        should_check = val
-                        matched_key = key
-                        break
-                    elif isinstance(val, str):
-                        if val.lower() in ['yes', 'true', 'on', '1', 'y']:
-                            should_check = True
-                        elif val.lower() == input_value_lower:
-                            should_check = True
-                        matched_key = key
-                        break
-                    elif isinstance(val, list):
-                        # Liste de valeurs à cocher
-                        for item in val:
-                            if isinstance(item, str) and item.lower() == input_value_lower:
-                                should_check = True
-                                matched_key = key
-                                break
-                        if should_check:
-                            break
+                logical = next(iter(logicals))
+                entry = entries.get(field)
+                if entry and (entry['source'] == 'override' or self.confirmed(entry)):
+                    continue
+                hits = entry['hits'] + 1 if entry and entry['logical'] == logical else 1
+                entry = {'logical': logical, 'source': 'learned', 'confidence': round(hits / (hits + 1), 3),
+                         'hits': hits, 'updated_at': now}
+                entries[field] = entry
+                self._pending[(domain, field)] = entry
+                # Devient utilisable : les plans en cache du domaine sont périmés
+                if self.confirmed(entry):
+                    self._versions[domain] += 1
+    
+    def override(self, domain: str, field: str, logical: str, confidence: float = 1.0) -> Dict:
+        """Correspondance imposée par le client"""
+        entry = {'logical': logical, 'source': 'override', 'confidence': confidence, 'hits': 0,
+                 'updated_at': time.time()}
+        with self._lock:
+            self._index.setdefault(domain, {})[field] = entry
+            self._versions[domain] += 1
+            self._pending[(domain, field)] = entry
+        return entry
+    
+    def remove(self, domain: str, field: str) -> bool:
+        with self._lock:
+            if self._index.get(domain, {}).pop(field, None) is None:
+                return False
+            self._versions[domain] += 1
+            self._pending[(domain, field)] = None
+            return True
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = [e for domain in self._index.values() for e in domain.values()]
+            pending = len(self._pending)
+        return {
+            "enabled": self.enabled,
+            "path": self.path,
+            "domains": len(self._index),
+            "mappings": len(entries),
+            "confirmed": sum(1 for e in entries if self.confirmed(e)),
+            "overrides": sum(1 for e in entries if e['source'] == 'override'),
+            "pending_writes": pending,
+            "written": self.written,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes
+        }
+
+
+MAPPING_STORE = MappingStore(MAPPING_DB, MAPPING_FLUSH_INTERVAL, MAPPING_MIN_CONFIDENCE, MAPPING_MIN_HITS)
+
+
+def learned_decisions(filled_fields: List[Dict]) -> List[tuple]:
+    """Champs remplis à retenir : (nom du champ, champ logique), hors checkboxes et radios"""
+    return [(report['name'], report['logical']) for report in filled_fields
+            if report.get('logical') and report['name'] != 'unknown'
+            and report['type'] not in ('checkbox', 'radio')]
+
+
+def record_fill_decisions(driver, filled_fields: List[Dict]) -> None:
+    """
+    Garde les décisions d'un remplissage de session en attente de validation
+    (driver.fill_decisions : domaine → champ → champs logiques), jusqu'à
+    confirm_fill_decisions ; rien pour un navigateur hors session.
+    """
+    pending = getattr(driver, 'fill_decisions', None)
+    if pending is None or not driver.page_host:
+        return
+    fields = pending.setdefault(driver.page_host, {})
+    for field, logical in learned_decisions(filled_fields):
+        fields.setdefault(field, set()).add(logical)
+
+
+def confirm_fill_decisions(driver) -> Dict[str, int]:
+    """Transmet à MAPPING_STORE les décisions en attente (un succès par domaine) : {domaine: champs}"""
+    pending, driver.fill_decisions = driver.fill_decisions, {}
+    for domain, fields in pending.items():
+        MAPPING_STORE.learn(domain, [(field, logical) for field, logicals in fields.items() for logical in logicals])
+    return {domain: len(fields) for domain, fields in pending.items()}
+
+
+# ===============================================
+# 📅 FONCTIONS DE DATE
+# ===============================================
+
+def parse_date_components(date_str: str) -> Optional[Dict[str, str]]:
+    """Parse une date en composants"""
+    if not date_str:
+        return None
+    
+    # Format YYYY-MM-DD
+    if re.match(r'\d{4}-\d{2}-\d{2}', date_str):
+        parts = date_str.split('-')
+        return {'day': parts[2], 'month': parts[1], 'year': parts[0]}
+    
+    # Format DD/MM/YYYY
+    if re.match(r'\d{2}/\d{2}/\d{4}', date_str):
+        parts = date_str.split('/')
+        return {'day': parts[0], 'month': parts[1], 'year': parts[2]}
+    
+    return None
+
+
+def is_day_field(field_name: str) -> bool:
+    if not field_name:
+        return False
+    return any(kw in field_name.lower() for kw in ['jour', 'day', '_dd', 'birth_day'])
+
+
+def is_month_field(field_name: str) -> bool:
+    if not field_name:
+        return False
+    return any(kw in field_name.lower() for kw in ['mois', 'month', '_mm', 'birth_month'])
+
+
+def is_year_field(field_name: str) -> bool:
+    if not field_name:
+        return False
+    return any(kw in field_name.lower() for kw in ['annee', 'year', '_yyyy', 'birth_year', 'année'])
+
+
+# ===============================================
+# 🔘 GESTION DES CHECKBOXES (AMÉLIORÉE)
+# ===============================================
+
+# Chaînes considérées comme "cocher"
+TRUTHY_STRINGS = frozenset(['yes', 'true', 'on', '1', 'y'])
+
+
+class CheckboxValue:
+    """Valeur fournie pour une checkbox, interprétée une seule fois"""
+    __slots__ = ('kind', 'truthy', 'lower', 'items')
+    
+    def __init__(self, val):
+        self.lower = None
+        self.items = frozenset()
+        if isinstance(val, bool):
+            self.kind, self.truthy = 'bool', val
+        elif isinstance(val, str):
+            self.lower = val.lower()
+            self.kind, self.truthy = 'str', self.lower in TRUTHY_STRINGS
+        elif isinstance(val, list):
+            # Liste de valeurs à cocher → ensemble en minuscules
+            self.items = frozenset(item.lower() for item in val if isinstance(item, str))
+            self.kind, self.truthy = 'list', bool(val)
+        else:
+            self.kind, self.truthy = 'other', bool(val)
+
+
+class CheckboxContext:
+    """
+    Tables de correspondance des checkboxes, construites une fois par remplissage
+    à partir de merged_values : chaque checkbox se décide ensuite en quelques
+    recherches dans des dicts, quel que soit le nombre de valeurs fournies.
+    """
+    
+    def __init__(self, provided_values: Dict):
+        # Clé exacte → valeur interprétée
+        self.by_key = {key: CheckboxValue(val) for key, val in provided_values.items()}
+        # Clé en minuscules → valeur interprétée (première clé rencontrée)
+        self.by_lower: Dict[str, CheckboxValue] = {}
+        for key, value in self.by_key.items():
+            self.by_lower.setdefault(key.lower(), value)
+        self.defaults = {key: CheckboxValue(val) for key, val in DEFAULT_VALUES.items()}
+    
+    def should_check(self, input_value_lower: str, search_keys: List[str], logical: Optional[str]) -> bool:
+        # 1. Chercher par valeur exacte de l'input (ex: "bacon": True)
+        value = self.by_lower.get(input_value_lower)
+        if value is not None:
+            return value.truthy
+        
+        # 2. Chercher par nom de champ ou champ logique
+        for key in search_keys:
+            value = self.by_key.get(key.lower()) or self.by_key.get(key)
+            if value is None:
+                continue
+            if value.kind == 'bool':
+                return value.truthy
+            if value.kind == 'str':
+                return value.truthy or value.lower == input_value_lower
+            if value.kind == 'list' and input_value_lower in value.items:
+                return True
         
         # 3. Chercher par champ logique dans DEFAULT_VALUES
-        if not matched_key and logical:
-            val = DEFAULT_VALUES.get(logical)
-            if val is not None:
-                if isinstance(val, bool):
-                    should_check = val
-                    matched_key = logical
-                elif isinstance(val, list):
-                    for item in val:
-                        if isinstance(item, str) and item.lower() == input_value_lower:
-                            should_check = True
-                            matched_key = logical
-                            break
-        
-        # 4. Cocher si nécessaire
-        if should_check:
-            if not inp.is_selected():
-                try:
-                    inp.click()
-                except ElementNotInteractableException:
-                    # Essayer de cliquer sur le label parent
-                    try:
-                        label = inp.find_element(By.XPATH, "./ancestor::label")
-                        label.click()
-                    except:
-                        pass
-                
-                return {
-                    'type': 'checkbox',
-                    'name': field_name,
-                    'logical': logical,
-                    'value': input_value or 'checked',
-                    'action': 'checked'
-                }
+        value = self.defaults.get(logical) if logical else None
+        if value is not None:
+            if value.kind == 'bool':
+                return value.truthy
+            if value.kind == 'list':
+                return input_value_lower in value.items
+        
+        return False
+
+
+def handle_checkbox(field: Dict, field_name: str, context: CheckboxContext, logical: str, all_attrs: Dict) -> Optional[Dict]:
+    """
+    Gère TOUS les types de checkboxes :
+    - Simples : "Se souvenir de moi", "Accepter les CGU"
+    - Multiples : Garnitures pizza, options de voyage
+    - Avec valeurs : value="bacon", value="cheese"
+    
+    `field` est le champ du snapshot, `context` les tables du remplissage en cours.
+    Renvoie le champ à cocher (ou None), sans toucher au navigateur : le clic est
+    fait par apply_fill_plan.
+    """
+    try:
+        input_value = all_attrs.get('value', '')
+        input_id = all_attrs.get('id', '')
+        
+        # Construire une liste de clés à chercher
+        search_keys = [k for k in [field_name, logical, input_value, input_id] if k]
+        
+        # Cocher si nécessaire (le clic est fait par apply_fill_plan)
+        if context.should_check(input_value.lower(), search_keys, logical) and not field['checked']:
+            return {
+                'type': 'checkbox',
+                'name': field_name,
+                'logical': logical,
+                'value': input_value or 'checked',
+                'action': 'checked'
+            }
         
         return None
     
@@ -416,27 +1599,87 @@ def handle_checkbox(inp, field_name: str, provided_values: Dict, logical: str, a
 
 
 # ===============================================
-# 🔘 GESTION DES RADIOS (AMÉLIORÉE)
+# 🔘 GESTION DES RADIOS (PAR GROUPE)
 # ===============================================
 
-def handle_radio(inp, field_name: str, provided_values: Dict, logical: str, all_attrs: Dict) -> Optional[Dict]:
+# Synonymes courants des valeurs de radios (clé → valeurs équivalentes)
+RADIO_SYNONYMS = {
+    'yes': ['yes', 'oui', 'true', '1', 'on'],
+    'no': ['no', 'non', 'false', '0', 'off'],
+    'male': ['male', 'homme', 'masculin', 'm', 'mr'],
+    'female': ['female', 'femme', 'féminin', 'f', 'mme', 'mrs'],
+    'main_guest': ['main', 'principal', 'myself', 'moi', 'je_suis'],
+    'other_guest': ['other', 'autre', 'someone', 'quelqu'],
+}
+
+# Scores d'une radio face à la valeur cible (le meilleur du groupe l'emporte)
+RADIO_SCORE_EXACT = 4       # value == cible
+RADIO_SCORE_SYNONYM = 3     # value est un synonyme de la cible
+RADIO_SCORE_PARTIAL = 2     # inclusion (ex: "main_guest" contient "main")
+RADIO_SCORE_LOOSE = 1       # un synonyme apparaît dans value
+
+
+def radio_group_key(field: Dict) -> tuple:
     """
-    Gère TOUS les types de radios :
+    Clé du groupe d'une radio : son attribut name dans sa frame et son shadow
+    root (sinon la radio est seule). Le chemin lisible (path) ne suffit pas :
+    deux iframes ou hôtes sans id ni name ont le même.
+    """
+    name = field['attrs'].get('name')
+    return ('name', field.get('frame', ()), field.get('scope', 0), name) if name else ('index', field['index'])
+
+
+def group_radios(fields: List[Dict]) -> Dict[tuple, List[Dict]]:
+    """Regroupe les radios visibles et actives du snapshot par groupe (ordre du document)"""
+    groups: Dict[tuple, List[Dict]] = {}
+    for field in fields:
+        if field['tag'] == 'input' and field['type'] == 'radio' and field['visible'] and field['enabled']:
+            groups.setdefault(radio_group_key(field), []).append(field)
+    return groups
+
+
+def radio_target_synonyms(target_lower: str) -> List[str]:
+    """Synonymes de la valeur cible (toutes les listes où elle apparaît)"""
+    synonyms = []
+    for key, vals in RADIO_SYNONYMS.items():
+        if target_lower in vals or target_lower == key:
+            synonyms.extend(vals)
+    return synonyms
+
+
+def score_radio(input_value_lower: str, target_lower: str, synonyms: List[str]) -> int:
+    """Score d'une radio (0 = ne correspond pas)"""
+    if not input_value_lower:
+        return 0
+    if input_value_lower == target_lower:
+        return RADIO_SCORE_EXACT
+    if input_value_lower in synonyms:
+        return RADIO_SCORE_SYNONYM
+    if target_lower in input_value_lower or input_value_lower in target_lower:
+        return RADIO_SCORE_PARTIAL
+    if any(v in input_value_lower for v in synonyms):
+        return RADIO_SCORE_LOOSE
+    return 0
+
+
+def resolve_radio_group(radios: List[Dict], identify, provided_values: Dict) -> Optional[tuple]:
+    """
+    Gère TOUS les types de radios, un groupe (même name) à la fois :
     - Simples : Genre (Male/Female), Taille (S/M/L)
     - Booking : "Pour qui réservez-vous ?", "Voyagez-vous pour le travail ?"
     - Avec labels complexes
+    
+    La valeur cible est cherchée une fois pour le groupe, chaque radio est notée
+    en une passe et seule la meilleure est retenue. Renvoie (champ, entrée
+    filled_fields) pour la radio à cocher, ou None (rien ne correspond, ou la
+    bonne radio est déjà cochée). Aucun appel WebDriver : le clic est fait par
+    apply_fill_plan.
     """
-    try:
-        input_value = inp.get_attribute('value') or ''
-        input_value_lower = input_value.lower()
-        input_id = inp.get_attribute('id') or ''
-        input_name = field_name or ''
-        
-        should_select = False
-        matched_value = None
-        
-        # 1. Chercher la valeur attendue pour ce groupe de radios
-        target_value = None
+    field_name, logical, target_value = None, None, None
+    
+    # 1. Chercher la valeur attendue pour ce groupe de radios
+    for radio in radios:
+        field_name, logical = identify(radio)
         
         # Chercher par nom de champ
         if field_name and field_name in provided_values:
@@ -450,77 +1693,145 @@ def handle_radio(inp, field_name: str, provided_values: Dict, logical: str, all_
         if target_value is None and logical:
             target_value = DEFAULT_VALUES.get(logical)
         
-        # 2. Vérifier si cette radio correspond à la valeur cible
         if target_value is not None:
-            target_lower = str(target_value).lower()
-            
-            # Match exact sur la valeur
-            if input_value_lower == target_lower:
-                should_select = True
-                matched_value = input_value
-            
-            # Match partiel (ex: "main_guest" contient "main")
-            elif target_lower in input_value_lower or input_value_lower in target_lower:
-                should_select = True
-                matched_value = input_value
-            
-            # Match sur des synonymes courants
-            synonyms = {
-                'yes': ['yes', 'oui', 'true', '1', 'on'],
-                'no': ['no', 'non', 'false', '0', 'off'],
-                'male': ['male', 'homme', 'masculin', 'm', 'mr'],
-                'female': ['female', 'femme', 'féminin', 'f', 'mme', 'mrs'],
-                'main_guest': ['main', 'principal', 'myself', 'moi', 'je_suis'],
-                'other_guest': ['other', 'autre', 'someone', 'quelqu'],
-            }
-            
-            for key, vals in synonyms.items():
-                if target_lower in vals or target_lower == key:
-                    if input_value_lower in vals or any(v in input_value_lower for v in vals):
-                        should_select = True
-                        matched_value = input_value
-                        break
-        
-        # 3. Sélectionner si nécessaire
-        if should_select and not inp.is_selected():
-            try:
-                inp.click()
-            except ElementNotInteractableException:
-                # Essayer de cliquer sur le label
-                try:
-                    label = inp.find_element(By.XPATH, f"//label[@for='{input_id}']")
-                    label.click()
-                except:
-                    try:
-                        label = inp.find_element(By.XPATH, "./ancestor::label")
-                        label.click()
-                    except:
-                        pass
-            
-            return {
-                'type': 'radio',
-                'name': field_name,
-                'logical': logical,
-                'value': matched_value or input_value,
-                'action': 'selected'
-            }
-        
+            break
+    
+    if target_value is None:
         return None
     
-    except Exception as e:
-        print(f"  ⚠️ Erreur radio {field_name}: {e}")
+    # 2. Noter chaque radio du groupe face à la valeur cible
+    target_lower = str(target_value).lower()
+    synonyms = radio_target_synonyms(target_lower)
+    
+    best, best_score = None, 0
+    for radio in radios:
+        score = score_radio(radio['attrs'].get('value', '').lower(), target_lower, synonyms)
+        if score > best_score:
+            best, best_score = radio, score
+    
+    # 3. Sélectionner si nécessaire (le clic est fait par apply_fill_plan)
+    if best is None or best['checked']:
         return None
+    
+    return best, {
+        'type': 'radio',
+        'name': field_name,
+        'logical': logical,
+        'value': best['attrs'].get('value', ''),
+        'action': 'selected'
+    }
 
 
 # ===============================================
 # 🔽 GESTION DES SELECTS (AMÉLIORÉE)
 # ===============================================
 
-def get_title_option(select_element, preferred='Mr') -> Optional[str]:
+def normalize_option_text(text) -> str:
+    """Normalise un texte/valeur d'option pour la recherche (casse et espaces)"""
+    return ' '.join(str(text).lower().split())
+
+
+class OptionIndex:
+    """
+    Index des options d'un select, construit une fois à partir du snapshot.
+    
+    - exact : texte visible puis valeur, tels quels (comme select_by_visible_text / select_by_value)
+    - normalisé : même recherche sans casse ni espaces superflus
+    - approché : Levenshtein sur les textes (repli)
+    
+    Les recherches renvoient l'index de l'option, sélectionnée ensuite en une seule commande.
+    Les options désactivées sont ignorées (Selenium refuse de les sélectionner).
+    """
+    
+    def __init__(self, options: List[Dict]):
+        self.options = [opt for opt in options or [] if not opt.get('disabled')]
+        self.by_text: Dict[str, int] = {}
+        self.by_value: Dict[str, int] = {}
+        self.by_norm_text: Dict[str, int] = {}
+        self.by_norm_value: Dict[str, int] = {}
+        # Textes normalisés uniques pour le repli approché
+        self.fuzzy: List[tuple] = []
+        
+        for opt in self.options:
+            text, value, index = opt.get('text') or '', opt.get('value') or '', opt['index']
+            self.by_text.setdefault(text, index)
+            self.by_value.setdefault(value, index)
+            if text:
+                norm = normalize_option_text(text)
+                if norm not in self.by_norm_text:
+                    self.by_norm_text[norm] = index
+                    self.fuzzy.append((norm, index))
+            if value:
+                self.by_norm_value.setdefault(normalize_option_text(value), index)
+    
+    def text(self, index: int) -> str:
+        for opt in self.options:
+            if opt['index'] == index:
+                return opt.get('text') or ''
+        return ''
+    
+    def find(self, target) -> Optional[int]:
+        """Index de l'option correspondant exactement (texte puis valeur, puis normalisés)"""
+        if target is None:
+            return None
+        target = str(target)
+        for table, key in ((self.by_text, target.strip()), (self.by_value, target)):
+            if key and key in table:
+                return table[key]
+        norm = normalize_option_text(target)
+        if not norm:
+            return None
+        for table in (self.by_norm_text, self.by_norm_value):
+            if norm in table:
+                return table[norm]
+        return None
+    
+    def closest(self, search_text, threshold: float = 0.5) -> Optional[int]:
+        """Index de l'option la plus proche avec Levenshtein (inclusion comptée 0.8)"""
+        search = normalize_option_text(search_text or '')
+        if not search:
+            return None
+        
+        best_index = None
+        best_ratio = 0.0
+        for norm, index in self.fuzzy:
+            if norm == search:
+                return index
+            ratio = Levenshtein.ratio(search, norm)
+            if search in norm or norm in search:
+                ratio = max(ratio, 0.8)
+            if ratio > best_ratio:
+                best_ratio = ratio
+                best_index = index
+        
+        return best_index if best_ratio >= threshold else None
+    
+    def lookup(self, target, threshold: float = 0.5) -> Optional[int]:
+        """Recherche exacte, sinon approchée"""
+        index = self.find(target)
+        if index is None and target:
+            index = self.closest(str(target), threshold)
+        return index
+
+
+def get_option_index(select_field: Dict) -> OptionIndex:
+    """Index des options du select (construit une fois par champ du snapshot)"""
+    index = select_field.get('option_index')
+    if index is None:
+        index = OptionIndex(select_field.get('options') or [])
+        select_field['option_index'] = index
+    return index
+
+
+def get_option_texts(select_field: Dict) -> List[str]:
+    """Textes des options d'un select du snapshot (déjà récupérés, aucun appel WebDriver)"""
+    return [opt['text'] for opt in select_field.get('options') or []]
+
+
+def get_title_option(select_field: Dict, preferred='Mr') -> Optional[str]:
     """Cherche la meilleure option de titre"""
     try:
-        options = select_element.find_elements(By.TAG_NAME, 'option')
-        option_texts = [opt.text.strip() for opt in options if opt.text.strip()]
+        option_texts = [text for text in get_option_texts(select_field) if text]
         
         preferences = ['Mr', 'Mr.', 'M.', 'Monsieur', 'Mrs', 'Mrs.', 'Mme', 'Madame', 'Ms', 'Ms.', 'Miss']
         
@@ -538,60 +1849,27 @@ def get_title_option(select_element, preferred='Mr') -> Optional[str]:
         return None
 
 
-def find_closest_option(select_element, search_text: str, threshold: float = 0.5) -> Optional[str]:
-    """Cherche l'option la plus proche avec Levenshtein"""
-    try:
-        options = select_element.find_elements(By.TAG_NAME, 'option')
-        option_texts = [opt.text.strip() for opt in options if opt.text.strip()]
-        
-        if not search_text or not option_texts:
-            return None
-        
-        search_lower = search_text.lower()
-        best_match = None
-        best_ratio = 0.0
-        
-        for text in option_texts:
-            text_lower = text.lower()
-            
-            if text_lower == search_lower:
-                return text
-            
-            ratio = Levenshtein.ratio(search_lower, text_lower)
-            
-            if search_lower in text_lower or text_lower in search_lower:
-                ratio = max(ratio, 0.8)
-            
-            if ratio > best_ratio:
-                best_ratio = ratio
-                best_match = text
-        
-        return best_match if best_ratio >= threshold else None
-    except:
-        return None
-
-
-def handle_time_select(select_element, provided_values: Dict, logical: str) -> Optional[str]:
+def handle_time_select(select_field: Dict, provided_values: Dict, logical: str) -> Optional[str]:
     """Gère les selects d'heure (plage horaire Booking)"""
     try:
         target_time = provided_values.get('arrival_time') or DEFAULT_VALUES.get('arrival_time', '15:00')
         
-        options = select_element.find_elements(By.TAG_NAME, 'option')
+        options = get_option_texts(select_field)
         
-        for opt in options:
-            text = opt.text.strip().lower()
+        for option_text in options:
+            text = option_text.lower()
             # Chercher l'heure dans le texte (ex: "15:00 - 16:00", "15h00")
             if target_time.replace(':', 'h') in text or target_time in text:
-                return opt.text.strip()
+                return option_text
             
             # Chercher juste l'heure de début
             hour = target_time.split(':')[0]
             if f"{hour}:" in text or f"{hour}h" in text:
-                return opt.text.strip()
+                return option_text
         
         # Sinon retourner une option du milieu
         if len(options) > 2:
-            return options[len(options) // 2].text.strip()
+            return options[len(options) // 2]
         
         return None
     except:
@@ -602,16 +1880,154 @@ def handle_time_select(select_element, provided_values: Dict, logical: str) -> O
 # 🌐 DRIVER SELENIUM
 # ===============================================
 
-def create_driver():
-    """Crée une nouvelle instance de driver Edge"""
-    service = Service(DRIVER_PATH)
-    options = Options()
-    options.add_argument("--start-maximized")
+BROWSER_PROFILES = {
+    # Comportement historique : Edge, fenêtre maximisée, page complète
+    'full': {
+        'browser': 'edge',
+        'headless': False,
+        'block_assets': False,
+        'block_trackers': False,
+        'window_size': '',
+    },
+    # Serveurs Linux : sans fenêtre, sans images / polices / médias, traqueurs bloqués
+    'lean': {
+        'browser': 'chromium',
+        'headless': True,
+        'block_assets': True,
+        'block_trackers': True,
+        'window_size': '1366,900',
+    },
+}
+
+# Bloqués par URL (CDP Network.setBlockedURLs) : Chromium n'a pas de préférence pour les polices
+ASSET_URL_PATTERNS = [
+    '*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot',
+    '*.mp4', '*.webm', '*.ogg', '*.mp3', '*.m4a', '*.wav', '*.m3u8',
+]
+
+TRACKER_URL_PATTERNS = [
+    '*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*',
+    '*googlesyndication.com*', '*facebook.net*', '*connect.facebook.com*',
+    '*hotjar.com*', '*clarity.ms*', '*segment.io*', '*segment.com/analytics*',
+    '*criteo.com*', '*criteo.net*', '*taboola.com*', '*outbrain.com*',
+    '*scorecardresearch.com*', '*bat.bing.com*', '*adnxs.com*', '*quantserve.com*',
+]
+
+
+def parse_flag(value) -> bool:
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def browser_settings(profile: str = BROWSER_PROFILE, overrides: Optional[Dict] = None) -> Dict[str, Any]:
+    """Réglages du navigateur : profil de base + surcharges (BROWSER_OVERRIDES par défaut)"""
+    if profile not in BROWSER_PROFILES:
+        raise ValueError(f"Profil de navigateur inconnu: {profile} (attendu: {', '.join(BROWSER_PROFILES)})")
+    
+    settings = {**BROWSER_PROFILES[profile], 'profile': profile, 'blocked_urls': '', 'binary': '', 'driver_path': ''}
+    for key, value in (BROWSER_OVERRIDES if overrides is None else overrides).items():
+        if value is None:
+            continue
+        settings[key] = parse_flag(value) if key in ('headless', 'block_assets', 'block_trackers') else value
+    
+    if settings['browser'] not in ('edge', 'chrome', 'chromium', 'firefox'):
+        raise ValueError(f"Navigateur inconnu: {settings['browser']}")
+    
+    # Motifs bloqués par CDP (Chromium et Edge) ; Firefox passe par ses préférences
+    patterns = [p.strip() for p in settings['blocked_urls'].split(',') if p.strip()]
+    if settings['block_assets']:
+        patterns += ASSET_URL_PATTERNS
+    if settings['block_trackers']:
+        patterns += TRACKER_URL_PATTERNS
+    settings['url_patterns'] = patterns
+    return settings
+
+
+def browser_options(settings: Dict[str, Any]):
+    """Options Selenium du navigateur choisi"""
+    width, _, height = settings['window_size'].partition(',')
+    
+    if settings['browser'] == 'firefox':
+        options = FirefoxOptions()
+        if settings['binary']:
+            options.binary_location = settings['binary']
+        if settings['headless']:
+            options.add_argument("-headless")
+        if width and height:
+            options.add_argument(f"--width={width.strip()}")
+            options.add_argument(f"--height={height.strip()}")
+        options.set_preference("dom.webdriver.enabled", False)
+        if settings['block_assets']:
+            options.set_preference("permissions.default.image", 2)
+            options.set_preference("gfx.downloadable_fonts.enabled", False)
+            options.set_preference("media.autoplay.default", 5)
+            options.set_preference("media.preload.default", 0)
+        if settings['block_trackers']:
+            options.set_preference("privacy.trackingprotection.enabled", True)
+        return options
+    
+    options = EdgeOptions() if settings['browser'] == 'edge' else ChromeOptions()
+    binary = settings['binary']
+    if not binary and settings['browser'] == 'chromium':
+        binary = shutil.which('chromium') or shutil.which('chromium-browser') or ''
+    if binary:
+        options.binary_location = binary
+    
+    if settings['headless']:
+        options.add_argument("--headless=new")
+        options.add_argument("--disable-dev-shm-usage")
+        options.add_argument("--disable-gpu")
+    if width and height:
+        options.add_argument(f"--window-size={width.strip()},{height.strip()}")
+    else:
+        options.add_argument("--start-maximized")
     options.add_argument("--disable-blink-features=AutomationControlled")
     options.add_experimental_option("excludeSwitches", ["enable-automation"])
     options.add_experimental_option('useAutomationExtension', False)
     
-    driver = webdriver.Edge(service=service, options=options)
+    if settings['block_assets']:
+        options.add_argument("--blink-settings=imagesEnabled=false")
+        options.add_argument("--autoplay-policy=user-gesture-required")
+        options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+    return options
+
+
+def browser_service(settings: Dict[str, Any]):
+    """Service du driver ; sans chemin, Selenium Manager trouve (ou télécharge) le driver"""
+    path = settings['driver_path']
+    if not path and settings['browser'] == 'edge' and os.path.exists(DRIVER_PATH):
+        path = DRIVER_PATH
+    if not path and settings['browser'] == 'chromium':
+        path = shutil.which('chromedriver') or ''
+    
+    service_class = {'edge': EdgeService, 'firefox': FirefoxService}.get(settings['browser'], ChromeService)
+    return service_class(path) if path else service_class()
+
+
+def create_driver(settings: Optional[Dict[str, Any]] = None):
+    """Crée un navigateur selon les réglages (BROWSER_SETTINGS par défaut)"""
+    settings = settings or BROWSER_SETTINGS
+    browser_class = {'edge': webdriver.Edge, 'firefox': webdriver.Firefox}.get(settings['browser'], webdriver.Chrome)
+    driver = instrument_driver(browser_class(service=browser_service(settings), options=browser_options(settings)))
+    
+    # Profil utilisé, rapporté par les sessions
+    driver.profile = {
+        'profile': settings['profile'],
+        'browser': settings['browser'],
+        'browser_version': driver.capabilities.get('browserVersion'),
+        'headless': settings['headless'],
+        'block_assets': settings['block_assets'],
+        'block_trackers': settings['block_trackers'],
+        'blocked_url_patterns': 0
+    }
+    
+    # Polices, médias et traqueurs bloqués par URL (Chromium et Edge)
+    if settings['url_patterns'] and settings['browser'] != 'firefox':
+        try:
+            driver.execute_cdp_cmd('Network.enable', {})
+            driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': settings['url_patterns']})
+            driver.profile['blocked_url_patterns'] = len(settings['url_patterns'])
+        except Exception as e:
+            print(f"  ⚠️ Blocage des URLs impossible: {e}")
     
     # Masquer le webdriver
     driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
@@ -619,44 +2035,895 @@ def create_driver():
     return driver
 
 
+BROWSER_SETTINGS = browser_settings()
+
+
 # ===============================================
-# 📝 FONCTION PRINCIPALE DE REMPLISSAGE
+# 🏊 POOL DE NAVIGATEURS
 # ===============================================
 
-def fill_forms(driver, provided_values: Dict = None, use_levenshtein: bool = True, threshold: float = 0.6) -> List[Dict]:
+class DriverPool:
     """
-    Remplit automatiquement TOUS les types de champs
+    Pool de drivers pré-démarrés : le démarrage d'Edge prend plusieurs
+    secondes, on le fait en arrière-plan plutôt qu'au moment de /session/create.
+    
+    - min_size : nombre de navigateurs libres gardés au chaud
+    - max_size : nombre total de navigateurs (libres + loués) ; au-delà,
+      acquire() attend qu'un navigateur soit rendu (acquire_timeout)
+    - release() remet le navigateur à zéro (cookies, storage, about:blank)
+      et le rend au pool ; s'il ne répond plus, il est fermé et remplacé
+    - un thread de maintenance vérifie les navigateurs libres et complète
+      le pool jusqu'à min_size
     """
-    if provided_values is None:
-        provided_values = {}
     
-    # Fusionner avec les valeurs par défaut
-    merged_values = {**DEFAULT_VALUES, **provided_values}
+    def __init__(self, factory, min_size: int = 1, max_size: int = 8,
+                 acquire_timeout: float = 30.0, health_interval: float = 30.0):
+        self.factory = factory
+        self.max_size = max(0, max_size)
+        self.min_size = min(max(0, min_size), self.max_size)
+        self.acquire_timeout = acquire_timeout
+        self.health_interval = health_interval
+        
+        self._idle: deque = deque()
+        self._total = 0  # navigateurs vivants : libres + loués + en démarrage
+        self._cond = threading.Condition()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        
+        self.created = 0
+        self.leased = 0
+        self.recycled = 0
+        self.replaced = 0
+        self.closed = 0
+        self.failed_starts = 0
     
-    filled_fields = []
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+    
+    # ---------- Cycle de vie ----------
+    
+    def start(self) -> None:
+        """Démarre le préchauffage en arrière-plan"""
+        if not self.enabled or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._maintain, name="driver-pool", daemon=True)
+        self._thread.start()
+    
+    def shutdown(self) -> None:
+        """Arrête la maintenance et ferme les navigateurs libres"""
+        self._stop.set()
+        self._wake.set()
+        with self._cond:
+            drivers = list(self._idle)
+            self._idle.clear()
+        for driver in drivers:
+            self._quit(driver)
+    
+    def _maintain(self) -> None:
+        while not self._stop.is_set():
+            self._check_idle()
+            self._fill_to_min()
+            self._wake.wait(self.health_interval)
+            self._wake.clear()
+    
+    def _fill_to_min(self) -> None:
+        while not self._stop.is_set():
+            with self._cond:
+                if len(self._idle) >= self.min_size or self._total >= self.max_size:
+                    return
+                self._total += 1
+            driver = self._start_driver()
+            if driver is None:
+                return
+            with self._cond:
+                self._idle.append(driver)
+                self._cond.notify()
+    
+    def _check_idle(self) -> None:
+        """Remplace les navigateurs libres qui ne répondent plus (crash, fenêtre fermée...)"""
+        with self._cond:
+            count = len(self._idle)
+        for _ in range(count):
+            with self._cond:
+                if not self._idle:
+                    return
+                driver = self._idle.popleft()
+            if self._is_healthy(driver):
+                with self._cond:
+                    self._idle.append(driver)
+                    self._cond.notify()
+            else:
+                print("  ⚠️ Navigateur du pool hors service, remplacement")
+                self.replaced += 1
+                self._quit(driver)
+    
+    # ---------- Location ----------
+    
+    def acquire(self):
+        """Loue un navigateur (libre, sinon démarré à la demande dans la limite de max_size)"""
+        if not self.enabled:
+            self.created += 1
+            return self.factory()
+        
+        deadline = time.time() + self.acquire_timeout
+        while True:
+            with self._cond:
+                while not self._idle and self._total >= self.max_size:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        raise TimeoutError(f"Aucun navigateur disponible ({self.max_size} déjà utilisés)")
+                    self._cond.wait(remaining)
+                
+                if self._idle:
+                    driver = self._idle.popleft()
+                else:
+                    driver = None
+                    self._total += 1
+            
+            # Relancer le préchauffage pour garder min_size navigateurs libres
+            self._wake.set()
+            
+            if driver is None:
+                driver = self._start_driver(raise_errors=True)
+                self.leased += 1
+                return driver
+            
+            if self._is_healthy(driver):
+                self.leased += 1
+                return driver
+            
+            self.replaced += 1
+            self._quit(driver)
+    
+    def discard(self, driver) -> None:
+        """Ferme un navigateur loué sans le rendre au pool (libère sa place pour un neuf)"""
+        self._quit(driver, counted=self.enabled)
+    
+    def release(self, driver) -> None:
+        """Remet le navigateur à zéro et le rend au pool (ou le ferme s'il est hors service)"""
+        if not self.enabled:
+            self._quit(driver, counted=False)
+            return
+        
+        if not self._stop.is_set() and self._reset(driver):
+            with self._cond:
+                self._idle.append(driver)
+                self.recycled += 1
+                self._cond.notify()
+            return
+        
+        self._quit(driver)
+    
+    # ---------- Outils ----------
+    
+    def _start_driver(self, raise_errors: bool = False):
+        try:
+            driver = self.factory()
+            self.created += 1
+            return driver
+        except Exception as e:
+            print(f"  ⚠️ Impossible de démarrer un navigateur: {e}")
+            self.failed_starts += 1
+            with self._cond:
+                self._total -= 1
+                self._cond.notify()
+            if raise_errors:
+                raise
+            return None
+    
+    def _quit(self, driver, counted: bool = True) -> None:
+        try:
+            driver.quit()
+        except Exception:
+            pass
+        self.closed += 1
+        if counted:
+            with self._cond:
+                self._total -= 1
+                self._cond.notify()
+            self._wake.set()
+    
+    @staticmethod
+    def _is_healthy(driver) -> bool:
+        try:
+            return driver.execute_script("return 1") == 1
+        except Exception:
+            return False
+    
+    @staticmethod
+    def _reset(driver) -> bool:
+        """Ferme les onglets en trop, vide cookies et storage, revient sur about:blank"""
+        try:
+            handles = driver.window_handles
+            for handle in handles[1:]:
+                driver.switch_to.window(handle)
+                driver.close()
+            driver.switch_to.window(handles[0])
+            
+            origin = driver.execute_script("return window.location.origin")
+            try:
+                driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
+                if origin and origin != 'null':
+                    driver.execute_cdp_cmd('Storage.clearDataForOrigin', {'origin': origin, 'storageTypes': 'all'})
+            except Exception:
+                # Navigateur sans CDP : seulement le domaine courant
+                driver.delete_all_cookies()
+            driver.execute_script("try { localStorage.clear(); sessionStorage.clear(); } catch (e) {}")
+            
+            driver.get('about:blank')
+            return True
+        except Exception as e:
+            print(f"  ⚠️ Remise à zéro du navigateur impossible: {e}")
+            return False
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            idle = len(self._idle)
+            total = self._total
+        return {
+            "enabled": self.enabled,
+            "min_size": self.min_size,
+            "max_size": self.max_size,
+            "idle": idle,
+            "in_use": total - idle,
+            "total": total,
+            "created": self.created,
+            "leased": self.leased,
+            "recycled": self.recycled,
+            "replaced": self.replaced,
+            "closed": self.closed,
+            "failed_starts": self.failed_starts
+        }
+
+
+DRIVER_POOL = DriverPool(
+    create_driver,
+    min_size=DRIVER_POOL_MIN_SIZE,
+    max_size=DRIVER_POOL_MAX_SIZE,
+    acquire_timeout=DRIVER_POOL_ACQUIRE_TIMEOUT,
+    health_interval=DRIVER_POOL_HEALTH_INTERVAL
+)
+
+
+# ===============================================
+# ⏳ ATTENTE DE LA PAGE
+# ===============================================
+
+# Une seule évaluation par tentative de WebDriverWait
+READY_SCRIPT = """
+const [readyState, selector, formControl, quietMs] = arguments;
+if (readyState && document.readyState !== 'complete') {
+    return false;
+}
+if (selector) {
+    // Sélecteur invalide : inutile d'attendre jusqu'au délai, on le signale
+    try {
+        if (!document.querySelector(selector)) {
+            return false;
+        }
+    } catch (e) {
+        return 'invalid-selector';
+    }
+}
+if (formControl && !document.querySelector('input, textarea, select')) {
+    return false;
+}
+if (quietMs > 0) {
+    // Heuristique : aucune ressource (XHR, fetch, script...) terminée récemment
+    const entries = performance.getEntriesByType('resource');
+    let last = 0;
+    for (const entry of entries) {
+        last = Math.max(last, entry.responseEnd || entry.startTime);
+    }
+    if (performance.now() - last < quietMs) {
+        return false;
+    }
+}
+return true;
+"""
+
+
+def wait_until_ready(driver, strategy: Optional[WaitStrategy] = None, form_control: bool = False) -> tuple:
+    """
+    Attend que la page soit prête selon la stratégie (WebDriverWait, pas de délai fixe).
+    
+    form_control : valeur par défaut si la stratégie ne précise pas form_control.
+    Renvoie (secondes attendues, page prête ?) ; un dépassement du délai n'est
+    pas une erreur, le remplissage continue avec ce qui est présent.
+    Un sélecteur CSS invalide lève une HTTPException 422.
+    """
+    strategy = strategy or WaitStrategy()
+    need_control = form_control if strategy.form_control is None else strategy.form_control
+    quiet_ms = strategy.network_idle_ms if strategy.network_idle else 0
+    
+    start = time.perf_counter()
+    ready = True
+    try:
+        state = WebDriverWait(driver, strategy.timeout, poll_frequency=0.1).until(
+            lambda d: d.execute_script(READY_SCRIPT, strategy.ready_state, strategy.selector, need_control, quiet_ms)
+        )
+    except TimeoutException:
+        state = False
+        ready = False
+        print(f"  ⏳ Page pas prête après {strategy.timeout}s, on continue")
+    
+    if state == 'invalid-selector':
+        raise HTTPException(status_code=422, detail=f"Sélecteur d'attente invalide : {strategy.selector}")
+    
+    return time.perf_counter() - start, ready
+
+
+# ===============================================
+# 📸 SNAPSHOT DU DOM (UN SEUL ALLER-RETOUR)
+# ===============================================
+
+# Observe les champs ajoutés ou modifiés (type, name, disabled...), et les champs
+# d'un conteneur qui change de style / classe / hidden (bloc révélé) : ce sont
+# les seuls champs que le mode incrémental traite. Sans effet s'il est déjà installé.
+# L'observateur ne voit pas l'intérieur des iframes ni des shadow roots : en
+# ajouter un invalide la référence, le snapshot suivant sera complet.
+OBSERVER_SCRIPT = """
+if (!window.__autofillDirty) {
+    const dirty = new Set();
+    const controls = 'input, textarea, select';
+    const markTree = node => {
+        if (node.nodeType !== 1) return;
+        if (node.matches(controls)) dirty.add(node);
+        else node.querySelectorAll(controls).forEach(el => dirty.add(el));
+    };
+    const hasNested = node => node.nodeType === 1 && (
+        node.matches('iframe, frame') || !!node.shadowRoot || !!node.querySelector('iframe, frame')
+        || Array.from(node.querySelectorAll('*')).some(el => el.shadowRoot));
+    new MutationObserver(records => {
+        for (const record of records) {
+            if (record.type !== 'childList') {
+                markTree(record.target);
+                continue;
+            }
+            record.addedNodes.forEach(node => {
+                markTree(node);
+                if (hasNested(node)) window.__autofillBaseline = false;
+            });
+        }
+    }).observe(document, {
+        childList: true, subtree: true, attributes: true,
+        attributeFilter: ['type', 'name', 'id', 'disabled', 'hidden', 'style', 'class']
+    });
+    window.__autofillDirty = dirty;
+}
+"""
+
+# Collecte tous les champs d'un document en un seul execute_script :
+# chaque get_attribute / is_displayed étant un aller-retour HTTP vers le
+# WebDriver, tout est lu côté navigateur et renvoyé en données simples.
+# Les shadow roots ouverts sont parcourus dans le même passage ; les iframes
+# same-origin visibles sont renvoyées pour un passage par frame (leurs
+# éléments ne sont utilisables par Selenium qu'une fois dans la frame).
+# En mode incrémental (arguments[2]), seuls les champs marqués par
+# OBSERVER_SCRIPT depuis le snapshot précédent sont renvoyés, si ce snapshot
+# n'a trouvé ni iframe ni shadow root (sinon snapshot complet). Seul un
+# snapshot pris pour remplir (arguments[3], consume) vide l'ensemble des champs
+# marqués et sert de référence au suivant ; une lecture (/form/plan) n'y touche pas.
+SNAPSHOT_SCRIPT = OBSERVER_SCRIPT + """
+const attributes = arguments[0];
+const basePath = arguments[1] || [];
+const incremental = arguments[2] || false;
+const consume = arguments[3] || false;
+
+function isDisplayed(el) {
+    if (el.checkVisibility && !el.checkVisibility({opacityProperty: true, visibilityProperty: true})) {
+        return false;
+    }
+    const style = window.getComputedStyle(el);
+    if (style.display === 'none' || style.visibility === 'hidden' || style.visibility === 'collapse') {
+        return false;
+    }
+    const rect = el.getBoundingClientRect();
+    return rect.width > 0 && rect.height > 0;
+}
+
+function describeHost(el) {
+    const tag = el.tagName.toLowerCase();
+    if (el.id) return tag + '#' + el.id;
+    const name = el.getAttribute('name');
+    return name ? tag + '[name=' + name + ']' : tag;
+}
+
+const fields = [];
+const frames = [];
+let shadowRoots = 0;
+
+// scope : numéro du shadow root du champ dans ce document (0 = document)
+function addField(el, path, scope) {
+    const tag = el.tagName.toLowerCase();
+    const attrs = {};
+    for (const name of attributes) {
+        // value : valeur courante (comme get_attribute), pas l'attribut HTML
+        const val = name === 'value' ? el.value : el.getAttribute(name);
+        if (val) {
+            attrs[name] = String(val);
+        }
+    }
+    let type = tag;
+    if (tag === 'input') {
+        type = (el.getAttribute('type') || 'text').toLowerCase();
+    }
+    fields.push({
+        element: el,
+        index: fields.length,
+        path: path.join(' > '),
+        scope: scope,
+        tag: tag,
+        type: type,
+        attrs: attrs,
+        visible: isDisplayed(el),
+        enabled: !el.matches(':disabled'),
+        checked: !!el.checked,
+        options: tag === 'select'
+            ? Array.from(el.options).map(opt => ({
+                index: opt.index,
+                text: (opt.text || '').trim(),
+                value: opt.value,
+                disabled: opt.disabled,
+                selected: opt.selected
+            }))
+            : null
+    });
+}
+
+function collect(root, path, scope) {
+    for (const el of root.querySelectorAll('*')) {
+        if (el.matches('input, textarea, select')) {
+            addField(el, path, scope);
+        } else if (el.tagName === 'IFRAME' || el.tagName === 'FRAME') {
+            let doc = null;
+            try { doc = el.contentDocument; } catch (e) {}
+            // Cross-origin : contentDocument null, ignorée
+            if (doc && isDisplayed(el)) {
+                frames.push({element: el, path: path.concat(describeHost(el))});
+            }
+        }
+        if (el.shadowRoot) {
+            shadowRoots++;
+            collect(el.shadowRoot, path.concat(describeHost(el) + '::shadow-root'), shadowRoots);
+        }
+    }
+}
+
+const dirty = window.__autofillDirty;
+
+if (incremental && consume && window.__autofillBaseline) {
+    const elements = new Set();
+    for (const el of dirty) {
+        if (!el.isConnected) continue;
+        elements.add(el);
+        // Une radio modifiée : tout son groupe, pour choisir la bonne option
+        if (el.type === 'radio' && el.name) {
+            el.getRootNode().querySelectorAll('input[type=radio]').forEach(r => {
+                if (r.name === el.name) elements.add(r);
+            });
+        }
+    }
+    dirty.clear();
+    Array.from(elements)
+        .sort((a, b) => a.compareDocumentPosition(b) & Node.DOCUMENT_POSITION_FOLLOWING ? -1 : 1)
+        .forEach(el => addField(el, basePath, 0));
+    return {fields: fields, frames: [], incremental: true, host: location.hostname};
+}
+
+collect(document, basePath, 0);
+if (consume) {
+    dirty.clear();
+    // Champs hors de portée de l'observateur : pas de mode incrémental sur cette page
+    window.__autofillBaseline = frames.length === 0 && shadowRoots === 0;
+}
+return {fields: fields, frames: frames, incremental: false, host: location.hostname};
+"""
+
+
+def install_observer(driver) -> None:
+    """Installe l'observateur des champs (mode incrémental) dès l'ouverture de la page"""
+    try:
+        driver.execute_script(OBSERVER_SCRIPT)
+    except Exception as e:
+        print(f"  ⚠️ Observateur des champs non installé: {e}")
+
+
+def snapshot_frames(driver, frames: List[Dict], parent: tuple, chain: List, fields: List[Dict],
+                    frame_chains: Dict[tuple, List], consume: bool = True) -> None:
+    """Un passage de SNAPSHOT_SCRIPT par iframe (récursif), depuis le contexte de la frame parente"""
+    for position, frame in enumerate(frames):
+        frame_id = parent + (position,)
+        try:
+            driver.switch_to.frame(frame['element'])
+        except Exception as e:
+            print(f"  ⚠️ Frame {' > '.join(frame['path'])} inaccessible: {e}")
+            continue
+        
+        try:
+            result = driver.execute_script(SNAPSHOT_SCRIPT, FIELD_ATTRIBUTES, frame['path'], False, consume) or {}
+            frame_chains[frame_id] = chain + [frame['element']]
+            for field in result.get('fields', []):
+                field['frame'] = frame_id
+                fields.append(field)
+            if len(frame_id) < FRAME_MAX_DEPTH and result.get('frames'):
+                snapshot_frames(driver, result['frames'], frame_id, frame_chains[frame_id], fields, frame_chains, consume)
+        except Exception as e:
+            print(f"  ⚠️ Frame {' > '.join(frame['path'])} illisible: {e}")
+        finally:
+            driver.switch_to.parent_frame()
+
+
+def snapshot_form_fields(driver, frames: bool = True, incremental: bool = False, consume: bool = True) -> List[Dict]:
+    """
+    Capture tous les inputs / textareas / selects de la page : un appel pour le
+    document (shadow roots ouverts compris), puis un par iframe same-origin.
+    
+    Chaque champ est un dict : element (WebElement, pour agir), index, tag,
+    type, attrs, visible, enabled, checked, options (selects uniquement),
+    frame (() = document principal, sinon position de l'iframe à chaque niveau),
+    scope (shadow root dans la frame, 0 = hors shadow root) et path (iframes et
+    hôtes de shadow roots traversés, '' au premier niveau ; lisible, pas unique).
+    
+    Les iframes traversées sont gardées sur le driver (driver.frame_chains,
+    frame → chaîne de WebElements) : l'exécution du plan bascule une fois par
+    frame sans les rechercher. driver.page_host reçoit le domaine de la page
+    (correspondances apprises).
+    
+    incremental : seulement les champs du document principal ajoutés ou
+    modifiés depuis le précédent snapshot avec consume (voir OBSERVER_SCRIPT) ;
+    snapshot complet si la page n'a pas encore été remplie, ou si elle contient
+    des iframes ou des shadow roots (que l'observateur ne voit pas).
+    
+    consume : snapshot pris pour remplir, qui devient la référence du mode
+    incrémental ; False pour une simple lecture (/form/plan), sans effet sur
+    le remplissage incrémental suivant.
+    """
+    result = driver.execute_script(SNAPSHOT_SCRIPT, FIELD_ATTRIBUTES, [], incremental, consume) or {}
+    driver.page_host = result.get('host') or None
+    fields = result.get('fields', [])
+    for field in fields:
+        field['frame'] = ()
+    if result.get('incremental'):
+        print(f"  🔁 Incrémental : {len(fields)} champ(s) ajouté(s) ou modifié(s)")
+        return fields
+    
+    frame_chains: Dict[tuple, List] = {}
+    if frames and result.get('frames'):
+        snapshot_frames(driver, result['frames'], (), [], fields, frame_chains, consume)
+        # Numérotation unique sur toute la page (memo du plan, radios)
+        for index, field in enumerate(fields):
+            field['index'] = index
+    driver.frame_chains = frame_chains
+    return fields
+
+
+@contextmanager
+def frame_context(driver, frame: tuple):
+    """Bascule dans une frame du dernier snapshot le temps d'un bloc, puis revient au document"""
+    if frame:
+        for element in driver.frame_chains[frame]:
+            driver.switch_to.frame(element)
+    try:
+        yield
+    finally:
+        if frame:
+            driver.switch_to.default_content()
+
+
+def frame_groups(plan: List[Dict], indexes) -> List[tuple]:
+    """Étapes regroupées par frame, dans l'ordre de première apparition : [(frame, [indices])]"""
+    groups: Dict[tuple, List[int]] = {}
+    for i in indexes:
+        groups.setdefault(plan[i]['field'].get('frame', ()), []).append(i)
+    return list(groups.items())
+
+
+# ===============================================
+# 📄 ANALYSE HTML STATIQUE (SANS NAVIGATEUR)
+# ===============================================
+
+# Éléments sans balise de fin
+VOID_ELEMENTS = frozenset(['area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta',
+                           'param', 'source', 'track', 'wbr'])
+
+# Contenu jamais rendu comme champs (querySelectorAll ne le voit pas, scripts actifs)
+INERT_ELEMENTS = frozenset(['template', 'noscript'])
+
+_HIDDEN_STYLE = re.compile(r'(?:^|;)\s*(?:display\s*:\s*none|visibility\s*:\s*(?:hidden|collapse))\s*(?:!important\s*)?(?:;|$)', re.I)
+
+
+class StaticFormParser(HTMLParser):
+    """
+    Construit, à partir du HTML brut, les mêmes champs que SNAPSHOT_SCRIPT
+    (element=None) : tout le pipeline d'identification et de plan s'applique
+    ensuite sans Selenium.
+    
+    Sans CSS ni JavaScript, la visibilité est déduite du HTML seul : type
+    hidden, attribut hidden et style inline display:none / visibility:hidden,
+    sur le champ ou un de ses ancêtres. Un <fieldset disabled> désactive ses champs.
+    """
+    
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.fields: List[Dict] = []
+        # Pile des éléments ouverts : (balise, caché, désactivé, inerte)
+        self._stack: List[tuple] = []
+        self._select: Optional[Dict] = None
+        self._option: Optional[Dict] = None
+        self._optgroup_disabled = False
+        self._textarea: Optional[Dict] = None
+    
+    # --- état hérité des ancêtres ---
+    
+    def _inherited(self) -> tuple:
+        if not self._stack:
+            return False, False, False
+        _, hidden, disabled, inert = self._stack[-1]
+        return hidden, disabled, inert
+    
+    @staticmethod
+    def _is_hidden(attrs: Dict) -> bool:
+        return 'hidden' in attrs or bool(_HIDDEN_STYLE.search(attrs.get('style') or ''))
+    
+    # --- balises ---
+    
+    def handle_starttag(self, tag, attr_list):
+        attrs = {name: (value if value is not None else '') for name, value in attr_list}
+        hidden, disabled, inert = self._inherited()
+        hidden = hidden or self._is_hidden(attrs)
+        
+        if tag == 'option' or tag == 'optgroup':
+            self._close_option()
+        
+        if not inert:
+            if tag == 'input':
+                self._add_field(tag, attrs, hidden, disabled)
+            elif tag in ('textarea', 'select'):
+                field = self._add_field(tag, attrs, hidden, disabled)
+                if tag == 'textarea':
+                    self._textarea = field
+                    field['_text'] = []
+                else:
+                    self._select = field
+            elif tag == 'optgroup' and self._select is not None:
+                self._optgroup_disabled = 'disabled' in attrs
+            elif tag == 'option' and self._select is not None:
+                self._option = {
+                    'index': len(self._select['options']),
+                    'text': [],
+                    'value': attrs.get('value'),
+                    'disabled': 'disabled' in attrs or self._optgroup_disabled,
+                    'selected': 'selected' in attrs
+                }
+        
+        if tag not in VOID_ELEMENTS:
+            self._stack.append((
+                tag,
+                hidden,
+                disabled or (tag == 'fieldset' and 'disabled' in attrs),
+                inert or tag in INERT_ELEMENTS
+            ))
+    
+    def handle_startendtag(self, tag, attr_list):
+        self.handle_starttag(tag, attr_list)
+        if tag not in VOID_ELEMENTS:
+            self.handle_endtag(tag)
+    
+    def handle_endtag(self, tag):
+        if tag in ('option', 'optgroup', 'select'):
+            self._close_option()
+        if tag == 'optgroup':
+            self._optgroup_disabled = False
+        elif tag == 'select' and self._select is not None:
+            self._finish_select(self._select)
+            self._select = None
+        elif tag == 'textarea' and self._textarea is not None:
+            self._finish_textarea(self._textarea)
+            self._textarea = None
+        
+        # Fermer jusqu'à la balise correspondante (HTML mal formé toléré)
+        for i in range(len(self._stack) - 1, -1, -1):
+            if self._stack[i][0] == tag:
+                del self._stack[i:]
+                break
+    
+    def handle_data(self, data):
+        if self._option is not None:
+            self._option['text'].append(data)
+        elif self._textarea is not None:
+            self._textarea['_text'].append(data)
+    
+    def close(self):
+        super().close()
+        self._close_option()
+        if self._select is not None:
+            self._finish_select(self._select)
+        if self._textarea is not None:
+            self._finish_textarea(self._textarea)
+    
+    # --- construction des champs ---
+    
+    def _add_field(self, tag: str, attrs: Dict, hidden: bool, disabled: bool) -> Dict:
+        itype = (attrs.get('type') or 'text').lower() if tag == 'input' else tag
+        field = {
+            'element': None,
+            'index': len(self.fields),
+            'tag': tag,
+            'type': itype,
+            'attrs': {name: attrs[name] for name in FIELD_ATTRIBUTES if name != 'value' and attrs.get(name)},
+            'visible': not hidden and itype != 'hidden',
+            'enabled': not (disabled or 'disabled' in attrs),
+            'checked': 'checked' in attrs,
+            'options': [] if tag == 'select' else None
+        }
+        if tag == 'select':
+            field['_multiple'] = 'multiple' in attrs
+        elif tag == 'input':
+            # Valeur courante comme el.value (checkbox/radio sans value → "on")
+            value = attrs.get('value')
+            if value is None and itype in ('checkbox', 'radio'):
+                value = 'on'
+            self._set_value(field, value)
+        self.fields.append(field)
+        return field
+    
+    @staticmethod
+    def _set_value(field: Dict, value: Optional[str]) -> None:
+        if value:
+            field['attrs']['value'] = value
+    
+    def _close_option(self):
+        if self._option is not None and self._select is not None:
+            option = self._option
+            text = ' '.join(''.join(option.pop('text')).split())
+            if option['value'] is None:
+                option['value'] = text
+            option['text'] = text
+            self._select['options'].append(option)
+        self._option = None
+    
+    def _finish_select(self, field: Dict) -> None:
+        options = field['options']
+        multiple = field.pop('_multiple')
+        # Option sélectionnée : la dernière marquée selected, sinon la première active (select simple)
+        selected = [opt for opt in options if opt.pop('selected')]
+        if selected:
+            value = selected[-1]['value']
+        elif not multiple and options:
+            value = next((opt['value'] for opt in options if not opt['disabled']), '')
+        else:
+            value = ''
+        self._set_value(field, value)
+    
+    def _finish_textarea(self, field: Dict) -> None:
+        text = ''.join(field.pop('_text'))
+        # Comme le navigateur : le premier saut de ligne après <textarea> est ignoré
+        if text.startswith('\r\n'):
+            text = text[2:]
+        elif text.startswith('\n'):
+            text = text[1:]
+        self._set_value(field, text)
+
+
+def parse_html_fields(html: str) -> List[Dict]:
+    """Champs d'une page HTML (même forme que snapshot_form_fields, element=None)"""
+    parser = StaticFormParser()
+    parser.feed(html)
+    parser.close()
+    return parser.fields
+
+
+def load_html_fields(path: str) -> List[Dict]:
+    """Champs d'un fichier HTML enregistré"""
+    with open(path, encoding='utf-8', errors='replace') as f:
+        return parse_html_fields(f.read())
+
+
+def plan_from_html(html: str, provided_values: Dict = None, threshold: float = 0.6,
+                   identification: str = 'field', info: Optional[Dict] = None) -> List[Dict]:
+    """
+    Plan de remplissage complet d'une page HTML, sans navigateur : mêmes
+    règles que fill_forms (et même cache des plans, partagé avec les sessions).
+    """
+    merged_values = {**DEFAULT_VALUES, **(provided_values or {})}
+    return plan_fields(parse_html_fields(html), merged_values, threshold, identification, info)
+
+
+# ===============================================
+# 🧭 PLAN DE REMPLISSAGE (SANS NAVIGATEUR)
+# ===============================================
+
+# Choix d'options gardés par formulaire (un par valeur cible différente)
+MAX_MEMO_SELECT_CHOICES = 1024
+
+
+def new_plan_memo() -> Dict:
+    """Décisions réutilisables d'un formulaire (mises en cache par FORM_PLAN_CACHE)"""
+    return {
+        'identities': {},         # index du champ → (field_name, logical)
+        'select_candidates': {}   # (index du select, valeur cible) → candidats
+    }
+
+
+def build_fill_plan(fields: List[Dict], merged_values: Dict, threshold: float = 0.6,
+                    memo: Optional[Dict] = None, identification: str = 'field',
+                    learned: Optional[Dict[str, str]] = None) -> List[Dict]:
+    """
+    Décide quoi faire de chaque champ du snapshot, sans aucun appel WebDriver.
+    
+    `memo` (voir new_plan_memo) garde l'identification de chaque champ et les
+    options choisies : avec le memo d'un formulaire de même structure, aucune
+    identification Levenshtein n'est refaite.
+    
+    `identification` : 'field' (chaque champ identifié seul) ou 'matrix' (une
+    matrice champs × clés pour toute la page puis affectation globale, voir
+    assign_fields ; checkboxes et radios restent identifiées champ par champ).
+    
+    `learned` (voir MappingStore.lookup) : {nom du champ: champ logique}
+    appliqué avant toute identification floue, et donc quels que soient
+    `threshold` et `identification`.
+    
+    Chaque étape du plan est un dict :
+    - field : champ du snapshot
+    - action : 'type' (saisie), 'click' (checkbox/radio) ou 'select'
+    - value : texte à saisir (action 'type')
+    - candidates : [(méthode, cible, valeur rapportée)] à essayer dans l'ordre (action 'select')
+    - report : entrée de filled_fields une fois l'étape appliquée
+    """
+    plan = []
+    if memo is None:
+        memo = new_plan_memo()
+    identities = memo['identities']
+    select_candidates = memo['select_candidates']
     
     def get_value(key: str):
         return merged_values.get(key)
     
-    # Trouver tous les éléments de formulaire (même hors <form>)
-    all_inputs = driver.find_elements(By.TAG_NAME, 'input')
-    all_textareas = driver.find_elements(By.TAG_NAME, 'textarea')
-    all_selects = driver.find_elements(By.TAG_NAME, 'select')
+    def identify(field: Dict) -> tuple:
+        if field['index'] not in identities:
+            identities[field['index']] = identify_field(field, threshold)
+        return identities[field['index']]
     
-    print(f'\n📋 Éléments trouvés: {len(all_inputs)} inputs, {len(all_textareas)} textareas, {len(all_selects)} selects')
-    print('-' * 50)
+    if identification not in ('field', 'matrix'):
+        raise ValueError(f"identification inconnue: {identification}")
+    
+    # Correspondances apprises ou imposées pour ce domaine : pas de Levenshtein
+    if learned:
+        for field in fields:
+            attrs = field['attrs']
+            field_name = attrs.get('name') or attrs.get('id')
+            if field['index'] not in identities and field_name in learned:
+                identities[field['index']] = (field_name, learned[field_name])
+    
+    if identification == 'matrix':
+        eligible = [f for f in fields if matrix_eligible(f)]
+        pending = [f for f in eligible if f['index'] not in identities]
+        if pending:
+            taken = frozenset(identities[f['index']][1] for f in eligible if f['index'] in identities)
+            identities.update(assign_fields(pending, threshold, taken))
+    
+    all_inputs = [f for f in fields if f['tag'] == 'input']
+    all_textareas = [f for f in fields if f['tag'] == 'textarea']
+    all_selects = [f for f in fields if f['tag'] == 'select']
+    checkbox_context = CheckboxContext(merged_values)
+    radio_groups = group_radios(all_inputs)
+    seen_radio_groups = set()
     
     # ============================================
     # 1. TRAITEMENT DES INPUTS
     # ============================================
-    for inp in all_inputs:
+    for field in all_inputs:
         try:
-            if not inp.is_displayed():
+            if not field['visible']:
                 continue
             
-            itype = (inp.get_attribute('type') or 'text').lower()
-            all_attrs = get_all_field_attributes(inp)
-            field_name, logical = identify_field(inp)
+            itype = field['type']
+            all_attrs = field['attrs']
+            field_name, logical = identify(field)
             
             # Ignorer certains types
             if itype in ['submit', 'button', 'hidden', 'image', 'reset', 'file']:
@@ -666,20 +2933,22 @@ def fill_forms(driver, provided_values: Dict = None, use_levenshtein: bool = Tru
             # CHECKBOXES
             # ----------------------------------------
             if itype == 'checkbox':
-                result = handle_checkbox(inp, field_name, merged_values, logical, all_attrs)
+                result = handle_checkbox(field, field_name, checkbox_context, logical, all_attrs)
                 if result:
-                    filled_fields.append(result)
-                    print(f"  ☑️  Checkbox '{field_name}' = {result['value']}")
+                    plan.append({'field': field, 'action': 'click', 'report': result})
                 continue
             
             # ----------------------------------------
             # RADIOS
             # ----------------------------------------
             if itype == 'radio':
-                result = handle_radio(inp, field_name, merged_values, logical, all_attrs)
-                if result:
-                    filled_fields.append(result)
-                    print(f"  🔘 Radio '{field_name}' = {result['value']}")
+                # Tout le groupe est résolu à sa première radio : un seul clic par groupe
+                group_key = radio_group_key(field)
+                if group_key in radio_groups and group_key not in seen_radio_groups:
+                    seen_radio_groups.add(group_key)
+                    result = resolve_radio_group(radio_groups[group_key], identify, merged_values)
+                    if result:
+                        plan.append({'field': result[0], 'action': 'click', 'report': result[1]})
                 continue
             
             # ----------------------------------------
@@ -687,25 +2956,24 @@ def fill_forms(driver, provided_values: Dict = None, use_levenshtein: bool = Tru
             # ----------------------------------------
             if itype == 'password':
                 value = get_value('password')
-                if value and inp.is_enabled():
-                    try:
-                        inp.clear()
-                        inp.send_keys(str(value))
-                        filled_fields.append({
+                if value and field['enabled']:
+                    plan.append({
+                        'field': field,
+                        'action': 'type',
+                        'value': str(value),
+                        'report': {
                             'type': 'password',
                             'name': field_name,
                             'logical': 'password',
                             'value': '********'  # Masquer dans les logs
-                        })
-                        print(f"  🔒 Password '{field_name}' = ********")
-                    except:
-                        pass
+                        }
+                    })
                 continue
             
             # ----------------------------------------
             # CHAMPS TEXTE ET AUTRES
             # ----------------------------------------
-            if not inp.is_enabled():
+            if not field['enabled']:
                 continue
             
             value = None
@@ -735,20 +3003,18 @@ def fill_forms(driver, provided_values: Dict = None, use_levenshtein: bool = Tru
                 if parts:
                     value = parts['year']
             
-            # Remplir le champ
             if value is not None:
-                try:
-                    inp.clear()
-                    inp.send_keys(str(value))
-                    filled_fields.append({
+                plan.append({
+                    'field': field,
+                    'action': 'type',
+                    'value': str(value),
+                    'report': {
                         'type': itype,
                         'name': field_name,
                         'logical': logical,
                         'value': value
-                    })
-                    print(f"  ✏️  Input '{field_name}' ({itype}) = '{value}'")
-                except Exception as e:
-                    print(f"  ⚠️ Erreur input {field_name}: {e}")
+                    }
+                })
         
         except Exception as e:
             pass
@@ -756,12 +3022,12 @@ def fill_forms(driver, provided_values: Dict = None, use_levenshtein: bool = Tru
     # ============================================
     # 2. TRAITEMENT DES TEXTAREAS
     # ============================================
-    for ta in all_textareas:
+    for field in all_textareas:
         try:
-            if not (ta.is_displayed() and ta.is_enabled()):
+            if not (field['visible'] and field['enabled']):
                 continue
             
-            field_name, logical = identify_field(ta)
+            field_name, logical = identify(field)
             
             value = None
             if field_name in merged_values:
@@ -772,123 +3038,972 @@ def fill_forms(driver, provided_values: Dict = None, use_levenshtein: bool = Tru
                 value = get_value('comments')
             
             if value is not None:
-                try:
-                    ta.clear()
-                    ta.send_keys(str(value))
-                    filled_fields.append({
+                plan.append({
+                    'field': field,
+                    'action': 'type',
+                    'value': str(value),
+                    'report': {
                         'type': 'textarea',
                         'name': field_name,
                         'logical': logical,
                         'value': str(value)[:50] + '...' if len(str(value)) > 50 else value
-                    })
-                    print(f"  📝 Textarea '{field_name}' = '{str(value)[:30]}...'")
-                except:
-                    pass
+                    }
+                })
         except:
             pass
     
     # ============================================
     # 3. TRAITEMENT DES SELECTS
     # ============================================
-    for sel_elem in all_selects:
+    for field in all_selects:
         try:
-            if not (sel_elem.is_displayed() and sel_elem.is_enabled()):
+            if not (field['visible'] and field['enabled']):
                 continue
             
-            sel = Select(sel_elem)
-            field_name, logical = identify_field(sel_elem)
-            
-            selected_value = None
+            field_name, logical = identify(field)
             
-            # Champ Title/Civilité
-            if logical == 'title' or 'title' in (field_name or '').lower():
-                title_opt = get_title_option(sel_elem)
-                if title_opt:
-                    try:
-                        sel.select_by_visible_text(title_opt)
-                        selected_value = title_opt
-                    except:
-                        pass
-            
-            # Champ Country
-            elif logical == 'country' or 'country' in (field_name or '').lower():
-                for val in ['France', 'FR', 'FRA', 'French']:
-                    try:
-                        sel.select_by_visible_text(val)
-                        selected_value = val
-                        break
-                    except:
-                        try:
-                            sel.select_by_value(val)
-                            selected_value = val
-                            break
-                        except:
-                            continue
-            
-            # Champ Heure d'arrivée
-            elif logical == 'arrival_time' or 'arrival' in (field_name or '').lower() or 'heure' in (field_name or '').lower():
-                time_opt = handle_time_select(sel_elem, merged_values, logical)
-                if time_opt:
-                    try:
-                        sel.select_by_visible_text(time_opt)
-                        selected_value = time_opt
-                    except:
-                        pass
-            
-            # Autres selects
-            else:
-                opt = merged_values.get(field_name) or get_value(logical)
-                if opt:
-                    for method in ['visible_text', 'value', 'levenshtein']:
-                        try:
-                            if method == 'visible_text':
-                                sel.select_by_visible_text(str(opt))
-                            elif method == 'value':
-                                sel.select_by_value(str(opt))
-                            elif method == 'levenshtein':
-                                closest = find_closest_option(sel_elem, str(opt))
-                                if closest:
-                                    sel.select_by_visible_text(closest)
-                                    opt = closest
-                                else:
-                                    continue
-                            selected_value = opt
-                            break
-                        except:
-                            continue
+            memo_key = (field['index'], repr(merged_values.get(field_name) or get_value(logical)),
+                        repr(get_value('arrival_time')))
+            candidates = select_candidates.get(memo_key)
+            if candidates is None:
+                candidates = resolve_select_candidates(field, field_name, logical, merged_values)
+                if len(select_candidates) >= MAX_MEMO_SELECT_CHOICES:
+                    select_candidates.clear()
+                select_candidates[memo_key] = candidates
             
-            if selected_value:
-                filled_fields.append({
-                    'type': 'select',
-                    'name': field_name,
-                    'logical': logical,
-                    'value': selected_value
+            if candidates:
+                plan.append({
+                    'field': field,
+                    'action': 'select',
+                    'candidates': candidates,
+                    'report': {
+                        'type': 'select',
+                        'name': field_name,
+                        'logical': logical,
+                        'value': None
+                    }
                 })
-                print(f"  🔽 Select '{field_name}' = '{selected_value}'")
         
         except Exception as e:
             pass
     
-    return filled_fields
+    return plan
+
+
+def resolve_select_candidates(field: Dict, field_name: str, logical: Optional[str], merged_values: Dict) -> List[tuple]:
+    """
+    Option à sélectionner pour un select : [('index', index, valeur rapportée)] ou [].
+    Résolue sur l'index des options du snapshot, sans aucun appel WebDriver.
+    """
+    options = get_option_index(field)
+    choice = None
+    
+    # Champ Title/Civilité
+    if logical == 'title' or 'title' in (field_name or '').lower():
+        title_opt = get_title_option(field)
+        if title_opt:
+            choice = (options.find(title_opt), title_opt)
+    
+    # Champ Country (correspondance exacte ou normalisée seulement : un repli
+    # approché choisirait un autre pays quand la France n'est pas proposée)
+    elif logical == 'country' or 'country' in (field_name or '').lower():
+        for val in COUNTRY_OPTION_VALUES:
+            index = options.find(val)
+            if index is not None:
+                choice = (index, val)
+                break
+    
+    # Champ Heure d'arrivée
+    elif logical == 'arrival_time' or 'arrival' in (field_name or '').lower() or 'heure' in (field_name or '').lower():
+        time_opt = handle_time_select(field, merged_values, logical)
+        if time_opt:
+            choice = (options.find(time_opt), time_opt)
+    
+    # Autres selects
+    else:
+        opt = merged_values.get(field_name) or merged_values.get(logical)
+        if opt:
+            index = options.find(opt)
+            if index is not None:
+                choice = (index, opt)
+            else:
+                index = options.closest(str(opt))
+                if index is not None:
+                    choice = (index, options.text(index))
+    
+    if choice is None or choice[0] is None:
+        return []
+    return [('index', choice[0], choice[1])]
+
+
+def plan_fields(fields: List[Dict], merged_values: Dict, threshold: float = 0.6,
+                identification: str = 'field', info: Optional[Dict] = None,
+                domain: Optional[str] = None) -> List[Dict]:
+    """
+    build_fill_plan avec le memo de FORM_PLAN_CACHE (navigateur ou HTML statique).
+    `info`, si fourni, reçoit l'empreinte de la page et si le plan était en cache.
+    `domain` : correspondances apprises de MAPPING_STORE à appliquer.
+    """
+    learned = MAPPING_STORE.lookup(domain)
+    
+    # Même structure de page déjà vue : identification et options reprises du cache
+    # (par domaine et version de ses correspondances s'il en a)
+    cache_key = (form_fingerprint(fields), threshold, identification,
+                 domain if learned else None, MAPPING_STORE.version(domain) if learned else 0)
+    memo = FORM_PLAN_CACHE.get(cache_key)
+    if info is not None:
+        info.update({'fingerprint': cache_key[0], 'cached': memo is not None})
+    if memo is not None:
+        print(f"  🗺️  Plan en cache (empreinte {cache_key[0][:8]})")
+    else:
+        memo = new_plan_memo()
+        FORM_PLAN_CACHE.put(cache_key, memo)
+    
+    return build_fill_plan(fields, merged_values, threshold, memo, identification, learned)
+
+
+def describe_plan(plan: List[Dict]) -> List[Dict]:
+    """Plan lisible et sérialisable : champ → champ logique → action / valeur"""
+    described = []
+    for step in plan:
+        field, report = step['field'], step['report']
+        entry = {
+            'index': field['index'],
+            'tag': field['tag'],
+            'type': field['type'],
+            'name': report['name'],
+            'logical': report['logical'],
+            'action': step['action'],
+            'value': report['value']
+        }
+        if field.get('path'):
+            entry['path'] = field['path']
+        if step['action'] == 'select':
+            method, target, reported = step['candidates'][0]
+            entry['value'] = reported
+            if method == 'index':
+                entry['option_index'] = target
+        described.append(entry)
+    return described
+
+
+def form_fingerprint(fields: List[Dict]) -> str:
+    """
+    Empreinte de la structure des champs : tout ce dont dépendent l'identification
+    et le choix des options (balise, type, attributs d'identification, visibilité,
+    options des selects). Calculée sur le snapshot, sans appel WebDriver.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for field in fields:
+        attrs = field['attrs']
+        parts = [field.get('path', ''), field['tag'], field['type'],
+                 '1' if field['visible'] else '0', '1' if field['enabled'] else '0']
+        parts += [attrs.get(attr, '') for attr in ('name', 'id', 'placeholder', 'aria-label', 'data-testid', 'class')]
+        if field.get('options'):
+            parts += [f"{opt['text']}\x1d{opt['value']}" for opt in field['options']]
+        digest.update('\x1f'.join(parts).encode('utf-8', 'replace'))
+        digest.update(b'\x1e')
+    return digest.hexdigest()
 
 
 # ===============================================
-# 🌐 ENDPOINTS API
+# ⌨️ EXÉCUTION DU PLAN (CLAVIER OU JAVASCRIPT)
 # ===============================================
 
-@app.get("/")
-async def root():
-    return {
-        "message": "Form Autofill API - Version Complète",
-        "version": "3.0.0",
-        "features": [
-            "checkboxes (simples et multiples)",
-            "radios (tous types)",
-            "selects (avec Levenshtein)",
-            "textareas",
-            "passwords",
-            "dates (séparées ou combinées)",
-            "heure d'arrivée (plage horaire)"
+# Applique tout le plan en un seul execute_script. Les setters natifs de
+# `value` + événements input/change font que React/Vue voient la saisie
+# (une affectation directe à el.value serait ignorée par leur état interne).
+JS_FILL_SCRIPT = """
+const steps = arguments[0];
+
+function setNativeValue(el, value) {
+    const proto = el instanceof HTMLTextAreaElement ? HTMLTextAreaElement.prototype : HTMLInputElement.prototype;
+    const descriptor = Object.getOwnPropertyDescriptor(proto, 'value');
+    if (descriptor && descriptor.set) {
+        descriptor.set.call(el, value);
+    } else {
+        el.value = value;
+    }
+}
+
+function fire(el, type) {
+    el.dispatchEvent(new Event(type, {bubbles: true}));
+}
+
+function findOption(el, method, target) {
+    for (const opt of el.options) {
+        if (method === 'visible_text' && opt.text.trim() === target) return opt.index;
+        if (method === 'value' && opt.value === target) return opt.index;
+        if (method === 'index' && opt.index === target) return opt.index;
+    }
+    return -1;
+}
+
+return steps.map(step => {
+    const el = step.element;
+    try {
+        if (!el || !el.isConnected) {
+            return {ok: false};
+        }
+        if (step.action === 'type') {
+            if (el.focus) el.focus();
+            setNativeValue(el, step.value);
+            fire(el, 'input');
+            fire(el, 'change');
+            if (el.blur) el.blur();
+            // Valeur refusée (type date/number, masque de saisie...) → repli clavier
+            return {ok: el.value === step.value};
+        }
+        if (step.action === 'click') {
+            if (!el.checked) el.click();
+            return {ok: el.checked};
+        }
+        if (step.action === 'select') {
+            for (let i = 0; i < step.candidates.length; i++) {
+                const [method, target] = step.candidates[i];
+                const index = findOption(el, method, target);
+                if (index >= 0) {
+                    el.selectedIndex = index;
+                    fire(el, 'input');
+                    fire(el, 'change');
+                    return {ok: el.selectedIndex === index, choice: i};
+                }
+            }
+            return {ok: false};
+        }
+    } catch (e) {
+        return {ok: false, error: String(e)};
+    }
+    return {ok: false};
+});
+"""
+
+# Sélection d'une option par index en une commande (au lieu de Select, qui relit
+# les options une à une et lève une exception à chaque essai manqué)
+SELECT_INDEX_SCRIPT = """
+const [el, index] = arguments;
+if (!el || !el.isConnected || index < 0 || index >= el.options.length || el.options[index].disabled) {
+    return false;
+}
+el.selectedIndex = index;
+el.dispatchEvent(new Event('input', {bubbles: true}));
+el.dispatchEvent(new Event('change', {bubbles: true}));
+return el.selectedIndex === index;
+"""
+
+
+def log_filled_field(report: Dict) -> None:
+    """Affiche un champ rempli dans la console"""
+    ftype, name, value = report['type'], report['name'], report['value']
+    if ftype == 'checkbox':
+        print(f"  ☑️  Checkbox '{name}' = {value}")
+    elif ftype == 'radio':
+        print(f"  🔘 Radio '{name}' = {value}")
+    elif ftype == 'password':
+        print(f"  🔒 Password '{name}' = ********")
+    elif ftype == 'textarea':
+        print(f"  📝 Textarea '{name}' = '{str(value)[:30]}...'")
+    elif ftype == 'select':
+        print(f"  🔽 Select '{name}' = '{value}'")
+    else:
+        print(f"  ✏️  Input '{name}' ({ftype}) = '{value}'")
+
+
+def click_field(field: Dict) -> None:
+    """Clique une checkbox / radio, ou son label si l'input n'est pas cliquable"""
+    inp = field['element']
+    try:
+        inp.click()
+    except ElementNotInteractableException:
+        input_id = field['attrs'].get('id', '')
+        # Essayer de cliquer sur le label
+        try:
+            label = inp.find_element(By.XPATH, f"//label[@for='{input_id}']")
+            label.click()
+        except:
+            try:
+                label = inp.find_element(By.XPATH, "./ancestor::label")
+                label.click()
+            except:
+                pass
+
+
+def apply_step_keys(driver, step: Dict) -> Optional[Dict]:
+    """Applique une étape avec les commandes Selenium classiques (clear/send_keys, click, option par index)"""
+    field = step['field']
+    report = dict(step['report'])
+    
+    try:
+        if step['action'] == 'type':
+            field['element'].clear()
+            field['element'].send_keys(step['value'])
+            return report
+        
+        if step['action'] == 'click':
+            click_field(field)
+            return report
+        
+        if step['action'] == 'select':
+            for method, target, reported in step['candidates']:
+                if method == 'index':
+                    # Une seule commande : selectedIndex + événements input/change
+                    ok = driver.execute_script(SELECT_INDEX_SCRIPT, field['element'], target)
+                else:
+                    try:
+                        sel = Select(field['element'])
+                        if method == 'visible_text':
+                            sel.select_by_visible_text(target)
+                        elif method == 'value':
+                            sel.select_by_value(target)
+                        ok = True
+                    except Exception:
+                        ok = False
+                if ok:
+                    report['value'] = reported
+                    return report
+    
+    except Exception as e:
+        print(f"  ⚠️ Erreur {report['type']} {report['name']}: {e}")
+    
+    return None
+
+
+def apply_plan_js(driver, plan: List[Dict]) -> List[Optional[Dict]]:
+    """
+    Applique tout le plan en un seul execute_script.
+    Renvoie, pour chaque étape, l'entrée filled_fields (ou None si le script a échoué).
+    """
+    payload = [
+        {
+            'element': step['field']['element'],
+            'action': step['action'],
+            'value': step.get('value'),
+            'candidates': [[method, target] for method, target, _ in step.get('candidates', [])]
+        }
+        for step in plan
+    ]
+    
+    try:
+        results = driver.execute_script(JS_FILL_SCRIPT, payload) or []
+    except Exception as e:
+        print(f"  ⚠️ Erreur remplissage JS: {e}")
+        results = []
+    
+    reports = []
+    for i, step in enumerate(plan):
+        result = results[i] if i < len(results) else None
+        if not result or not result.get('ok'):
+            reports.append(None)
+            continue
+        report = dict(step['report'])
+        if step['action'] == 'select':
+            report['value'] = step['candidates'][result['choice']][2]
+        reports.append(report)
+    return reports
+
+
+def apply_fill_plan(driver, plan: List[Dict], fill_mode: str = 'keys', timings: Optional[Dict] = None) -> List[Dict]:
+    """
+    Applique le plan et renvoie filled_fields (dans l'ordre du plan).
+    
+    - 'keys' : clear() + send_keys() / click() / option par index, champ par champ
+    - 'js' : tout le plan en un seul execute_script, puis repli clavier
+      uniquement pour les champs que le script n'a pas pu remplir
+    
+    `timings` reçoit apply_js_ms et, par type de champ, le temps passé en mode clavier.
+    """
+    if fill_mode not in ('keys', 'js'):
+        raise ValueError(f"fill_mode inconnu: {fill_mode}")
+    
+    reports: List[Optional[Dict]] = [None] * len(plan)
+    
+    if fill_mode == 'js' and plan:
+        with timed_phase('apply_js', timings):
+            for frame, indexes in frame_groups(plan, range(len(plan))):
+                check_cancelled()
+                try:
+                    with frame_context(driver, frame):
+                        js_reports = apply_plan_js(driver, [plan[i] for i in indexes])
+                except Exception as e:
+                    print(f"  ⚠️ Frame {plan[indexes[0]]['field'].get('path')} inaccessible: {e}")
+                    continue
+                for i, report in zip(indexes, js_reports):
+                    reports[i] = report
+                    if report:
+                        report_progress('field', report)
+        pending = [i for i, report in enumerate(reports) if report is None]
+        print(f"  ⚡ JS: {len(plan) - len(pending)}/{len(plan)} champ(s) appliqué(s), {len(pending)} en repli clavier")
+    else:
+        pending = list(range(len(plan)))
+    
+    # Un changement de contexte par frame, pas par champ
+    keys_ms: Dict[str, float] = {}
+    for frame, indexes in frame_groups(plan, pending):
+        try:
+            with frame_context(driver, frame):
+                for i in indexes:
+                    check_cancelled()
+                    start = time.perf_counter()
+                    reports[i] = apply_step_keys(driver, plan[i])
+                    if reports[i]:
+                        report_progress('field', reports[i])
+                    elapsed = time.perf_counter() - start
+                    field_type = plan[i]['report']['type']
+                    FIELD_SECONDS.observe(elapsed, type=field_type)
+                    keys_ms[field_type] = keys_ms.get(field_type, 0.0) + elapsed * 1000
+        except FillCancelled:
+            raise
+        except Exception as e:
+            print(f"  ⚠️ Frame {plan[indexes[0]]['field'].get('path')} inaccessible: {e}")
+    if timings is not None and keys_ms:
+        timings['keys_ms_by_type'] = {field_type: round(ms, 1) for field_type, ms in keys_ms.items()}
+    
+    filled_fields = []
+    for report in reports:
+        if report:
+            log_filled_field(report)
+            FIELDS_FILLED.inc(type=report['type'])
+            filled_fields.append(report)
+    return filled_fields
+
+
+def step_already_applied(step: Dict) -> bool:
+    """Champ déjà dans l'état voulu d'après le snapshot (valeur saisie, case cochée, option choisie)"""
+    field = step['field']
+    if step['action'] == 'type':
+        return field['attrs'].get('value', '') == step['value']
+    if step['action'] == 'click':
+        return field['checked']
+    if step['action'] == 'select' and step['candidates']:
+        method, target, _ = step['candidates'][0]
+        return method == 'index' and any(opt['index'] == target and opt.get('selected') for opt in field['options'] or [])
+    return False
+
+
+# ===============================================
+# 📝 FONCTION PRINCIPALE DE REMPLISSAGE
+# ===============================================
+
+def fill_forms(driver, provided_values: Dict = None, use_levenshtein: bool = True, threshold: float = 0.6,
+               fill_mode: str = 'keys', identification: str = 'field', timings: Optional[Dict] = None,
+               seen: Optional[set] = None, incremental: bool = False) -> List[Dict]:
+    """
+    Remplit automatiquement TOUS les types de champs
+    
+    1. snapshot de tous les champs (un appel)
+    2. plan de remplissage (sans navigateur, repris du cache si la structure est connue) ;
+       identification 'field' (champ par champ) ou 'matrix' (affectation globale)
+    3. exécution du plan ('keys' : champ par champ, 'js' : un seul appel)
+    4. les correspondances des champs remplis attendent la validation du client
+       (record_fill_decisions) avant d'être apprises pour le domaine (MAPPING_STORE)
+    
+    Chaque phase est mesurée (métriques Prometheus) ; `timings`, si fourni,
+    reçoit les durées en ms (snapshot_ms, plan_ms, apply_ms...).
+    
+    `seen` (assistant multi-étapes) : identifiants des éléments déjà traités ;
+    seuls les autres champs sont identifiés et remplis, et les champs visibles
+    traités y sont ajoutés.
+    
+    `incremental` : seuls les champs ajoutés ou modifiés depuis le remplissage
+    précédent (MutationObserver) sont traités, et ceux déjà dans l'état voulu
+    sont ignorés ; un nouvel appel sur une page inchangée ne fait rien.
+    """
+    if provided_values is None:
+        provided_values = {}
+    
+    # Fusionner avec les valeurs par défaut
+    merged_values = {**DEFAULT_VALUES, **provided_values}
+    
+    # Trouver tous les éléments de formulaire (même hors <form>) en un seul appel
+    with timed_phase('snapshot', timings):
+        fields = snapshot_form_fields(driver, incremental=incremental)
+    
+    if seen is not None:
+        fields = [field for field in fields if field['element'].id not in seen]
+        seen.update(field['element'].id for field in fields if field['visible'])
+        # Index propres au sous-ensemble : le memo du plan est indexé par position
+        fields = [{**field, 'index': index} for index, field in enumerate(fields)]
+    n_inputs = sum(1 for f in fields if f['tag'] == 'input')
+    n_textareas = sum(1 for f in fields if f['tag'] == 'textarea')
+    n_selects = sum(1 for f in fields if f['tag'] == 'select')
+    
+    if timings is not None:
+        timings['fields'] = len(fields)
+    
+    print(f'\n📋 Éléments trouvés: {n_inputs} inputs, {n_textareas} textareas, {n_selects} selects')
+    print('-' * 50)
+    
+    with timed_phase('plan', timings):
+        plan = plan_fields(fields, merged_values, threshold, identification, domain=driver.page_host)
+        if incremental:
+            plan = [step for step in plan if not step_already_applied(step)]
+    
+    with timed_phase('apply', timings):
+        filled_fields = apply_fill_plan(driver, plan, fill_mode, timings)
+    
+    record_fill_decisions(driver, filled_fields)
+    return filled_fields
+
+
+# ===============================================
+# 🧭 ASSISTANT MULTI-ÉTAPES
+# ===============================================
+
+# Textes des boutons "étape suivante" (exacts ou contenus, en minuscules)
+WIZARD_NEXT_WORDS = ['suivant', 'continuer', 'étape suivante', 'poursuivre', 'next', 'continue', 'next step']
+
+# Boutons de fin, cliqués seulement avec submit=True
+WIZARD_SUBMIT_WORDS = ['valider', 'envoyer', "s'inscrire", 'inscription', 'terminer', 'confirmer',
+                       'submit', 'sign up', 'register', 'finish', 'done']
+
+# Trouve le bouton "suivant" (sélecteur du client, sinon par son texte) et
+# mémorise dans la page les champs visibles à cet instant : après le clic,
+# un champ absent de cet ensemble est un champ de l'étape suivante.
+# Libellé égal à un mot : tout bouton ou lien de la page ; libellé qui contient
+# un mot ("Continuer la commande") : seulement un bouton d'un formulaire en cours
+# de remplissage (sinon "Continue with Google", "Next article"...). Un lien vers
+# une autre origine n'est jamais retenu ; à score égal, un bouton submit l'emporte.
+NEXT_CONTROL_SCRIPT = """
+const [selector, nextWords, submitWords] = arguments;
+
+function isDisplayed(el) {
+    const style = window.getComputedStyle(el);
+    if (style.display === 'none' || style.visibility === 'hidden') return false;
+    const rect = el.getBoundingClientRect();
+    return rect.width > 0 && rect.height > 0;
+}
+
+function controls(root, found) {
+    for (const el of root.querySelectorAll('*')) {
+        if (el.matches('input, textarea, select') && isDisplayed(el)) found.push(el);
+        if (el.shadowRoot) controls(el.shadowRoot, found);
+    }
+    return found;
+}
+
+const visible = controls(document, []);
+window.__autofillSeen = new WeakSet(visible);
+
+if (selector) {
+    const el = document.querySelector(selector);
+    return el ? [el, selector] : null;
+}
+
+// Formulaires en cours de remplissage : ceux d'un champ de saisie visible déjà renseigné
+const NOT_DATA = ['submit', 'button', 'reset', 'image', 'hidden', 'search', 'file'];
+const filledForms = new Set();
+for (const el of visible) {
+    if (el.disabled || NOT_DATA.includes(el.type)) continue;
+    const filled = (el.type === 'checkbox' || el.type === 'radio') ? el.checked : el.value !== '';
+    const form = el.form || el.closest('form');
+    if (filled && form) filledForms.add(form);
+}
+
+function isOtherOrigin(el) {
+    if (el.tagName !== 'A' || !el.href) return false;
+    try {
+        const url = new URL(el.href, location.href);
+        return url.protocol.startsWith('http') && url.origin !== location.origin;
+    } catch (e) {
+        return true;
+    }
+}
+
+function inFilledForm(el) {
+    if (!el.matches('button, input[type=submit], input[type=button]')) return false;
+    const form = el.form || el.closest('form');
+    return !!form && filledForms.has(form);
+}
+
+let best = null, bestScore = 0, bestLabel = '';
+for (const el of document.querySelectorAll('button, input[type=submit], input[type=button], [role=button], a')) {
+    if (el.disabled || el.getAttribute('aria-disabled') === 'true' || !isDisplayed(el) || isOtherOrigin(el)) continue;
+    const label = (el.innerText || el.value || el.getAttribute('aria-label') || '').trim().toLowerCase().replace(/\\s+/g, ' ');
+    if (!label || label.length > 40) continue;
+    const partial = inFilledForm(el);
+    let score = 0;
+    for (const word of nextWords) {
+        if (label === word) score = Math.max(score, 4);
+        else if (partial && label.includes(word)) score = Math.max(score, 3);
+    }
+    for (const word of submitWords) {
+        if (label === word) score = Math.max(score, 2);
+        else if (partial && label.includes(word)) score = Math.max(score, 1);
+    }
+    if (!score) continue;
+    score = score * 2 + (el.type === 'submit' ? 1 : 0);
+    if (score > bestScore) {
+        best = el;
+        bestScore = score;
+        bestLabel = label;
+    }
+}
+return best ? [best, bestLabel] : null;
+"""
+
+# Prêt quand un champ visible absent de l'étape précédente est apparu
+# (nouvelle page : l'ensemble mémorisé a disparu avec l'ancien document)
+NEW_FIELDS_SCRIPT = """
+if (document.readyState !== 'complete') return false;
+const seen = window.__autofillSeen;
+
+function isDisplayed(el) {
+    const style = window.getComputedStyle(el);
+    if (style.display === 'none' || style.visibility === 'hidden') return false;
+    const rect = el.getBoundingClientRect();
+    return rect.width > 0 && rect.height > 0;
+}
+
+function hasNew(root) {
+    for (const el of root.querySelectorAll('*')) {
+        if (el.matches('input, textarea, select') && el.type !== 'hidden'
+                && !(seen && seen.has(el)) && isDisplayed(el)) return true;
+        if (el.shadowRoot && hasNew(el.shadowRoot)) return true;
+    }
+    return false;
+}
+return hasNew(document);
+"""
+
+
+def find_next_control(driver, request: WizardRequest) -> Optional[tuple]:
+    """Bouton de l'étape suivante : (WebElement, libellé) ou None"""
+    submit_words = WIZARD_SUBMIT_WORDS if request.submit else []
+    return driver.execute_script(NEXT_CONTROL_SCRIPT, request.next_selector, WIZARD_NEXT_WORDS, submit_words)
+
+
+def click_next_control(driver, element) -> None:
+    """Clic WebDriver, sinon clic JavaScript (bouton masqué par un bandeau cookies...)"""
+    try:
+        element.click()
+    except Exception:
+        driver.execute_script("arguments[0].click();", element)
+
+
+def wait_for_new_fields(driver, timeout: float) -> tuple:
+    """Attend les champs de l'étape suivante ; renvoie (secondes attendues, apparus ?)"""
+    start = time.perf_counter()
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=0.1).until(lambda d: d.execute_script(NEW_FIELDS_SCRIPT))
+        return time.perf_counter() - start, True
+    except TimeoutException:
+        return time.perf_counter() - start, False
+
+
+def run_wizard(driver, request: WizardRequest) -> tuple:
+    """
+    Remplit un formulaire en plusieurs étapes sans aller-retour client
+    (bloquant, exécuté dans DRIVER_EXECUTOR).
+    
+    Pour chaque étape : remplissage des seuls champs apparus depuis l'étape
+    précédente, clic sur le bouton "suivant", attente des nouveaux champs.
+    Renvoie (étapes, raison de l'arrêt).
+    """
+    seen: set = set()
+    steps = []
+    stopped = 'max_steps'
+    
+    waited, _ = wait_until_ready(driver, request.wait, form_control=True)
+    
+    for number in range(1, (request.max_steps or WIZARD_MAX_STEPS) + 1):
+        start = time.perf_counter()
+        step_timings: Dict[str, Any] = {}
+        step = {"step": number, "url": driver.current_url, "waited_ms": round(waited * 1000, 1)}
+        print(f"\n🧭 Étape {number} : {step['url']}")
+        
+        step["filled_fields"] = fill_forms(
+            driver,
+            provided_values=request.values,
+            use_levenshtein=request.use_levenshtein,
+            threshold=request.levenshtein_threshold,
+            fill_mode=request.fill_mode,
+            identification=request.identification,
+            timings=step_timings,
+            seen=seen
+        )
+        step["new_fields"] = step_timings.get('fields', 0)
+        steps.append(step)
+        
+        next_control = find_next_control(driver, request)
+        if not next_control:
+            step["next"] = None
+            step["duration_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            stopped = 'no_next'
+            break
+        
+        element, label = next_control
+        print(f"  ➡️  Clic sur '{label}'")
+        click_next_control(driver, element)
+        step["next"] = label
+        
+        waited, appeared = wait_for_new_fields(driver, request.step_timeout)
+        step["duration_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        if not appeared:
+            print(f"  ⏹️  Aucun nouveau champ après {request.step_timeout}s")
+            stopped = 'no_new_fields'
+            break
+    
+    return steps, stopped
+
+
+# ===============================================
+# 🧵 EXÉCUTION NON BLOQUANTE DES COMMANDES
+# ===============================================
+
+# Selenium et time.sleep sont bloquants : ils tournent dans ce pool de
+# threads borné, jamais dans la boucle d'événements d'uvicorn.
+DRIVER_EXECUTOR = ThreadPoolExecutor(max_workers=DRIVER_WORKERS, thread_name_prefix="driver")
+
+
+class SessionQueue:
+    """
+    File de commandes d'une session : un seul navigateur ne supporte pas
+    deux commandes à la fois, donc les commandes d'une même session passent
+    une par une, dans l'ordre d'arrivée (asyncio.Lock est FIFO), tandis que
+    des sessions différentes avancent en parallèle.
+    """
+    
+    def __init__(self):
+        self._lock = asyncio.Lock()
+        self.depth = 0  # commandes en attente + en cours
+        self.commands = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.last_wait = 0.0
+    
+    @property
+    def busy(self) -> bool:
+        return self.depth > 0
+    
+    async def run(self, func, *args, **kwargs):
+        """Exécute func(*args, **kwargs) dans DRIVER_EXECUTOR, après les commandes précédentes"""
+        loop = asyncio.get_running_loop()
+        queued_at = time.perf_counter()
+        self.depth += 1
+        
+        def timed_call():
+            # Attente = file de la session + file du pool de threads
+            wait = time.perf_counter() - queued_at
+            self.commands += 1
+            self.total_wait += wait
+            self.last_wait = wait
+            self.max_wait = max(self.max_wait, wait)
+            return func(*args, **kwargs)
+        
+        try:
+            await self._lock.acquire()
+        except BaseException:
+            self.depth -= 1
+            raise
+        
+        try:
+            future = loop.run_in_executor(DRIVER_EXECUTOR, timed_call)
+        except BaseException:
+            self.depth -= 1
+            self._lock.release()
+            raise
+        
+        def done(_future):
+            # Libérer seulement quand la commande est vraiment finie, même si
+            # le client s'est déconnecté entre-temps
+            self.depth -= 1
+            self._lock.release()
+        
+        future.add_done_callback(done)
+        return await asyncio.shield(future)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self.depth,
+            "commands": self.commands,
+            "last_wait_ms": round(self.last_wait * 1000, 1),
+            "avg_wait_ms": round(self.total_wait / self.commands * 1000, 1) if self.commands else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 1)
+        }
+
+
+# Sessions en cours de création (réserve l'identifiant pendant le démarrage)
+pending_sessions: Dict[str, SessionQueue] = {}
+
+# Sessions créées / fermées, par motif de fermeture (deleted, idle, evicted)
+session_events: Counter = Counter()
+
+# Tâche de fond qui ferme les sessions inactives
+session_reaper: Optional[asyncio.Task] = None
+
+
+def get_active_session(session_id: str) -> Dict:
+    """Renvoie la session (et la marque comme utilisée) ou lève une 404"""
+    if session_id not in active_sessions:
+        raise HTTPException(status_code=404, detail=f"Session {session_id} non trouvée")
+    session = active_sessions[session_id]
+    session['last_used'] = time.time()
+    return session
+
+
+async def close_session(session_id: str, reason: str = 'deleted') -> None:
+    """
+    Retire la session et ferme son navigateur après ses commandes en cours.
+    DELETE rend le navigateur au pool (remis à zéro) ; une session inactive
+    ou évincée est abandonnée : driver.quit(), sa mémoire est rendue.
+    """
+    session = active_sessions.pop(session_id)
+    session_events[reason] += 1
+    close = DRIVER_POOL.release if reason == 'deleted' else DRIVER_POOL.discard
+    await session['queue'].run(close, session['driver'])
+
+
+async def make_room_for_session() -> None:
+    """Au-delà de SESSION_MAX, ferme la session libre utilisée le moins récemment (LRU)"""
+    if SESSION_MAX <= 0:
+        return
+    
+    while len(active_sessions) + len(pending_sessions) > SESSION_MAX:
+        candidates = [(session['last_used'], sid) for sid, session in active_sessions.items()
+                      if not session['queue'].busy]
+        if not candidates:
+            raise HTTPException(status_code=503, detail=f"{SESSION_MAX} sessions déjà ouvertes, toutes occupées")
+        _, session_id = min(candidates)
+        print(f"  ♻️ Session {session_id} évincée ({SESSION_MAX} sessions max)")
+        await close_session(session_id, 'evicted')
+
+
+async def reap_idle_sessions() -> None:
+    """Ferme les sessions inutilisées depuis plus de SESSION_IDLE_TTL (tâche de fond)"""
+    while True:
+        await asyncio.sleep(SESSION_REAP_INTERVAL)
+        deadline = time.time() - SESSION_IDLE_TTL
+        for session_id, session in list(active_sessions.items()):
+            # Déjà fermée pendant le tour, réutilisée ou occupée : on la garde
+            if active_sessions.get(session_id) is not session or session['queue'].busy:
+                continue
+            if session['last_used'] >= deadline:
+                continue
+            print(f"  🧹 Session {session_id} inactive depuis {SESSION_IDLE_TTL:.0f}s, fermeture")
+            try:
+                await close_session(session_id, 'idle')
+            except Exception as e:
+                print(f"  ⚠️ Fermeture de la session {session_id} impossible: {e}")
+
+
+# ===============================================
+# 📦 JOBS EN LOT
+# ===============================================
+
+def execute_batch_job(index: int, job: BatchJob, request: BatchJobRequest) -> Dict:
+    """Un job : loue un navigateur, ouvre l'URL, remplit, rend le navigateur (bloquant)"""
+    start = time.perf_counter()
+    result = {"index": index, "job_id": job.job_id, "url": job.url}
+    
+    try:
+        driver = DRIVER_POOL.acquire()
+    except Exception as e:
+        return {**result, "success": False, "error": str(e), "filled_fields": [],
+                "duration_ms": round((time.perf_counter() - start) * 1000, 1)}
+    
+    try:
+        driver.get(job.url)
+        with timed_phase('wait'):
+            waited, ready = wait_until_ready(driver, request.wait, form_control=True)
+        filled_fields = fill_forms(
+            driver,
+            provided_values=job.values,
+            threshold=request.levenshtein_threshold,
+            fill_mode=request.fill_mode,
+            identification=request.identification
+        )
+        result.update({
+            "success": True,
+            "filled_fields": filled_fields,
+            "waited_ms": round(waited * 1000, 1),
+            "page_ready": ready
+        })
+        FILL_REQUESTS.inc(fill_mode=request.fill_mode, status='success')
+    except Exception as e:
+        result.update({"success": False, "error": str(e), "filled_fields": []})
+        FILL_REQUESTS.inc(fill_mode=request.fill_mode, status='error')
+    finally:
+        DRIVER_POOL.release(driver)
+    
+    result["duration_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return result
+
+
+async def stream_batch(request: BatchJobRequest):
+    """Exécute les jobs en parallèle (limite de concurrence) et renvoie chaque résultat dès qu'il est prêt"""
+    concurrency = request.concurrency or BATCH_CONCURRENCY
+    if DRIVER_POOL.enabled:
+        concurrency = min(concurrency, DRIVER_POOL.max_size)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    loop = asyncio.get_running_loop()
+    
+    async def run_job(index: int, job: BatchJob) -> Dict:
+        async with semaphore:
+            return await loop.run_in_executor(DRIVER_EXECUTOR, execute_batch_job, index, job, request)
+    
+    tasks = [asyncio.create_task(run_job(i, job)) for i, job in enumerate(request.jobs)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            result = await next_done
+            yield json.dumps(result, ensure_ascii=False, default=str) + "\n"
+    finally:
+        # Client déconnecté : les jobs pas encore démarrés sont annulés
+        for task in tasks:
+            task.cancel()
+
+
+# ===============================================
+# 🌐 ENDPOINTS API
+# ===============================================
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Durée de chaque requête, par route (modèle de chemin, pas l'URL brute) et statut"""
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = getattr(request.scope.get('route'), 'path', 'unmatched')
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, method=request.method, route=route, status=status)
+
+
+@app.on_event("startup")
+async def startup():
+    global session_reaper
+    MAPPING_STORE.start()
+    DRIVER_POOL.start()
+    if SESSION_IDLE_TTL > 0:
+        session_reaper = asyncio.create_task(reap_idle_sessions())
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    if session_reaper is not None:
+        session_reaper.cancel()
+    for session_id in list(active_sessions):
+        session = active_sessions.pop(session_id)
+        DRIVER_POOL.release(session['driver'])
+    DRIVER_POOL.shutdown()
+    DRIVER_EXECUTOR.shutdown(wait=False)
+    MAPPING_STORE.shutdown()
+
+
+@app.get("/")
+async def root():
+    return {
+        "message": "Form Autofill API - Version Complète",
+        "version": "3.0.0",
+        "features": [
+            "checkboxes (simples et multiples)",
+            "radios (tous types)",
+            "selects (avec Levenshtein)",
+            "textareas",
+            "passwords",
+            "dates (séparées ou combinées)",
+            "heure d'arrivée (plage horaire)"
         ],
         "sites_tested": [
             "httpbin.org/forms/post",
@@ -901,107 +4016,421 @@ async def root():
     }
 
 
-@app.post("/session/create", response_model=SessionResponse)
-async def create_session(request: SessionCreateRequest):
-    if request.session_id in active_sessions:
-        raise HTTPException(status_code=400, detail=f"Session {request.session_id} existe déjà")
+def open_session_driver(request: SessionCreateRequest):
+    """Loue un navigateur et ouvre l'URL demandée (bloquant, exécuté dans DRIVER_EXECUTOR)"""
+    driver = DRIVER_POOL.acquire()
     
     try:
-        driver = create_driver()
-        
         if request.maximize:
             driver.maximize_window()
         elif request.width and request.height:
             driver.set_window_size(request.width, request.height)
         
         driver.get(request.url)
-        time.sleep(2)
+        waited, _ = wait_until_ready(driver, request.wait)
+        install_observer(driver)
+        driver.fill_decisions = {}
+        return driver, waited
+    
+    except Exception:
+        DRIVER_POOL.release(driver)
+        raise
+
+
+@app.post("/session/create", response_model=SessionResponse)
+async def create_session(request: SessionCreateRequest):
+    if request.session_id in active_sessions or request.session_id in pending_sessions:
+        raise HTTPException(status_code=400, detail=f"Session {request.session_id} existe déjà")
+    
+    queue = SessionQueue()
+    pending_sessions[request.session_id] = queue
+    
+    try:
+        await make_room_for_session()
+        driver, waited = await queue.run(open_session_driver, request)
         
+        now = time.time()
         active_sessions[request.session_id] = {
             'driver': driver,
             'url': request.url,
-            'created_at': time.time()
+            'created_at': now,
+            'last_used': now,
+            'queue': queue,
+            'traces': deque(maxlen=TRACE_HISTORY)
         }
+        session_events['created'] += 1
         
         return SessionResponse(
             success=True,
             message=f"Session {request.session_id} créée avec succès",
-            session_id=request.session_id
+            session_id=request.session_id,
+            waited_ms=round(waited * 1000, 1),
+            profile=getattr(driver, 'profile', None)
         )
     
+    except HTTPException:
+        raise
+    except TimeoutError as e:
+        raise HTTPException(status_code=503, detail=f"Erreur: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur: {str(e)}")
+    finally:
+        pending_sessions.pop(request.session_id, None)
+
+
+@app.delete("/session/{session_id}", response_model=SessionResponse)
+async def delete_session(session_id: str):
+    get_active_session(session_id)
+    
+    await close_session(session_id)
+    
+    return SessionResponse(
+        success=True,
+        message=f"Session {session_id} fermée",
+        session_id=session_id
+    )
 
 
 @app.get("/session/{session_id}")
 async def get_session(session_id: str):
-    if session_id not in active_sessions:
-        raise HTTPException(status_code=404, detail=f"Session {session_id} non trouvée")
-    
-    session = active_sessions[session_id]
+    session = get_active_session(session_id)
     driver = session['driver']
     
+    current_url, title = await session['queue'].run(lambda: (driver.current_url, driver.title))
+    session['url'] = current_url
+    
     return {
         "session_id": session_id,
-        "current_url": driver.current_url,
-        "title": driver.title,
-        "created_at": session['created_at']
+        "current_url": current_url,
+        "title": title,
+        "created_at": session['created_at'],
+        "profile": getattr(driver, 'profile', None),
+        "queue": session['queue'].stats()
     }
 
 
-@app.post("/form/fill", response_model=FormFillResponse)
-async def fill_form(request: FillFormRequest):
-    if request.session_id not in active_sessions:
-        raise HTTPException(status_code=404, detail=f"Session {request.session_id} non trouvée")
-    
-    driver = active_sessions[request.session_id]['driver']
+def start_trace(session: Dict, name: str) -> CommandTrace:
+    """Nouvelle trace gardée dans la session (les plus anciennes sont oubliées)"""
+    instrument_driver(session['driver'])
+    trace = CommandTrace(name)
+    session['traces'].append(trace)
+    return trace
+
+
+def run_fill(driver, request: FillFormRequest) -> tuple:
+    """Remplissage complet (bloquant, exécuté dans DRIVER_EXECUTOR)"""
+    timings: Dict[str, Any] = {}
+    commands_before = getattr(driver, 'command_count', None)
     
-    try:
-        time.sleep(1)  # Attendre le chargement
+    with timed_phase('total', timings):
+        # Attendre le chargement : au moins un champ de formulaire par défaut
+        with timed_phase('wait', timings):
+            waited, ready = wait_until_ready(driver, request.wait, form_control=True)
         
         filled_fields = fill_forms(
             driver,
             provided_values=request.values,
             use_levenshtein=request.use_levenshtein,
-            threshold=request.levenshtein_threshold
+            threshold=request.levenshtein_threshold,
+            fill_mode=request.fill_mode,
+            identification=request.identification,
+            timings=timings,
+            incremental=request.incremental
         )
+    
+    if commands_before is not None:
+        timings['webdriver_commands'] = driver.command_count - commands_before
+    return filled_fields, waited, ready, timings
+
+
+@app.post("/form/fill", response_model=FormFillResponse)
+async def fill_form(request: FillFormRequest):
+    session = get_active_session(request.session_id)
+    driver = session['driver']
+    trace = start_trace(session, f"POST /form/fill {request.session_id}") if request.trace else None
+    
+    try:
+        filled_fields, waited, ready, timings = await session['queue'].run(traced_call, trace, run_fill, driver, request)
+        FILL_REQUESTS.inc(fill_mode=request.fill_mode, status='success')
         
         return FormFillResponse(
             success=True,
             message=f"✅ {len(filled_fields)} champ(s) rempli(s)",
-            filled_fields=filled_fields
+            filled_fields=filled_fields,
+            waited_ms=round(waited * 1000, 1),
+            page_ready=ready,
+            timings=timings if request.timings else None,
+            trace_id=trace.trace_id if trace else None
         )
     
+    except HTTPException:
+        FILL_REQUESTS.inc(fill_mode=request.fill_mode, status='error')
+        raise
     except Exception as e:
+        FILL_REQUESTS.inc(fill_mode=request.fill_mode, status='error')
         raise HTTPException(status_code=500, detail=f"Erreur: {str(e)}")
 
 
-@app.post("/session/{session_id}/navigate")
-async def navigate(session_id: str, url: str):
-    if session_id not in active_sessions:
-        raise HTTPException(status_code=404, detail=f"Session {session_id} non trouvée")
+@app.post("/form/wizard", response_model=WizardResponse)
+async def fill_wizard(request: WizardRequest):
+    """Formulaire multi-étapes : remplir, cliquer "suivant", attendre l'étape suivante... en une requête"""
+    session = get_active_session(request.session_id)
+    driver = session['driver']
+    trace = start_trace(session, f"POST /form/wizard {request.session_id}") if request.trace else None
+    
+    try:
+        steps, stopped = await session['queue'].run(traced_call, trace, run_wizard, driver, request)
+        FILL_REQUESTS.inc(fill_mode=request.fill_mode, status='success')
+    except HTTPException:
+        FILL_REQUESTS.inc(fill_mode=request.fill_mode, status='error')
+        raise
+    except Exception as e:
+        FILL_REQUESTS.inc(fill_mode=request.fill_mode, status='error')
+        raise HTTPException(status_code=500, detail=f"Erreur: {str(e)}")
+    
+    filled = sum(len(step['filled_fields']) for step in steps)
+    return WizardResponse(
+        success=True,
+        message=f"✅ {filled} champ(s) rempli(s) en {len(steps)} étape(s)",
+        steps=steps,
+        stopped=stopped,
+        trace_id=trace.trace_id if trace else None
+    )
+
+
+async def stream_fill(session: Dict, request: FillFormRequest, trace: Optional[CommandTrace]):
+    """Événements SSE d'un remplissage : phases, chaque champ dès qu'il est appliqué, résumé final"""
+    progress = FillProgress(asyncio.get_running_loop())
+    task = asyncio.ensure_future(session['queue'].run(
+        traced_call, trace, progress_call, progress, run_fill, session['driver'], request
+    ))
+    # Fin du remplissage : les événements publiés avant sont déjà dans la file
+    task.add_done_callback(lambda _task: progress.queue.put_nowait(None))
+    
+    try:
+        while (item := await progress.queue.get()) is not None:
+            yield format_sse(*item)
+        
+        try:
+            filled_fields, waited, ready, timings = task.result()
+        except Exception as e:
+            FILL_REQUESTS.inc(fill_mode=request.fill_mode, status='error')
+            yield format_sse('error', {"success": False, "error": str(e)})
+            return
+        
+        FILL_REQUESTS.inc(fill_mode=request.fill_mode, status='success')
+        yield format_sse('summary', {
+            "success": True,
+            "message": f"✅ {len(filled_fields)} champ(s) rempli(s)",
+            "filled": len(filled_fields),
+            "waited_ms": round(waited * 1000, 1),
+            "page_ready": ready,
+            "timings": timings if request.timings else None,
+            "trace_id": trace.trace_id if trace else None
+        })
+    finally:
+        # Client parti avant la fin : le remplissage s'arrête au prochain champ
+        if not task.done():
+            progress.cancelled.set()
+            FILL_REQUESTS.inc(fill_mode=request.fill_mode, status='cancelled')
+            task.add_done_callback(lambda _task: _task.cancelled() or _task.exception())
+
+
+@app.post("/form/fill/stream")
+async def fill_form_stream(request: FillFormRequest):
+    """/form/fill en Server-Sent Events : fermer le flux annule le remplissage"""
+    session = get_active_session(request.session_id)
+    trace = start_trace(session, f"POST /form/fill/stream {request.session_id}") if request.trace else None
+    
+    return StreamingResponse(
+        stream_fill(session, request, trace),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def run_plan(fields: List[Dict], request: PlanRequest, domain: Optional[str] = None) -> PlanResponse:
+    """Plan de remplissage sans toucher à la page (calcul pur, hors boucle d'événements)"""
+    info: Dict[str, Any] = {}
+    merged_values = {**DEFAULT_VALUES, **(request.values or {})}
+    plan = plan_fields(fields, merged_values, request.levenshtein_threshold, request.identification, info, domain)
+    
+    return PlanResponse(
+        success=True,
+        message=f"{len(plan)} champ(s) seraient remplis",
+        fingerprint=info['fingerprint'],
+        cached=info['cached'],
+        fields=len(fields),
+        plan=describe_plan(plan)
+    )
+
+
+@app.post("/form/plan", response_model=PlanResponse)
+async def plan_form(request: PlanRequest):
+    """Ce que /form/fill ferait (champ → champ logique → valeur), sans rien remplir"""
+    if (request.html is None) == (request.session_id is None):
+        raise HTTPException(status_code=400, detail="Fournir soit html, soit session_id")
+    
+    loop = asyncio.get_running_loop()
+    
+    # HTML fourni : aucun navigateur, analyse dans le pool de threads par défaut
+    if request.html is not None:
+        return await loop.run_in_executor(None, lambda: run_plan(parse_html_fields(request.html), request))
     
-    driver = active_sessions[session_id]['driver']
+    # Session : un seul appel (snapshot en lecture), dans la file de la session
+    session = get_active_session(request.session_id)
+    try:
+        fields = await session['queue'].run(snapshot_form_fields, session['driver'], consume=False)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erreur: {str(e)}")
+    return await loop.run_in_executor(None, run_plan, fields, request, session['driver'].page_host)
+
+
+def navigate_driver(driver, url: str, wait: Optional[WaitStrategy] = None) -> tuple:
+    """Navigation (bloquante, exécutée dans DRIVER_EXECUTOR)"""
     driver.get(url)
-    time.sleep(2)
+    waited, ready = wait_until_ready(driver, wait)
+    install_observer(driver)
+    return driver.current_url, waited, ready
+
+
+@app.post("/session/{session_id}/navigate")
+async def navigate(session_id: str, url: str, wait: Optional[WaitStrategy] = None, trace: bool = False):
+    session = get_active_session(session_id)
+    command_trace = start_trace(session, f"POST /session/{session_id}/navigate") if trace else None
+    
+    current_url, waited, ready = await session['queue'].run(
+        traced_call, command_trace, navigate_driver, session['driver'], url, wait
+    )
+    session['url'] = current_url
+    
+    return {
+        "success": True,
+        "current_url": current_url,
+        "waited_ms": round(waited * 1000, 1),
+        "page_ready": ready,
+        "trace_id": command_trace.trace_id if command_trace else None
+    }
+
+
+@app.get("/session/{session_id}/traces")
+async def list_traces(session_id: str):
+    """Traces gardées pour la session (les TRACE_HISTORY dernières)"""
+    session = get_active_session(session_id)
+    return {"session_id": session_id, "traces": [trace.summary() for trace in session['traces']]}
+
+
+@app.get("/session/{session_id}/traces/{trace_id}")
+async def download_trace(session_id: str, trace_id: str):
+    """Trace au format Trace Event JSON (chrome://tracing, Perfetto) ; 'latest' = la dernière"""
+    session = get_active_session(session_id)
+    traces = list(session['traces'])
+    if trace_id == 'latest':
+        trace = traces[-1] if traces else None
+    else:
+        trace = next((t for t in traces if t.trace_id == trace_id), None)
+    if trace is None:
+        raise HTTPException(status_code=404, detail=f"Trace {trace_id} non trouvée")
     
-    return {"success": True, "current_url": driver.current_url}
+    return JSONResponse(
+        trace.to_trace_events(),
+        headers={"Content-Disposition": f'attachment; filename="trace-{trace.trace_id}.json"'}
+    )
+
+
+async def describe_session(sid: str, session: Dict) -> Dict:
+    """Résumé d'une session ; une session occupée n'est pas interrogée (dernière URL connue)"""
+    info = {"session_id": sid, "created_at": session['created_at'], "last_used": session['last_used'],
+            "profile": getattr(session['driver'], 'profile', None), "queue": session['queue'].stats()}
+    
+    if session['queue'].busy:
+        info["current_url"] = session['url']
+        info["status"] = "busy"
+        return info
+    
+    try:
+        info["current_url"] = await session['queue'].run(lambda: session['driver'].current_url)
+        session['url'] = info["current_url"]
+    except:
+        info["status"] = "error"
+    return info
+
+
+@app.post("/jobs/batch")
+async def run_batch(request: BatchJobRequest):
+    """Remplit une liste de {url, values} ; un résultat NDJSON par job, dans l'ordre de fin"""
+    if not request.jobs:
+        raise HTTPException(status_code=400, detail="Aucun job fourni")
+    
+    return StreamingResponse(stream_batch(request), media_type="application/x-ndjson")
 
 
 @app.get("/sessions")
 async def list_sessions():
-    sessions_info = []
-    for sid, session in active_sessions.items():
-        try:
-            sessions_info.append({
-                "session_id": sid,
-                "current_url": session['driver'].current_url,
-                "created_at": session['created_at']
-            })
-        except:
-            sessions_info.append({"session_id": sid, "status": "error"})
+    sessions_info = await asyncio.gather(*(
+        describe_session(sid, session) for sid, session in list(active_sessions.items())
+    ))
     
-    return {"total_sessions": len(active_sessions), "sessions": sessions_info}
+    return {"total_sessions": len(active_sessions), "sessions": list(sessions_info)}
+
+
+@app.get("/stats")
+async def get_stats():
+    return {
+        "active_sessions": len(active_sessions),
+        "sessions": {
+            "max": SESSION_MAX,
+            "idle_ttl_s": SESSION_IDLE_TTL,
+            **{event: session_events[event] for event in ('created', 'deleted', 'idle', 'evicted')}
+        },
+        "browser": {key: BROWSER_SETTINGS[key] for key in ('profile', 'browser', 'headless', 'block_assets', 'block_trackers')},
+        "identification_cache": IDENTIFICATION_CACHE.stats(),
+        "form_plan_cache": FORM_PLAN_CACHE.stats(),
+        "driver_pool": DRIVER_POOL.stats(),
+        "mapping_store": MAPPING_STORE.stats()
+    }
+
+
+@app.get("/mappings")
+async def list_mappings(domain: Optional[str] = None):
+    """Correspondances apprises et imposées (toutes, ou d'un domaine)"""
+    return {"mappings": MAPPING_STORE.entries(domain)}
+
+
+@app.post("/mappings")
+async def set_mapping(request: MappingRequest):
+    """Impose un champ logique pour un champ d'un domaine (prioritaire sur l'apprentissage)"""
+    if not MAPPING_STORE.enabled:
+        raise HTTPException(status_code=400, detail="Correspondances désactivées (AUTOFILL_MAPPING_DB vide)")
+    entry = MAPPING_STORE.override(request.domain, request.field, request.logical, request.confidence)
+    return {"success": True, "domain": request.domain, "field": request.field, **entry}
+
+
+@app.post("/session/{session_id}/mappings/confirm")
+async def confirm_mappings(session_id: str):
+    """
+    Valide les remplissages de la session depuis la dernière validation : leurs
+    correspondances comptent pour l'apprentissage (voir MappingStore)
+    """
+    session = get_active_session(session_id)
+    if not MAPPING_STORE.enabled:
+        raise HTTPException(status_code=400, detail="Correspondances désactivées (AUTOFILL_MAPPING_DB vide)")
+    # Dans la file de la session : après les remplissages en cours
+    confirmed = await session['queue'].run(confirm_fill_decisions, session['driver'])
+    return {"success": True, "session_id": session_id, "confirmed": confirmed}
+
+
+@app.delete("/mappings/{domain}/{field}")
+async def delete_mapping(domain: str, field: str):
+    if not MAPPING_STORE.remove(domain, field):
+        raise HTTPException(status_code=404, detail=f"Aucune correspondance pour {field} sur {domain}")
+    return {"success": True, "message": f"Correspondance {domain} / {field} supprimée"}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Métriques au format texte Prometheus"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
 
 
 # ===============================================
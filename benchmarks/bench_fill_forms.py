@@ -0,0 +1,285 @@
+"""
+Benchmark - fill_forms sur des formulaires locaux
+=================================================
+
+Sert les pages de benchmarks/fixtures/ avec un serveur HTTP local (aucun
+accès réseau, résultats reproductibles) et mesure, pour chaque page et chaque
+mode de remplissage :
+- remplissages par seconde
+- latence p50 / p95 de fill_forms (ms)
+- commandes WebDriver par remplissage
+
+Pages :
+- pizza : copie du formulaire httpbin.org/forms/post
+- registration_300 : inscription de groupe, 300 champs
+- country_select : select de 249 pays (+ option vide)
+- split_dates : dates en jour / mois / année séparés
+- checkbox_grid : grille de 206 checkboxes
+
+Les résultats sont écrits en JSON (--output) pour comparer deux versions
+(--compare ancien.json). --api-dir mesure une autre copie de l'API (par exemple
+un `git worktree` du commit de référence) : les options absentes de cette
+version (fill_mode, identification, profils, caches, compteur de commandes)
+sont remplacées par des équivalents locaux ou ignorées.
+
+Usage:
+    python benchmarks/bench_fill_forms.py
+    python benchmarks/bench_fill_forms.py --iterations 50 --fill-mode js --output results.json
+    python benchmarks/bench_fill_forms.py --fixtures pizza country_select --compare baseline.json
+    python benchmarks/bench_fill_forms.py --profile lean --output lean.json --compare full.json
+    git worktree add ../autofill-baseline 490c0bc
+    python benchmarks/bench_fill_forms.py --api-dir ../autofill-baseline --output baseline.json
+"""
+import argparse
+import datetime
+import functools
+import importlib
+import inspect
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from contextlib import redirect_stdout
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import selenium
+from selenium.webdriver.support.ui import WebDriverWait
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Page → (fichier, valeurs envoyées à fill_forms)
+FIXTURES = {
+    'pizza': ('pizza.html', {
+        'custname': 'Jean Dupont',
+        'custtel': '+33612345678',
+        'custemail': 'jean.dupont@example.com',
+        'size': 'medium',
+        'topping': ['bacon', 'cheese', 'mushroom'],
+        'comments': 'Test automatique - Livraison rapide SVP !',
+    }),
+    'registration_300': ('registration_300.html', {}),
+    'country_select': ('country_select.html', {'country': 'France'}),
+    'split_dates': ('split_dates.html', {'date_of_birth': '1990-01-15'}),
+    'checkbox_grid': ('checkbox_grid.html', {
+        'amenities': ['wifi', 'pool', 'spa', 'breakfast'],
+        'hobbies': ['sports', 'reading', 'travel'],
+    }),
+}
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    """Sert les fixtures sans écrire une ligne par requête"""
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fixture_server(directory: str = FIXTURES_DIR) -> ThreadingHTTPServer:
+    """Serveur HTTP local sur un port libre, dans un thread"""
+    handler = functools.partial(QuietHandler, directory=directory)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def percentile(values: list, q: float) -> float:
+    """Percentile par rang le plus proche (q entre 0 et 100)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * q // 100))
+    return ordered[int(rank) - 1]
+
+
+def git_commit(directory: str) -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=directory, capture_output=True, text=True, timeout=10
+        ).stdout.strip() or 'unknown'
+    except Exception:
+        return 'unknown'
+
+
+def load_api(directory: str):
+    """Importe api_form_autofill_v3 depuis `directory` (version mesurée)"""
+    sys.path.insert(0, os.path.abspath(directory))
+    with redirect_stdout(io.StringIO()):
+        return importlib.import_module('api_form_autofill_v3')
+
+
+def count_commands(driver):
+    """Compteur de commandes WebDriver pour une API sans instrument_driver"""
+    execute = driver.execute
+    driver.command_count = 0
+    
+    def counted_execute(driver_command, params=None):
+        driver.command_count += 1
+        return execute(driver_command, params)
+    
+    driver.execute = counted_execute
+    return driver
+
+
+def wait_for_form(driver, timeout: float = 10) -> None:
+    """Page chargée et au moins un champ, pour une API sans wait_until_ready"""
+    WebDriverWait(driver, timeout, poll_frequency=0.1).until(lambda d: d.execute_script(
+        "return document.readyState === 'complete' && !!document.querySelector('input, textarea, select');"
+    ))
+
+
+def bench_fixture(api, driver, url: str, values: dict, fill_options: dict,
+                  iterations: int, warmup: int, cold: bool) -> dict:
+    """Recharge la page avant chaque remplissage et ne chronomètre que fill_forms"""
+    latencies, commands, filled = [], [], []
+    wait_until_ready = getattr(api, 'wait_until_ready', None)
+    caches = [cache for cache in (getattr(api, 'IDENTIFICATION_CACHE', None), getattr(api, 'FORM_PLAN_CACHE', None))
+              if cache is not None]
+    
+    for i in range(warmup + iterations):
+        driver.get(url)
+        if wait_until_ready:
+            wait_until_ready(driver, form_control=True)
+        else:
+            wait_for_form(driver)
+        if cold:
+            for cache in caches:
+                cache.clear()
+        
+        commands_before = driver.command_count
+        start = time.perf_counter()
+        with redirect_stdout(io.StringIO()):
+            filled_fields = api.fill_forms(driver, dict(values), **fill_options)
+        elapsed = time.perf_counter() - start
+        
+        if i >= warmup:
+            latencies.append(elapsed)
+            commands.append(driver.command_count - commands_before)
+            filled.append(len(filled_fields))
+    
+    total = sum(latencies)
+    return {
+        'fills_per_sec': round(len(latencies) / total, 2) if total else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'mean_ms': round(total / len(latencies) * 1000, 2) if latencies else 0.0,
+        'commands_per_fill': round(sum(commands) / len(commands), 1) if commands else 0.0,
+        'filled_fields': round(sum(filled) / len(filled), 1) if filled else 0.0,
+    }
+
+
+def compare(results: dict, baseline_path: str) -> None:
+    """Affiche l'écart avec un fichier de résultats précédent"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    previous = {(r['fixture'], r['fill_mode']): r for r in baseline.get('results', [])}
+    
+    print(f"\n📊 Comparaison avec {baseline_path} ({baseline.get('git_commit', '?')})", file=sys.stderr)
+    print(f"  {'page':<18} {'mode':<5} {'fills/s':>16} {'p95 ms':>18} {'commandes':>16}", file=sys.stderr)
+    for r in results['results']:
+        old = previous.get((r['fixture'], r['fill_mode']))
+        if not old:
+            continue
+        print(f"  {r['fixture']:<18} {r['fill_mode']:<5} "
+              f"{old['fills_per_sec']:>7} → {r['fills_per_sec']:<7} "
+              f"{old['p95_ms']:>8} → {r['p95_ms']:<8} "
+              f"{old['commands_per_fill']:>6} → {r['commands_per_fill']:<7}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--fixtures', nargs='+', choices=list(FIXTURES), default=list(FIXTURES))
+    parser.add_argument('--fill-mode', choices=['keys', 'js', 'both'], default='both')
+    parser.add_argument('--identification', choices=['field', 'matrix'], default='field')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--profile', help="profil du navigateur (variables AUTOFILL_* appliquées par-dessus)")
+    parser.add_argument('--cold', action='store_true', help="vider les caches avant chaque remplissage")
+    parser.add_argument('--api-dir', default=API_DIR, help="dossier de api_form_autofill_v3.py à mesurer")
+    parser.add_argument('--output', help="fichier JSON des résultats (sinon stdout)")
+    parser.add_argument('--compare', help="fichier JSON d'une exécution précédente")
+    args = parser.parse_args()
+    
+    api = load_api(args.api_dir)
+    
+    # Options de fill_forms que cette version de l'API connaît
+    fill_params = inspect.signature(api.fill_forms).parameters
+    modes = ['keys', 'js'] if args.fill_mode == 'both' else [args.fill_mode]
+    if 'fill_mode' not in fill_params:
+        if 'keys' not in modes:
+            parser.error("cette version de l'API ne remplit qu'en mode keys")
+        modes = ['keys']
+    fill_options = {}
+    if 'identification' in fill_params:
+        fill_options['identification'] = args.identification
+    elif args.identification != 'field':
+        parser.error("cette version de l'API n'a pas d'identification matrix")
+    
+    profiles = getattr(api, 'BROWSER_PROFILES', None)
+    if profiles is not None:
+        profile = args.profile or api.BROWSER_PROFILE
+        if profile not in profiles:
+            parser.error(f"profil inconnu: {profile} (choix : {', '.join(profiles)})")
+        driver = api.create_driver(api.browser_settings(profile))
+    else:
+        if args.profile:
+            parser.error("cette version de l'API n'a pas de profils de navigateur")
+        driver = api.create_driver()
+    instrument = getattr(api, 'instrument_driver', count_commands)
+    driver = instrument(driver)
+    
+    server = start_fixture_server()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    
+    results = {
+        'benchmark': 'fill_forms',
+        'version': api.app.version,
+        'git_commit': git_commit(args.api_dir),
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'selenium': selenium.__version__,
+        'browser': driver.capabilities.get('browserName'),
+        'browser_version': driver.capabilities.get('browserVersion'),
+        'browser_profile': getattr(driver, 'profile', None),
+        'iterations': args.iterations,
+        'warmup': args.warmup,
+        'cold_caches': args.cold,
+        'identification': args.identification,
+        'results': [],
+    }
+    
+    try:
+        for name in args.fixtures:
+            filename, values = FIXTURES[name]
+            for mode in modes:
+                if 'fill_mode' in fill_params:
+                    fill_options['fill_mode'] = mode
+                stats = bench_fixture(api, driver, f"{base_url}/{filename}", values, fill_options,
+                                      args.iterations, args.warmup, args.cold)
+                results['results'].append({'fixture': name, 'fill_mode': mode, **stats})
+                print(f"  {name:<18} {mode:<5} {stats['fills_per_sec']:>8} fills/s  "
+                      f"p50 {stats['p50_ms']:>8} ms  p95 {stats['p95_ms']:>8} ms  "
+                      f"{stats['commands_per_fill']:>7} commandes/fill", file=sys.stderr)
+    finally:
+        driver.quit()
+        server.shutdown()
+    
+    output = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+        print(f"✅ Résultats écrits dans {args.output}", file=sys.stderr)
+    else:
+        print(output)
+    
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
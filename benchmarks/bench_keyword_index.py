@@ -0,0 +1,125 @@
+"""
+Benchmark - Index des mots-clés vs parcours complet
+===================================================
+
+Compare KeywordIndex (avec et sans le cache d'identification) à la version
+de référence qui score chaque attribut contre chaque mot-clé, et vérifie que
+les deux renvoient le même champ logique pour chaque seuil.
+
+Usage:
+    python benchmarks/bench_keyword_index.py
+    python benchmarks/bench_keyword_index.py --repeat 20
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from api_form_autofill_v3 import (  # noqa: E402
+    COMMON_FIELD_KEYWORDS,
+    IDENTIFICATION_CACHE,
+    KEYWORD_INDEX,
+    _detect_logical_key_bruteforce,
+    detect_logical_key_levenshtein,
+    normalize_field_name,
+)
+
+THRESHOLDS = [0.5, 0.6, 0.7, 0.8, 0.9]
+
+# Attributs rencontrés sur de vraies pages (checkout, booking, inscription)
+REAL_ATTRIBUTES = [
+    'custname', 'custtel', 'custemail', 'firstName', 'lastName', 'userEmail', 'userNumber',
+    'currentAddress', 'dateOfBirthInput', 'first-name', 'last-name', 'job-title',
+    'ctl00_txtFN', 'pax_0_fname', 'pax_0_lname', 'billing_address_1', 'billing_postcode',
+    'shipping-city', 'cc-number', 'cc-exp', 'cvc', 'coupon_code', 'qty', 'search',
+    'form-control', 'form-check-input', 'col-md-6', 'col-sm-12', 'btn', 'btn-primary',
+    'input-lg', 'mb-3', 'is-invalid', 'sr-only', 'd-none', 'select2-hidden-accessible',
+    'Votre adresse e-mail', 'Mot de passe', 'Confirmez le mot de passe', 'Numéro de téléphone',
+    'Enter your email', 'What should we call you?', 'bui-form__control', 'bui-checkbox__input',
+]
+
+
+def build_corpus(size: int = 2000, seed: int = 42) -> list:
+    """Construit un corpus déterministe d'attributs (réels, variantes, bruit)"""
+    rng = random.Random(seed)
+    keywords = [kw for kws in COMMON_FIELD_KEYWORDS.values() for kw in kws]
+    prefixes = ['', 'cust', 'user_', 'billing_', 'pax_0_', 'txt', 'input-', 'js-']
+    suffixes = ['', '_input', 'Field', '-1', '_confirm', 'Input', '_fr']
+    
+    corpus = list(REAL_ATTRIBUTES) + list(keywords)
+    while len(corpus) < size:
+        roll = rng.random()
+        if roll < 0.5:
+            corpus.append(rng.choice(prefixes) + rng.choice(keywords) + rng.choice(suffixes))
+        elif roll < 0.75:
+            kw = list(rng.choice(keywords))
+            kw[rng.randrange(len(kw))] = rng.choice(string.ascii_lowercase)
+            corpus.append(''.join(kw))
+        else:
+            length = rng.randint(3, 24)
+            corpus.append(''.join(rng.choice(string.ascii_lowercase + '_-') for _ in range(length)))
+    return corpus
+
+
+def detect_with_index(field_name: str, threshold: float = 0.6):
+    """KeywordIndex seul, sans passer par le cache d'identification"""
+    return KEYWORD_INDEX.lookup(normalize_field_name(field_name), threshold)
+
+
+def check_equivalence(corpus: list) -> int:
+    """Vérifie que l'index renvoie le même résultat que le parcours complet"""
+    mismatches = 0
+    for threshold in THRESHOLDS:
+        for name in corpus:
+            expected = _detect_logical_key_bruteforce(name, threshold)
+            got = detect_with_index(name, threshold)
+            if expected != got:
+                mismatches += 1
+                print(f"  ❌ {name!r} @ {threshold}: attendu={expected} obtenu={got}")
+    return mismatches
+
+
+def time_function(func, corpus: list, repeat: int) -> float:
+    """Temps moyen par appel, en microsecondes (meilleur des répétitions)"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for name in corpus:
+            func(name, 0.6)
+        best = min(best, time.perf_counter() - start)
+    return best / len(corpus) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=2000, help="Taille du corpus")
+    parser.add_argument('--repeat', type=int, default=5, help="Nombre de répétitions")
+    args = parser.parse_args()
+    
+    corpus = build_corpus(args.size)
+    print(f"📚 {len(KEYWORD_INDEX)} mots-clés, corpus de {len(corpus)} attributs")
+    
+    mismatches = check_equivalence(corpus)
+    checks = len(corpus) * len(THRESHOLDS)
+    print(f"✅ Équivalence: {checks - mismatches}/{checks} résultats identiques")
+    
+    naive_us = time_function(_detect_logical_key_bruteforce, corpus, args.repeat)
+    index_us = time_function(detect_with_index, corpus, args.repeat)
+    IDENTIFICATION_CACHE.clear()
+    cached_us = time_function(detect_logical_key_levenshtein, corpus, args.repeat)
+    
+    print('-' * 50)
+    print(f"  Parcours complet : {naive_us:8.2f} µs/appel")
+    print(f"  KeywordIndex     : {index_us:8.2f} µs/appel  (x{naive_us / index_us:.1f})")
+    print(f"  Index + cache    : {cached_us:8.2f} µs/appel  (x{naive_us / cached_us:.1f})")
+    print(f"  Cache            : {IDENTIFICATION_CACHE.stats()}")
+    
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
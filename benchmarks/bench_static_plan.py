@@ -0,0 +1,73 @@
+"""
+Benchmark - Analyse HTML statique (sans navigateur)
+===================================================
+
+Mesure le débit de plan_from_html (parsing + identification + plan) sur des
+pages enregistrées : les fixtures de benchmarks/fixtures/ par défaut, ou tous
+les .html d'un dossier (sortie d'un crawl par exemple).
+
+Usage:
+    python benchmarks/bench_static_plan.py
+    python benchmarks/bench_static_plan.py --pages ./crawl --repeat 3 --cold
+"""
+import argparse
+import glob
+import io
+import os
+import sys
+import time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from api_form_autofill_v3 import (  # noqa: E402
+    FORM_PLAN_CACHE,
+    IDENTIFICATION_CACHE,
+    parse_html_fields,
+    plan_from_html,
+)
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', default=FIXTURES_DIR, help="Dossier de pages .html")
+    parser.add_argument('--repeat', type=int, default=10, help="Nombre de passes sur les pages")
+    parser.add_argument('--cold', action='store_true', help="Vider les caches avant chaque page")
+    args = parser.parse_args()
+    
+    paths = sorted(glob.glob(os.path.join(args.pages, '**', '*.html'), recursive=True))
+    if not paths:
+        sys.exit(f"Aucune page .html dans {args.pages}")
+    
+    pages = []
+    for path in paths:
+        with open(path, encoding='utf-8', errors='replace') as f:
+            pages.append((os.path.relpath(path, args.pages), f.read()))
+    
+    print(f"📄 {len(pages)} page(s), {args.repeat} passe(s){' (caches vidés)' if args.cold else ''}")
+    
+    per_page = {name: 0.0 for name, _ in pages}
+    start = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        for _ in range(args.repeat):
+            for name, html in pages:
+                if args.cold:
+                    IDENTIFICATION_CACHE.clear()
+                    FORM_PLAN_CACHE.clear()
+                page_start = time.perf_counter()
+                plan_from_html(html)
+                per_page[name] += time.perf_counter() - page_start
+    total = time.perf_counter() - start
+    
+    print('-' * 50)
+    for name, html in pages:
+        fields = len(parse_html_fields(html))
+        print(f"  {name:<30} {fields:>5} champs  {per_page[name] / args.repeat * 1000:8.2f} ms/page")
+    analysed = len(pages) * args.repeat
+    print(f"  Débit : {analysed / total * 60:,.0f} pages/min ({analysed} analyses en {total:.2f} s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+"""
+Configuration pytest : les tests unitaires (sans navigateur) sont dans tests/.
+test_simple_v3.py est un script manuel à lancer contre l'API démarrée : jamais collecté.
+"""
+collect_ignore = ["test_simple_v3.py"]
@@ -0,0 +1,24 @@
+import os
+
+import pytest
+
+import api_form_autofill_v3 as autofill
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'fixtures')
+
+
+@pytest.fixture(autouse=True)
+def empty_caches():
+    """Chaque test part de caches vides (ils sont partagés par tout le module)"""
+    autofill.IDENTIFICATION_CACHE.clear()
+    autofill.FORM_PLAN_CACHE.clear()
+    yield
+
+
+@pytest.fixture
+def fixture_html():
+    """Contenu d'une page de benchmarks/fixtures/"""
+    def load(name: str) -> str:
+        with open(os.path.join(FIXTURES_DIR, name), encoding='utf-8') as f:
+            return f.read()
+    return load
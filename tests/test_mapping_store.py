@@ -0,0 +1,248 @@
+"""
+MappingStore : apprentissage, confirmation, surcharges et persistance SQLite.
+"""
+from types import SimpleNamespace
+
+import api_form_autofill_v3 as autofill
+from api_form_autofill_v3 import MappingStore
+
+
+def learn_times(store: MappingStore, decisions: list, times: int, domain: str = 'ex.com') -> None:
+    for _ in range(times):
+        store.learn(domain, decisions)
+
+
+def test_single_fuzzy_result_is_not_used():
+    store = MappingStore(':memory:', min_confidence=0.5, min_hits=3)
+    
+    store.learn('ex.com', [('ctl00_txtFN', 'last_name')])
+    
+    assert store.lookup('ex.com') == {}
+    assert store.entries('ex.com')[0]['confirmed'] is False
+
+
+def test_agreeing_results_confirm_the_mapping():
+    store = MappingStore(':memory:', min_confidence=0.5, min_hits=3)
+    
+    learn_times(store, [('ctl00_txtFN', 'first_name')], 2)
+    assert store.lookup('ex.com') == {}
+    
+    store.learn('ex.com', [('ctl00_txtFN', 'first_name')])
+    assert store.lookup('ex.com') == {'ctl00_txtFN': 'first_name'}
+    assert store.lookup('other.com') == {}
+    assert store.lookup(None) == {}
+
+
+def test_confidence_must_be_strictly_above_threshold():
+    # 3 succès → 0.75 : pas assez pour un seuil de 0.75
+    store = MappingStore(':memory:', min_confidence=0.75, min_hits=1)
+    
+    learn_times(store, [('email', 'email')], 3)
+    assert store.lookup('ex.com') == {}
+    
+    store.learn('ex.com', [('email', 'email')])
+    assert store.lookup('ex.com') == {'email': 'email'}
+
+
+def test_disagreeing_result_resets_the_candidate():
+    store = MappingStore(':memory:', min_hits=3)
+    
+    learn_times(store, [('fld', 'first_name')], 2)
+    store.learn('ex.com', [('fld', 'last_name')])
+    learn_times(store, [('fld', 'first_name')], 2)
+    
+    entry = store.entries('ex.com')[0]
+    assert (entry['logical'], entry['hits']) == ('first_name', 2)
+    assert store.lookup('ex.com') == {}
+
+
+def test_conflicting_decisions_in_one_fill_are_ignored():
+    store = MappingStore(':memory:', min_confidence=0.4, min_hits=1)
+    
+    store.learn('ex.com', [('fld', 'first_name'), ('fld', 'last_name'), ('mail', 'email')])
+    
+    assert store.lookup('ex.com') == {'mail': 'email'}
+
+
+def test_confirmed_mapping_is_not_reinforced_by_its_own_fills():
+    store = MappingStore(':memory:', min_hits=3)
+    learn_times(store, [('fld', 'first_name')], 3)
+    version = store.version('ex.com')
+    
+    learn_times(store, [('fld', 'first_name')], 5)
+    
+    entry = store.entries('ex.com')[0]
+    assert entry['hits'] == 3
+    assert store.version('ex.com') == version
+
+
+def test_confirmation_changes_the_version():
+    store = MappingStore(':memory:', min_hits=2)
+    
+    store.learn('ex.com', [('fld', 'first_name')])
+    assert store.version('ex.com') == 0
+    store.learn('ex.com', [('fld', 'first_name')])
+    assert store.version('ex.com') == 1
+
+
+def test_override_is_immediate_and_never_replaced():
+    store = MappingStore(':memory:', min_hits=3)
+    
+    store.override('ex.com', 'ctl00_txtFN', 'first_name')
+    learn_times(store, [('ctl00_txtFN', 'last_name')], 10)
+    
+    assert store.lookup('ex.com') == {'ctl00_txtFN': 'first_name'}
+    assert store.entries('ex.com')[0]['source'] == 'override'
+
+
+def test_low_confidence_override_is_not_used():
+    store = MappingStore(':memory:', min_confidence=0.5)
+    
+    store.override('ex.com', 'fld', 'first_name', confidence=0.2)
+    
+    assert store.lookup('ex.com') == {}
+
+
+def test_remove():
+    store = MappingStore(':memory:')
+    store.override('ex.com', 'fld', 'first_name')
+    version = store.version('ex.com')
+    
+    assert store.remove('ex.com', 'fld') is True
+    assert store.remove('ex.com', 'fld') is False
+    assert store.lookup('ex.com') == {}
+    assert store.version('ex.com') == version + 1
+
+
+def test_disabled_store_learns_nothing():
+    store = MappingStore('', min_hits=1)
+    
+    store.learn('ex.com', [('fld', 'first_name')])
+    
+    assert store.enabled is False
+    assert store.entries() == []
+
+
+def test_flush_writes_pending_batch():
+    store = MappingStore(':memory:', min_hits=1)
+    store.learn('ex.com', [('fld', 'first_name'), ('mail', 'email')])
+    store.override('ex.com', 'zip', 'zip')
+    store.remove('ex.com', 'mail')
+    
+    connection = store._connect()
+    try:
+        store._flush(connection)
+        rows = connection.execute("SELECT domain, field, logical, source, hits FROM mappings ORDER BY field").fetchall()
+    finally:
+        connection.close()
+    
+    assert rows == [('ex.com', 'fld', 'first_name', 'learned', 1), ('ex.com', 'zip', 'zip', 'override', 0)]
+    assert store.stats()['pending_writes'] == 0
+    assert store.written == 3
+
+
+def test_persistence_across_restarts(tmp_path):
+    path = str(tmp_path / 'mappings.db')
+    store = MappingStore(path, flush_interval=60, min_hits=2)
+    store.start()
+    learn_times(store, [('fld', 'first_name')], 2)
+    store.learn('ex.com', [('other', 'email')])
+    store.shutdown()
+    
+    reloaded = MappingStore(path, flush_interval=60, min_hits=2)
+    reloaded.start()
+    try:
+        assert reloaded.lookup('ex.com') == {'fld': 'first_name'}
+        # La candidate garde ses succès : un remplissage de plus la confirme
+        reloaded.learn('ex.com', [('other', 'email')])
+        assert reloaded.lookup('ex.com') == {'fld': 'first_name', 'other': 'email'}
+    finally:
+        reloaded.shutdown()
+
+
+def test_learned_decisions_skip_checkboxes_radios_and_unknown():
+    filled = [
+        {'type': 'text', 'name': 'fn', 'logical': 'first_name', 'value': 'Jean'},
+        {'type': 'checkbox', 'name': 'terms', 'logical': 'terms', 'value': 'on'},
+        {'type': 'radio', 'name': 'size', 'logical': 'size', 'value': 'medium'},
+        {'type': 'text', 'name': 'unknown', 'logical': 'email', 'value': 'x'},
+        {'type': 'text', 'name': 'free', 'logical': None, 'value': 'x'},
+    ]
+    
+    assert autofill.learned_decisions(filled) == [('fn', 'first_name')]
+
+
+def test_plan_uses_confirmed_mappings_only(monkeypatch):
+    store = MappingStore(':memory:', min_hits=2)
+    monkeypatch.setattr(autofill, 'MAPPING_STORE', store)
+    fields = autofill.parse_html_fields('<form><input name="ctl00_txtFN"></form>')
+    values = {**autofill.DEFAULT_VALUES}
+    
+    def planned():
+        return [(s['name'], s['logical']) for s in autofill.describe_plan(
+            autofill.plan_fields(fields, values, domain='ex.com'))]
+    
+    assert planned() == []
+    store.learn('ex.com', [('ctl00_txtFN', 'first_name')])
+    assert planned() == []
+    store.learn('ex.com', [('ctl00_txtFN', 'first_name')])
+    assert planned() == [('ctl00_txtFN', 'first_name')]
+
+
+def test_plan_applies_confirmed_mapping_whatever_threshold_and_mode(monkeypatch):
+    store = MappingStore(':memory:')
+    monkeypatch.setattr(autofill, 'MAPPING_STORE', store)
+    store.override('ex.com', 'ctl00_txtFN', 'first_name')
+    fields = autofill.parse_html_fields('<form><input name="ctl00_txtFN"></form>')
+    values = {**autofill.DEFAULT_VALUES}
+    
+    for threshold, identification in ((0.6, 'field'), (0.99, 'field'), (0.99, 'matrix')):
+        plan = autofill.plan_fields(fields, values, threshold, identification, domain='ex.com')
+        assert [(s['name'], s['logical']) for s in autofill.describe_plan(plan)] == [('ctl00_txtFN', 'first_name')]
+
+
+def session_driver(host: str = 'ex.com'):
+    return SimpleNamespace(page_host=host, fill_decisions={})
+
+
+FILLED = [{'type': 'text', 'name': 'fn', 'logical': 'first_name', 'value': 'Jean'}]
+
+
+def test_fills_are_learned_only_once_confirmed(monkeypatch):
+    store = MappingStore(':memory:', min_hits=2)
+    monkeypatch.setattr(autofill, 'MAPPING_STORE', store)
+    driver = session_driver()
+    
+    # Le même remplissage refait : toujours le même résultat, aucune preuve
+    for _ in range(5):
+        autofill.record_fill_decisions(driver, FILLED)
+    assert store.entries() == []
+    
+    assert autofill.confirm_fill_decisions(driver) == {'ex.com': 1}
+    assert store.entries('ex.com')[0]['hits'] == 1
+    assert autofill.confirm_fill_decisions(driver) == {}
+    
+    autofill.record_fill_decisions(driver, FILLED)
+    autofill.confirm_fill_decisions(driver)
+    assert store.lookup('ex.com') == {'fn': 'first_name'}
+
+
+def test_fill_outside_a_session_is_not_recorded():
+    driver = SimpleNamespace(page_host='ex.com')
+    
+    autofill.record_fill_decisions(driver, FILLED)
+    
+    assert not hasattr(driver, 'fill_decisions')
+
+
+def test_conflicting_fills_before_confirmation_are_ignored(monkeypatch):
+    store = MappingStore(':memory:', min_confidence=0.4, min_hits=1)
+    monkeypatch.setattr(autofill, 'MAPPING_STORE', store)
+    driver = session_driver()
+    
+    autofill.record_fill_decisions(driver, FILLED)
+    autofill.record_fill_decisions(driver, [{**FILLED[0], 'logical': 'last_name'},
+                                            {'type': 'email', 'name': 'mail', 'logical': 'email', 'value': 'x'}])
+    autofill.confirm_fill_decisions(driver)
+    
+    assert store.lookup('ex.com') == {'mail': 'email'}
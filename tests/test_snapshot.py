@@ -0,0 +1,51 @@
+"""
+Snapshot de session : un /form/plan (lecture) ne consomme pas la référence du
+mode incrémental, le remplissage suivant repart d'un snapshot complet.
+"""
+import asyncio
+
+import api_form_autofill_v3 as autofill
+
+PAGE = '<form><input name="first_name"><input name="email"></form>'
+
+
+class SnapshotDriver:
+    """Modèle de SNAPSHOT_SCRIPT : référence posée seulement par un snapshot avec consume"""
+    
+    def __init__(self):
+        self.fields = autofill.parse_html_fields(PAGE)
+        self.baseline = False
+        self.calls = []
+    
+    def execute_script(self, script, attributes, path, incremental, consume):
+        self.calls.append((incremental, consume))
+        if incremental and consume and self.baseline:
+            return {'fields': [], 'frames': [], 'incremental': True, 'host': 'ex.com'}
+        if consume:
+            self.baseline = True
+        return {'fields': [dict(f) for f in self.fields], 'frames': [], 'incremental': False, 'host': 'ex.com'}
+
+
+def test_plan_then_incremental_fill_takes_a_full_snapshot(monkeypatch):
+    driver = SnapshotDriver()
+    monkeypatch.setitem(autofill.active_sessions, 'plan', {
+        'driver': driver, 'last_used': 0, 'queue': autofill.SessionQueue()
+    })
+    
+    response = asyncio.run(autofill.plan_form(autofill.PlanRequest(session_id='plan')))
+    assert response.fields == 2
+    assert driver.calls == [(False, False)]
+    
+    fields = autofill.snapshot_form_fields(driver, incremental=True)
+    
+    assert driver.calls[-1] == (True, True)
+    assert [f['attrs'].get('name') for f in fields] == ['first_name', 'email']
+
+
+def test_fill_snapshot_is_the_incremental_baseline():
+    driver = SnapshotDriver()
+    
+    autofill.snapshot_form_fields(driver, incremental=True)
+    fields = autofill.snapshot_form_fields(driver, incremental=True)
+    
+    assert fields == []
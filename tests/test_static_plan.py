@@ -0,0 +1,348 @@
+"""
+Plan de remplissage à partir du HTML (plan_from_html), sans navigateur :
+identification, radios, checkboxes, selects, affectation globale, visibilité.
+"""
+import pytest
+
+import api_form_autofill_v3 as autofill
+
+
+def plan(html: str, values: dict = None, **kwargs) -> list:
+    return autofill.describe_plan(autofill.plan_from_html(html, values or {}, **kwargs))
+
+
+def steps_by_name(steps: list) -> dict:
+    by_name = {}
+    for step in steps:
+        by_name.setdefault(step['name'], []).append(step)
+    return by_name
+
+
+# ---------- Analyse du HTML ----------
+
+def test_parse_html_fields_matches_snapshot_shape(fixture_html):
+    fields = autofill.parse_html_fields(fixture_html('pizza.html'))
+    
+    assert [f['attrs'].get('name') for f in fields] == [
+        'custname', 'custtel', 'custemail', 'size', 'size', 'size',
+        'topping', 'topping', 'topping', 'topping', 'delivery', 'comments'
+    ]
+    assert [f['index'] for f in fields] == list(range(len(fields)))
+    assert all(f['element'] is None for f in fields)
+    assert fields[1]['type'] == 'tel'
+    assert fields[11]['tag'] == 'textarea'
+
+
+def test_parse_html_fields_select_options(fixture_html):
+    fields = autofill.parse_html_fields(fixture_html('country_select.html'))
+    country = next(f for f in fields if f['attrs'].get('name') == 'country')
+    
+    assert country['options'][0] == {'index': 0, 'text': '-- Select a country --', 'value': '', 'disabled': False}
+    assert {'text': 'France', 'value': 'FR'}.items() <= next(
+        opt for opt in country['options'] if opt['text'] == 'France').items()
+
+
+# ---------- Identification ----------
+
+def test_pizza_identification_and_values(fixture_html):
+    values = {
+        'custname': 'Jean Dupont',
+        'custtel': '+33612345678',
+        'custemail': 'jean.dupont@example.com',
+        'comments': 'Livraison rapide',
+    }
+    by_name = steps_by_name(plan(fixture_html('pizza.html'), values))
+    
+    assert by_name['custtel'][0]['logical'] == 'phone'
+    assert by_name['custemail'][0]['logical'] == 'email'
+    assert by_name['custname'][0]['value'] == 'Jean Dupont'
+    assert by_name['custemail'][0]['value'] == 'jean.dupont@example.com'
+    assert by_name['comments'][0] == {
+        'index': 11, 'tag': 'textarea', 'type': 'textarea', 'name': 'comments',
+        'logical': 'comments', 'action': 'type', 'value': 'Livraison rapide'
+    }
+
+
+def test_default_values_fill_identified_fields():
+    steps = plan('<form><input name="firstname"><input id="user_email"><input placeholder="Last name"></form>')
+    
+    assert [(s['name'], s['logical'], s['value']) for s in steps] == [
+        ('firstname', 'first_name', 'Jean'),
+        ('user_email', 'email', 'jean.dupont@example.com'),
+        ('unknown', 'last_name', 'Dupont'),
+    ]
+
+
+def test_password_is_masked_in_report():
+    steps = plan('<form><input type="password" name="pwd"></form>', {'password': 's3cret'})
+    
+    assert steps[0]['action'] == 'type'
+    assert steps[0]['value'] == '********'
+
+
+def test_split_dates(fixture_html):
+    by_name = steps_by_name(plan(fixture_html('split_dates.html'), {'date_of_birth': '1990-01-15'}))
+    
+    assert by_name['birth_day'][0]['value'] == '15'
+    assert by_name['birth_month'][0]['value'] == '01'
+    assert by_name['birth_year'][0]['value'] == '1990'
+    assert by_name['dob_year'][0]['value'] == '1990'
+
+
+# ---------- Radios (un clic par groupe) ----------
+
+def test_pizza_radio_group_single_click(fixture_html):
+    steps = [s for s in plan(fixture_html('pizza.html'), {'size': 'large'}) if s['type'] == 'radio']
+    
+    assert len(steps) == 1
+    assert steps[0]['index'] == 5
+    assert steps[0]['value'] == 'large'
+
+
+def test_radio_synonyms_and_partial_matches():
+    html = """<form>
+        <input type=radio name=gender value="M"><input type=radio name=gender value="F">
+        <input type=radio name=work value="oui"><input type=radio name=work value="non">
+        <input type=radio name=booking value="principal"><input type=radio name=booking value="autre">
+    </form>"""
+    steps = plan(html, {'gender': 'female', 'work': 'yes', 'booking': 'main_guest'})
+    
+    assert [(s['name'], s['value']) for s in steps] == [('gender', 'F'), ('work', 'oui'), ('booking', 'principal')]
+
+
+def test_radio_already_checked_is_not_clicked():
+    html = '<form><input type=radio name=size value="small"><input type=radio name=size value="medium" checked></form>'
+    
+    assert plan(html, {'size': 'medium'}) == []
+
+
+def test_radio_without_match_is_left_alone():
+    html = '<form><input type=radio name=size value="small"><input type=radio name=size value="large"></form>'
+    
+    assert plan(html, {'size': 'xxl'}) == []
+
+
+def frame_fields(*frames) -> list:
+    """Champs de plusieurs documents, comme snapshot_form_fields : frame, path, scope et index uniques"""
+    fields = []
+    for frame, path, scope, html in frames:
+        for field in autofill.parse_html_fields(html):
+            fields.append({**field, 'frame': frame, 'path': path, 'scope': scope})
+    for index, field in enumerate(fields):
+        field['index'] = index
+    return fields
+
+
+def test_same_named_radio_groups_in_sibling_frames():
+    html = '<form><input type=radio name=size value="small"><input type=radio name=size value="large"></form>'
+    # Deux iframes sans id ni name : même chemin lisible, frames différentes
+    fields = frame_fields(((0,), 'iframe', 0, html), ((1,), 'iframe', 0, html))
+    
+    steps = autofill.describe_plan(autofill.build_fill_plan(fields, {'size': 'large'}))
+    
+    assert [(s['index'], s['value']) for s in steps] == [(1, 'large'), (3, 'large')]
+
+
+def test_same_named_radio_groups_in_sibling_shadow_roots():
+    html = '<input type=radio name=size value="small"><input type=radio name=size value="large">'
+    fields = frame_fields(((), 'x-size::shadow-root', 1, html), ((), 'x-size::shadow-root', 2, html))
+    
+    steps = autofill.describe_plan(autofill.build_fill_plan(fields, {'size': 'small'}))
+    
+    assert [(s['index'], s['value']) for s in steps] == [(0, 'small'), (2, 'small')]
+
+
+# ---------- Checkboxes ----------
+
+def test_pizza_checkbox_list(fixture_html):
+    steps = [s for s in plan(fixture_html('pizza.html'), {'topping': ['Bacon', 'mushroom']}) if s['type'] == 'checkbox']
+    
+    # Liste fournie (sans casse), complétée par DEFAULT_VALUES['topping'] (bacon, cheese)
+    assert [s['value'] for s in steps] == ['bacon', 'cheese', 'mushroom']
+
+
+def test_checkbox_false_overrides_default_list(fixture_html):
+    steps = [s for s in plan(fixture_html('pizza.html'), {'topping': ['onion'], 'cheese': False})
+             if s['type'] == 'checkbox']
+    
+    assert [s['value'] for s in steps] == ['bacon', 'onion']
+
+
+def test_checkbox_grid_lists_and_defaults(fixture_html):
+    values = {'amenities': ['wifi', 'pool'], 'hobbies': ['sports', 'travel']}
+    by_name = steps_by_name(plan(fixture_html('checkbox_grid.html'), values))
+    
+    assert [s['value'] for s in by_name['amenities']] == ['wifi', 'pool']
+    # DEFAULT_VALUES['hobbies'] (Sports, Reading) s'ajoute à la liste fournie
+    assert [s['value'] for s in by_name['hobbies']] == ['sports', 'reading', 'travel']
+    # DEFAULT_VALUES : terms / privacy / remember_me cochées, newsletter non
+    assert 'terms' in by_name and 'privacy' in by_name and 'remember_me' in by_name
+    assert 'newsletter' not in by_name
+
+
+def test_checkbox_decisions():
+    html = """<form>
+        <input type=checkbox name=newsletter>
+        <input type=checkbox name=terms>
+        <input type=checkbox name=remember_me checked>
+        <input type=checkbox name=opt value=a><input type=checkbox name=opt value=b>
+    </form>"""
+    
+    steps = plan(html, {'opt': 'a', 'newsletter': 'yes', 'b': True})
+    assert [(s['name'], s['value']) for s in steps] == [
+        ('newsletter', 'on'),   # "yes" → cocher
+        ('terms', 'on'),        # valeur par défaut
+        ('opt', 'a'),           # chaîne égale à la valeur de l'input
+        ('opt', 'b'),           # clé = valeur de l'input
+    ]
+    # Déjà cochée : aucun clic
+    assert all(s['name'] != 'remember_me' for s in steps)
+    
+    steps = plan(html, {'terms': False, 'opt': []})
+    assert [s['name'] for s in steps] == []
+
+
+# ---------- Selects ----------
+
+def test_country_select_exact_match(fixture_html):
+    by_name = steps_by_name(plan(fixture_html('country_select.html'), {'country': 'France'}))
+    step = by_name['country'][0]
+    
+    assert step['action'] == 'select'
+    assert step['value'] == 'France'
+    fields = autofill.parse_html_fields(fixture_html('country_select.html'))
+    assert fields[step['index']]['options'][step['option_index']]['value'] == 'FR'
+
+
+def test_country_select_without_france_selects_nothing():
+    html = """<form><select name="country">
+        <option>Germany</option><option>Greece</option><option>Spain</option>
+    </select></form>"""
+    
+    assert plan(html) == []
+
+
+def test_select_normalized_and_fuzzy_options():
+    html = """<form>
+        <select name="title"><option value="">--</option><option>Mrs</option><option>Mr</option></select>
+        <select name="color"><option value="r">Red</option><option value="b">  BLUE </option></select>
+        <select name="size"><option value="s">Small</option><option value="m">Medium size</option></select>
+    </form>"""
+    steps = plan(html, {'color': 'blue', 'size': 'medium'})
+    
+    assert [(s['name'], s['value'], s['option_index']) for s in steps] == [
+        ('title', 'Mr', 2),
+        ('color', 'blue', 1),           # sans casse ni espaces
+        ('size', 'Medium size', 1),     # repli approché : texte de l'option
+    ]
+
+
+def test_select_skips_disabled_options():
+    html = """<form><select name="color">
+        <option value="g" disabled>Green</option><option value="gr">Green</option>
+    </select></form>"""
+    
+    assert plan(html, {'color': 'Green'})[0]['option_index'] == 1
+
+
+# ---------- Affectation globale (matrice) ----------
+
+def test_matrix_assigns_each_key_once():
+    html = '<form><input name="email"><input name="email_address"><input name="address"></form>'
+    
+    field_mode = [(s['name'], s['logical']) for s in plan(html)]
+    assert field_mode == [('email', 'email'), ('email_address', 'email'), ('address', 'address')]
+    
+    matrix_mode = [(s['name'], s['logical']) for s in plan(html, identification='matrix')]
+    assert matrix_mode == [('email', 'email'), ('address', 'address')]
+
+
+def test_matrix_keeps_multi_assign_keys():
+    html = '<form><input type="password" name="password"><input type="password" name="confirm_password"></form>'
+    
+    steps = plan(html, {'password': 'x'}, identification='matrix')
+    assert [s['name'] for s in steps] == ['password', 'confirm_password']
+
+
+def test_matrix_on_registration_fixture(fixture_html):
+    html = fixture_html('registration_300.html')
+    field_mode = plan(html)
+    matrix_mode = plan(html, identification='matrix')
+    
+    # Une seule fois chaque clé logique hors MULTI_ASSIGN_KEYS (15 voyageurs → premier seulement)
+    logicals = [s['logical'] for s in matrix_mode
+                if s['logical'] and s['type'] not in ('checkbox', 'radio') and s['logical'] not in autofill.MULTI_ASSIGN_KEYS]
+    assert len(logicals) == len(set(logicals))
+    assert len(matrix_mode) < len(field_mode)
+
+
+def test_unknown_identification_mode_is_rejected():
+    with pytest.raises(ValueError):
+        plan('<form><input name="email"></form>', identification='magic')
+
+
+# ---------- Visibilité et champs désactivés ----------
+
+def test_hidden_and_disabled_fields_are_skipped():
+    html = """<form>
+        <input name="city" hidden>
+        <div style="color: red; display: none"><input name="email"></div>
+        <input name="zip" style="visibility:hidden">
+        <input type="hidden" name="first_name">
+        <template><input name="username"></template>
+        <noscript><input name="state"></noscript>
+        <fieldset disabled>
+            <input name="phone"><textarea name="comments"></textarea>
+            <select name="country"><option>France</option></select>
+        </fieldset>
+        <input name="address" disabled>
+        <input name="last_name">
+    </form>"""
+    
+    assert [s['name'] for s in plan(html)] == ['last_name']
+
+
+def test_visibility_is_inherited_and_scoped():
+    html = """<form>
+        <section hidden><div><p><input name="city"></p></div></section>
+        <input name="zip">
+        <fieldset disabled><legend>x</legend></fieldset>
+        <input name="phone">
+    </form>"""
+    fields = autofill.parse_html_fields(html)
+    
+    assert [(f['attrs']['name'], f['visible'], f['enabled']) for f in fields] == [
+        ('city', False, True),
+        ('zip', True, True),
+        ('phone', True, True),
+    ]
+    assert [s['name'] for s in plan(html)] == ['zip', 'phone']
+
+
+def test_current_values_are_parsed():
+    html = """<form>
+        <textarea name="comments">
+hello</textarea>
+        <select name="size"><option>S</option><option selected>M</option></select>
+        <input type="checkbox" name="terms" checked>
+    </form>"""
+    fields = autofill.parse_html_fields(html)
+    
+    assert fields[0]['attrs']['value'] == 'hello'
+    assert fields[1]['attrs']['value'] == 'M'
+    assert fields[2]['checked'] and fields[2]['attrs']['value'] == 'on'
+
+
+# ---------- Cache des plans ----------
+
+def test_plan_cache_reuses_identification(fixture_html):
+    html = fixture_html('pizza.html')
+    first, second = {}, {}
+    
+    plan(html, info=first)
+    steps = plan(html, {'custname': 'Marie Curie'}, info=second)
+    
+    assert first['cached'] is False
+    assert second['cached'] is True
+    assert first['fingerprint'] == second['fingerprint']
+    assert steps_by_name(steps)['custname'][0]['value'] == 'Marie Curie'